@@ -0,0 +1,287 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# run from AWS_Lambda/Athena: python benchmark.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# main prints its container setup notes at import, keep them out of the JSON report
+with contextlib.redirect_stdout(sys.stderr):
+    import main  # noqa: E402
+from cache import QueryResultCache  # noqa: E402
+from cleanup import CleanupQueue  # noqa: E402
+import delete_output_file  # noqa: E402
+from lambda_common.clients import set_client  # noqa: E402
+from lookup_index import LookupIndex, update_index  # noqa: E402
+from lambda_common.fakes import FakeAthenaClient, FakeContext, FakeDynamoDBClient, FakeS3Client, load_records  # noqa: E402
+from polling import wait_for_query  # noqa: E402
+from query_builder import TableSpec, build_select  # noqa: E402
+from scheduler import DynamoDBSlots, QueryScheduler, SchedulerBusy  # noqa: E402
+from results import iter_query_rows, iter_result_rows  # noqa: E402
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data.py')
+
+
+PARTITION_KEY = 'dt'
+
+
+def _fixture_records(rows, partitions):
+    # data.py records first, then synthetic users up to `rows`, spread over `partitions` days
+    records = [{main.COLUMN: record['name'], main.EMAIL_COLUMN: record['email']} for record in load_records(FIXTURE)]
+    for i in range(len(records) + 1, rows + 1):
+        records.append({main.COLUMN: 'user%d' % i, main.EMAIL_COLUMN: 'user%d@example.com' % i})
+    for i, record in enumerate(records):
+        record['address'] = '%d Example Street, Example City' % i
+        record[PARTITION_KEY] = '2024-01-%02d' % (i % partitions + 1)
+    return records
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return {
+        'p50': samples[len(samples) // 2],
+        'p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'max': samples[-1],
+    }
+
+
+def bench_polling(athena, queries, execution_latency):
+    """
+    Time spent waiting for a query beyond its execution latency, and the number of polls.
+    """
+    overheads, polls = [], []
+    for i in range(queries):
+        query = "SELECT * FROM %s.%s where %s = 'user%d';" % (main.DATABASE, main.TABLE, main.COLUMN, i + 1)
+        query_execution_id = athena.start_query_execution(QueryString=query, ResultConfiguration={'OutputLocation': main.S3_OUTPUT})['QueryExecutionId']
+        poll = wait_for_query(athena, query_execution_id, FakeContext())
+        overheads.append(poll.elapsed - execution_latency)
+        polls.append(poll.polls)
+    return {'queries': queries, 'overhead_seconds': _percentiles(overheads), 'polls': _percentiles(polls)}
+
+
+def bench_scan(athena):
+    """
+    Bytes scanned by one lookup: SELECT * versus projected columns versus projected columns in one partition.
+    """
+    spec = TableSpec(main.DATABASE, main.TABLE, main.TABLE_SPEC.columns, (PARTITION_KEY,))
+    queries = {
+        'select_all': "SELECT * FROM %s.%s where %s = 'user1';" % (main.DATABASE, main.TABLE, main.COLUMN),
+        'projected': build_select(spec, {main.COLUMN: 'user1'}),
+        'projected_partition': build_select(spec, {main.COLUMN: 'user1'}, {PARTITION_KEY: '2024-01-01'}),
+    }
+    scanned = {}
+    for name, query in queries.items():
+        query_execution_id = athena.start_query_execution(QueryString=query, ResultConfiguration={'OutputLocation': main.S3_OUTPUT})['QueryExecutionId']
+        poll = wait_for_query(athena, query_execution_id)
+        scanned[name] = poll.execution['Statistics']['DataScannedInBytes']
+    return scanned
+
+
+def bench_paging(athena, s3, rows):
+    """
+    Rows per second when streaming a large result with get_query_results paging and from the output CSV on S3.
+    """
+    query = 'SELECT * FROM %s.%s;' % (main.DATABASE, main.TABLE)
+    query_execution_id = athena.start_query_execution(QueryString=query, ResultConfiguration={'OutputLocation': main.S3_OUTPUT})['QueryExecutionId']
+    execution = wait_for_query(athena, query_execution_id).execution
+    readers = {
+        'api': lambda: iter_result_rows(athena, query_execution_id),
+        's3': lambda: iter_query_rows(athena, query_execution_id, s3, execution, threshold=0),
+    }
+    report = {}
+    results = {}
+    for name, reader in readers.items():
+        calls_before = sum(athena.calls.values()) + sum(s3.calls.values())
+        start = time.perf_counter()
+        results[name] = list(reader())
+        elapsed = time.perf_counter() - start
+        assert len(results[name]) == rows
+        report[name] = {'rows': rows, 'api_calls': sum(athena.calls.values()) + sum(s3.calls.values()) - calls_before, 'seconds': elapsed, 'rows_per_second': rows / elapsed if elapsed > 0 else None}
+    assert results['api'] == results['s3']
+    return report
+
+
+def bench_handler(invocations, distinct):
+    """
+    Handler latency when ``invocations`` lookups cycle through ``distinct`` names (cache hits after the first round).
+    """
+    main.cache = QueryResultCache(max_entries=main.CACHE_MAX_ENTRIES, ttl=main.CACHE_TTL)
+    latencies = []
+    for name in itertools.islice(itertools.cycle(['user%d' % (i + 1) for i in range(distinct)]), invocations):
+        start = time.perf_counter()
+        email = main.lambda_handler({'name': name}, FakeContext())
+        latencies.append(time.perf_counter() - start)
+        assert email == '%s@example.com' % name, email
+    return {'invocations': invocations, 'latency_seconds': _percentiles(latencies), 'cache': main.cache.metrics()}
+
+
+class _Containers:
+    """
+    One ``QueryScheduler`` per thread, like concurrent invocations that each run in their own container.
+    """
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.schedulers = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def slot(self, *args, **kwargs):
+        if not hasattr(self._local, 'scheduler'):
+            self._local.scheduler = QueryScheduler(**self.kwargs)
+            with self._lock:
+                self.schedulers.append(self._local.scheduler)
+        return self._local.scheduler.slot(*args, **kwargs)
+
+    def metrics(self):
+        counts = {}
+        for scheduler in self.schedulers:
+            for name, value in scheduler.metrics().get(main.WORKGROUP, {}).items():
+                if name in ('admitted', 'queued', 'rejected', 'shared_admitted', 'shared_rejected'):
+                    counts[name] = counts.get(name, 0) + value
+        return {main.WORKGROUP: counts}
+
+
+def bench_scheduler(athena, burst, max_concurrent, timeout):
+    """
+    A burst of concurrent lookups against an account limit of ``max_concurrent`` queries:
+    threads sharing one container's scheduler, one container per invocation with only the
+    per-container cap, and one container per invocation with slots shared through DynamoDB.
+    """
+    containers = _Containers(max_in_flight=max_concurrent)
+    dynamodb = FakeDynamoDBClient({'athena-slots': 'workgroup'})
+    shared = _Containers(max_in_flight=max_concurrent, shared=DynamoDBSlots(dynamodb, 'athena-slots'))
+    report = {}
+    for name, scheduler in (('threads', QueryScheduler(max_in_flight=max_concurrent)), ('containers', containers), ('shared', shared)):
+        main.scheduler = scheduler
+        report[name] = _burst(athena, burst, timeout)
+    report['shared']['dynamodb_calls'] = dynamodb.calls
+    return report
+
+
+def _burst(athena, burst, timeout):
+    outcomes = {'completed': 0, 'busy': 0, 'throttled': 0}
+    lock = threading.Lock()
+
+    def worker(i):
+        query = build_select(main.TABLE_SPEC, {main.COLUMN: 'user%d' % (i + 1)})
+        try:
+            main.execute_query(athena, query, FakeContext(timeout))
+            outcome = 'completed'
+        except SchedulerBusy:
+            outcome = 'busy'
+        except athena.exceptions.ClientError:
+            outcome = 'throttled'
+        with lock:
+            outcomes[outcome] += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(burst)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    outcomes['seconds'] = time.perf_counter() - start
+    outcomes['scheduler'] = main.scheduler.metrics()[main.WORKGROUP]
+    return outcomes
+
+
+def bench_index(root, records, invocations, distinct):
+    """
+    Handler latency when every lookup is answered by the local index built from the fixture.
+    """
+    segment = os.path.join(root, 'segment-00001.jsonl')
+    with open(segment, 'w', encoding='utf-8') as fp:
+        for record in records:
+            fp.write(json.dumps({'name': record[main.COLUMN], 'email': record[main.EMAIL_COLUMN]}) + '\n')
+    start = time.perf_counter()
+    update_index(os.path.join(root, 'index'), [segment])
+    build_seconds = time.perf_counter() - start
+
+    main.index = LookupIndex(os.path.join(root, 'index'))
+    latencies = []
+    try:
+        for name in itertools.islice(itertools.cycle(['user%d' % (i + 1) for i in range(distinct)]), invocations):
+            start = time.perf_counter()
+            email = main.lambda_handler({'name': name}, FakeContext())
+            latencies.append(time.perf_counter() - start)
+            assert email == '%s@example.com' % name, email
+    finally:
+        main.index.close()
+        main.index = None
+    return {'entries': len(records), 'build_seconds': build_seconds, 'latency_seconds': _percentiles(latencies)}
+
+
+def bench_cleanup(athena, s3):
+    """
+    Request-path cost of queueing the output objects of every query run so far, and the batched flush.
+    """
+    query_execution_ids = list(athena._executions)
+    deletes_before = s3.calls.get('DeleteObjects', 0)
+    start = time.perf_counter()
+    for query_execution_id in query_execution_ids:
+        delete_output_file.delete_output_file(query_execution_id)
+    enqueue_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    delete_output_file.cleanup_queue.flush()
+    flush_seconds = time.perf_counter() - start
+    main.cleanup_queue.flush()
+    remaining = s3.list_objects_v2(Bucket=main.S3_BUCKET)['KeyCount']
+    return {'queries': len(query_execution_ids), 'enqueue_seconds': enqueue_seconds, 'flush_seconds': flush_seconds, 'delete_calls': s3.calls.get('DeleteObjects', 0) - deletes_before, 'remaining_objects': remaining}
+
+
+def run(rows=10000, partitions=10, queries=20, invocations=50, distinct=5, burst=40, max_concurrent=5, timeout=15.0, queue_latency=0.05, execution_latency=0.2, api_latency=0.005):
+    with tempfile.TemporaryDirectory() as root:
+        s3 = FakeS3Client(root, latency=api_latency)
+        table = '%s.%s' % (main.DATABASE, main.TABLE)
+        records = _fixture_records(rows, partitions)
+        athena = FakeAthenaClient({table: records}, s3, {table: (PARTITION_KEY,)}, queue_latency=queue_latency, execution_latency=execution_latency, api_latency=api_latency, max_concurrent=max_concurrent)
+        set_client('athena', athena)
+        set_client('s3', s3)
+        main.index = None
+        # keep the benchmark's cleanup backlog out of /tmp
+        main.cleanup_queue = CleanupQueue(lambda: s3, main.S3_BUCKET, max_attempts=main.RETRY_COUNT)
+        delete_output_file.cleanup_queue = CleanupQueue(lambda: s3, delete_output_file.S3_BUCKET, max_attempts=delete_output_file.RETRY_COUNT)
+
+        report = {'settings': {'rows': rows, 'partitions': partitions, 'max_concurrent': max_concurrent, 'queue_latency': queue_latency, 'execution_latency': execution_latency, 'api_latency': api_latency}}
+        # the handler prints every query id and result, keep them out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            report['polling'] = bench_polling(athena, queries, queue_latency + execution_latency)
+            report['scanned_bytes'] = bench_scan(athena)
+            report['paging'] = bench_paging(athena, s3, rows)
+            report['handler'] = bench_handler(invocations, distinct)
+            report['index'] = bench_index(root, records, invocations, distinct)
+            report['scheduler'] = bench_scheduler(athena, burst, max_concurrent, timeout)
+            report['cleanup'] = bench_cleanup(athena, s3)
+        return report
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Athena Lambda against local fake Athena/S3 clients.')
+    parser.add_argument('--rows', type=int, default=10000, help='rows in the fake table (default: 10000)')
+    parser.add_argument('--partitions', type=int, default=10, help='days the fake table is partitioned into (default: 10)')
+    parser.add_argument('--queries', type=int, default=20, help='queries for the polling benchmark (default: 20)')
+    parser.add_argument('--invocations', type=int, default=50, help='handler invocations (default: 50)')
+    parser.add_argument('--distinct', type=int, default=5, help='distinct names looked up by the handler (default: 5)')
+    parser.add_argument('--burst', type=int, default=40, help='concurrent lookups for the scheduler benchmark (default: 40)')
+    parser.add_argument('--max-concurrent', type=int, default=5, help='concurrent query limit of the fake account (default: 5)')
+    parser.add_argument('--timeout', type=float, default=15.0, help='Lambda timeout of each burst lookup in seconds (default: 15)')
+    parser.add_argument('--queue-latency', type=float, default=0.05, help='seconds each query stays QUEUED (default: 0.05)')
+    parser.add_argument('--execution-latency', type=float, default=0.2, help='seconds each query stays RUNNING (default: 0.2)')
+    parser.add_argument('--api-latency', type=float, default=0.005, help='seconds added to every API call (default: 0.005)')
+    args = parser.parse_args(argv)
+
+    report = run(args.rows, args.partitions, args.queries, args.invocations, args.distinct, args.burst, args.max_concurrent, args.timeout, args.queue_latency, args.execution_latency, args.api_latency)
+    print(json.dumps(report, indent=2, default=str))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -0,0 +1,201 @@
+import hashlib
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+# cache constant
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL = 300
+
+# returned by the lookups on a miss, so that a cached None is a hit
+_MISS = object()
+
+_LITERAL_OR_TEXT = re.compile(r"('(?:[^']|'')*')|([^']+)")
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Normalize a query for use as a cache key: collapse whitespace outside string literals
+    and drop the trailing semicolon. Literals are kept as is.
+    """
+    parts = []
+    for literal, text in _LITERAL_OR_TEXT.findall(sql):
+        parts.append(literal if literal else re.sub(r'\s+', ' ', text))
+    return ''.join(parts).strip().rstrip(';').strip()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class QueryResultCache:
+    """
+    Cache query results keyed by normalized SQL.
+
+    - memory tier: LRU with TTL, lives as long as the warm container
+    - disk tier (optional): one pickle file per query under ``disk_dir`` (e.g. /tmp), survives
+      in-process cache evictions and is shared by handlers in the same container
+    - stampede protection: concurrent lookups of the same query share one execution
+
+    :param max_entries: The maximum number of entries in the memory tier.
+    :param ttl: Seconds an entry stays valid in both tiers.
+    :param disk_dir: Directory of the disk tier, or None to disable it.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL, disk_dir: Optional[str] = None, clock: Callable[[], float] = time.time):
+        if max_entries <= 0:
+            raise ValueError('max_entries must be greater than 0')
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.clock = clock
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._metrics = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'shared': 0, 'errors': 0, 'latency_saved_seconds': 0.0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.pickle')
+
+    def _read_disk(self, key: str) -> Optional[tuple]:
+        try:
+            with open(self._disk_path(key), 'rb') as fp:
+                stored_key, expires_at, cost, value = pickle.load(fp)
+        except (OSError, EOFError, pickle.PickleError, ValueError):
+            return None
+        if stored_key != key or expires_at <= self.clock():
+            return None
+        return expires_at, cost, value
+
+    def _write_disk(self, key: str, entry: tuple) -> None:
+        expires_at, cost, value = entry
+        # write to a temporary file and rename it so readers never see a partial file
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir)
+            with os.fdopen(fd, 'wb') as fp:
+                pickle.dump((key, expires_at, cost, value), fp)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError as e:
+            print('cache write failed: %s' % e)
+
+    def _store(self, key: str, entry: tuple) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, sql: str, default=None):
+        """
+        Return the cached result, or ``default`` when there is none. Counts a hit but never a miss.
+        """
+        key = normalize_sql(sql)
+        with self._lock:
+            value = self._lookup_memory(key)
+        if value is _MISS:
+            value = self._lookup_disk(key)
+        return default if value is _MISS else value
+
+    def _lookup_memory(self, key: str):
+        # called with the lock held
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > self.clock():
+                self._entries.move_to_end(key)
+                self._metrics['hits'] += 1
+                self._metrics['latency_saved_seconds'] += entry[1]
+                return entry[2]
+            del self._entries[key]
+        return _MISS
+
+    def _lookup_disk(self, key: str):
+        # file I/O runs without the lock, only the promotion to the memory tier takes it
+        if not self.disk_dir:
+            return _MISS
+        entry = self._read_disk(key)
+        if entry is None:
+            return _MISS
+        with self._lock:
+            self._store(key, entry)
+            self._metrics['disk_hits'] += 1
+            self._metrics['latency_saved_seconds'] += entry[1]
+        return entry[2]
+
+    def get_or_execute(self, sql: str, execute: Callable[[], object]):
+        """
+        Return the cached result for ``sql``, or run ``execute()`` once and cache its result.
+
+        Concurrent callers with the same normalized SQL wait for the running lookup or execution
+        instead of starting their own. A cached ``None`` is a hit. Errors are not cached.
+        """
+        key = normalize_sql(sql)
+        with self._lock:
+            value = self._lookup_memory(key)
+            if value is not _MISS:
+                return value
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self._metrics['shared'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = self._lookup_disk(key)
+            if flight.value is not _MISS:
+                return flight.value
+            with self._lock:
+                self._metrics['misses'] += 1
+            start = time.perf_counter()
+            flight.value = execute()
+            entry = (self.clock() + self.ttl, time.perf_counter() - start, flight.value)
+            with self._lock:
+                self._store(key, entry)
+            if self.disk_dir:
+                self._write_disk(key, entry)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self._metrics['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def invalidate(self, sql: str) -> None:
+        key = normalize_sql(sql)
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.disk_dir:
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    def metrics(self) -> Dict[str, float]:
+        """
+        Return hit/miss counters, the hit rate and the query latency saved by hits, in seconds.
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['entries'] = len(self._entries)
+        lookups = metrics['hits'] + metrics['disk_hits'] + metrics['misses'] + metrics['shared']
+        metrics['hit_rate'] = (metrics['hits'] + metrics['disk_hits']) / lookups if lookups else 0.0
+        return metrics
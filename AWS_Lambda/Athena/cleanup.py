@@ -0,0 +1,250 @@
+import itertools
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from results import split_s3_uri
+
+# delete_objects accepts at most 1000 keys per request
+MAX_KEYS_PER_DELETE = 1000
+
+# retry constant
+DEFAULT_MAX_ATTEMPTS = 5
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 10.0
+
+# seconds between background flushes
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+# output objects older than this are swept by the scheduled job
+SWEEP_MIN_AGE = 15 * 60
+
+# names Athena gives the objects of a query: <query execution id>.csv / .txt (DDL) and their .metadata
+OUTPUT_NAME = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}(\.csv|\.txt|\.csv\.metadata|\.txt\.metadata|\.metadata)')
+
+
+def output_location(uri: str) -> Tuple[str, str]:
+    """
+    Split the query output location ``s3://bucket/path`` into ``(bucket, "path/")`` (``""`` for the bucket root).
+    """
+    bucket, prefix = split_s3_uri(uri)
+    prefix = prefix.strip('/')
+    return bucket, prefix + '/' if prefix else ''
+
+
+def output_keys(query_execution_id: str, prefix: str = '') -> List[str]:
+    """
+    Return the keys Athena writes for a query: ``<id>.csv`` and ``<id>.csv.metadata`` under ``prefix``.
+    """
+    return [prefix + query_execution_id + '.csv', prefix + query_execution_id + '.csv.metadata']
+
+
+def _chunks(keys: Iterable[str], size: int = MAX_KEYS_PER_DELETE) -> Iterator[List[str]]:
+    keys = iter(keys)
+    while True:
+        chunk = list(itertools.islice(keys, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class CleanupQueue:
+    """
+    Queue S3 keys and delete them in batches, off the request path.
+
+    - ``enqueue`` only appends to an in-memory queue and a backlog file, so it costs no API call
+    - a daemon thread flushes every ``flush_interval`` seconds, or as soon as a full batch is
+      queued, with ``delete_objects`` calls of up to 1000 keys
+    - keys that fail are retried with exponential backoff up to ``max_attempts`` times, then dropped
+      (the scheduled sweep removes anything left behind)
+    - the thread does not run while the execution environment is frozen between invocations;
+      queued keys are deleted after the next invocation thaws it, or by the sweep if it never does
+    - the backlog file (e.g. under /tmp) belongs to one container: it only carries the queue over
+      a runtime restart in the same container (e.g. after a timeout)
+
+    :param get_s3: Returns the S3 client, e.g. ``lambda: get_client('s3')``.
+    :param bucket: The bucket of the keys.
+    :param backlog_path: The backlog file, or None to keep the queue in memory only.
+    """
+
+    def __init__(self, get_s3: Callable[[], object], bucket: str, backlog_path: Optional[str] = None, max_attempts: int = DEFAULT_MAX_ATTEMPTS, flush_interval: float = DEFAULT_FLUSH_INTERVAL, sleep: Callable[[float], None] = time.sleep):
+        if max_attempts <= 0:
+            raise ValueError('max_attempts must be greater than 0')
+        self.get_s3 = get_s3
+        self.bucket = bucket
+        self.backlog_path = backlog_path
+        self.max_attempts = max_attempts
+        self.flush_interval = flush_interval
+        self.sleep = sleep
+        # key -> failed attempts, in enqueue order
+        self._pending: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._metrics = {'enqueued': 0, 'deleted': 0, 'failed': 0, 'batches': 0, 'retries': 0}
+        for key in self._load_backlog():
+            self._pending.setdefault(key, 0)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _load_backlog(self) -> List[str]:
+        if not self.backlog_path:
+            return []
+        try:
+            with open(self.backlog_path, encoding='utf-8') as fp:
+                return [line.rstrip('\n') for line in fp if line.strip()]
+        except OSError:
+            return []
+
+    def _append_backlog(self, keys: List[str]) -> None:
+        if not self.backlog_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.backlog_path) or '.', exist_ok=True)
+            with open(self.backlog_path, 'a', encoding='utf-8') as fp:
+                fp.writelines(key + '\n' for key in keys)
+        except OSError as e:
+            print("cleanup backlog write failed: %s" % e)
+
+    def _rewrite_backlog(self) -> None:
+        if not self.backlog_path:
+            return
+        # write to a temporary file and rename so a frozen or killed invocation never leaves a torn file
+        directory = os.path.dirname(self.backlog_path) or '.'
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory)
+            with os.fdopen(fd, 'w', encoding='utf-8') as fp:
+                fp.writelines(key + '\n' for key in self._pending)
+            os.replace(tmp_path, self.backlog_path)
+        except OSError as e:
+            print("cleanup backlog write failed: %s" % e)
+
+    def _add(self, keys: List[str]) -> bool:
+        # returns True when a full batch is queued
+        with self._lock:
+            new = [key for key in keys if key not in self._pending]
+            for key in new:
+                self._pending[key] = 0
+            self._append_backlog(new)
+            self._metrics['enqueued'] += len(new)
+            return len(self._pending) >= MAX_KEYS_PER_DELETE
+
+    def enqueue(self, keys: Iterable[str]) -> None:
+        """
+        Queue keys for deletion and make sure the background thread is running.
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='athena-output-cleanup', daemon=True)
+                self._thread.start()
+        for chunk in _chunks(keys):
+            if self._add(chunk):
+                self._wakeup.set()
+
+    def delete(self, keys: Iterable[str]) -> int:
+        """
+        Delete keys (and anything already queued) now, flushing each full batch as the keys stream in,
+        so a long listing never sits in memory.
+
+        :return: The number of keys deleted.
+        """
+        deleted = 0
+        for chunk in _chunks(keys):
+            if self._add(chunk):
+                deleted += self.flush()
+        return deleted + self.flush()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._pending:
+                try:
+                    self.flush()
+                except Exception as e:
+                    print("cleanup flush failed: %s" % e)
+
+    def _delete_batch(self, batch: List[str]) -> List[str]:
+        # returns the keys that were not deleted
+        try:
+            response = self.get_s3().delete_objects(
+                Bucket=self.bucket,
+                Delete={
+                    'Objects': [{'Key': key} for key in batch],
+                    'Quiet': True,
+                }
+            )
+        except Exception as e:
+            print("delete %d objects failed: %s" % (len(batch), e))
+            return batch
+        errors = response.get('Errors', [])
+        for error in errors[:3]:
+            print("delete %s failed: %s" % (error.get('Key'), error.get('Code')))
+        return [error['Key'] for error in errors]
+
+    def flush(self) -> int:
+        """
+        Delete every queued key now, retrying failed keys with backoff.
+
+        :return: The number of keys deleted.
+        """
+        deleted = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = list(self._pending)[:MAX_KEYS_PER_DELETE]
+                if not batch:
+                    return deleted
+
+                failed = set(self._delete_batch(batch))
+                retry_attempt = 0
+                with self._lock:
+                    self._metrics['batches'] += 1
+                    for key in batch:
+                        if key not in failed:
+                            self._pending.pop(key, None)
+                            deleted += 1
+                            continue
+                        attempts = self._pending[key] = self._pending[key] + 1
+                        retry_attempt = max(retry_attempt, attempts)
+                        if attempts >= self.max_attempts:
+                            del self._pending[key]
+                            self._metrics['failed'] += 1
+                    self._metrics['deleted'] += len(batch) - len(failed)
+                    self._rewrite_backlog()
+                if retry_attempt and retry_attempt < self.max_attempts:
+                    self._metrics['retries'] += 1
+                    self.sleep(min(BACKOFF_BASE * 2 ** (retry_attempt - 1), BACKOFF_MAX))
+
+    def metrics(self) -> Dict[str, int]:
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['pending'] = len(self._pending)
+        return metrics
+
+
+def iter_stale_output_keys(s3, bucket: str, prefix: str, min_age: float = SWEEP_MIN_AGE, now: Optional[datetime] = None) -> Iterator[str]:
+    """
+    Yield query output keys directly under the output ``prefix`` (see ``output_location``) last
+    modified more than ``min_age`` seconds ago.
+
+    Only objects named like Athena's output (``<query execution id>.csv``, ``.csv.metadata``, ...)
+    are yielded, and "subdirectories" are not listed, so other data in the bucket is never touched.
+    """
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(seconds=min_age)
+    kwargs = {'Bucket': bucket, 'Prefix': prefix, 'Delimiter': '/'}
+    while True:
+        response = s3.list_objects_v2(**kwargs)
+        for obj in response.get('Contents', []):
+            if OUTPUT_NAME.fullmatch(obj['Key'][len(prefix):]) and obj['LastModified'] < cutoff:
+                yield obj['Key']
+        if not response.get('IsTruncated'):
+            return
+        kwargs['ContinuationToken'] = response['NextContinuationToken']
@@ -0,0 +1,156 @@
+import itertools
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# athena type -> converter (None keeps the string as is)
+CONVERTERS: Dict[str, Optional[Callable[[str], object]]] = {
+    'tinyint': int,
+    'smallint': int,
+    'integer': int,
+    'int': int,
+    'bigint': int,
+    'double': float,
+    'float': float,
+    'real': float,
+    'decimal': Decimal,
+    'boolean': lambda value: value == 'true',
+    'date': date.fromisoformat,
+    'timestamp': datetime.fromisoformat,
+    'varchar': None,
+    'char': None,
+    'string': None,
+}
+
+
+def converter_for(athena_type: str) -> Optional[Callable[[str], object]]:
+    """
+    Return the converter for an Athena column type such as ``bigint`` or ``decimal(10,2)``.
+    Unknown types (arrays, maps, json, ...) stay strings.
+    """
+    base_type = athena_type.lower().split('(')[0].strip()
+    return CONVERTERS.get(base_type)
+
+
+class ResultDecoder:
+    """
+    Decode Athena ``ResultSet`` rows with a converter plan built once from ``ColumnInfo``.
+
+    Rows become plain tuples (or per-column lists with ``decode_columns``) of int, float,
+    Decimal, bool, date, datetime, str or None for NULL.
+    """
+
+    def __init__(self, column_info: Sequence[dict]):
+        self.names: List[str] = [column['Name'] for column in column_info]
+        self.types: List[str] = [column['Type'] for column in column_info]
+        self.converters = [converter_for(athena_type) for athena_type in self.types]
+        # only typed columns need a conversion step
+        self._plan = [(index, converter) for index, converter in enumerate(self.converters) if converter is not None]
+
+    @classmethod
+    def from_result(cls, result: dict) -> 'ResultDecoder':
+        return cls(result['ResultSet']['ResultSetMetadata']['ColumnInfo'])
+
+    def decode_row(self, row: dict) -> Tuple[object, ...]:
+        values = [datum.get('VarCharValue') for datum in row['Data']]
+        for index, converter in self._plan:
+            value = values[index]
+            if value is not None:
+                values[index] = converter(value)
+        return tuple(values)
+
+    def convert_strings(self, values: Sequence[Optional[str]]) -> Tuple[object, ...]:
+        """
+        Apply the plan to already extracted strings (e.g. a CSV row). Empty strings are treated as NULL for non-string columns.
+        """
+        return tuple(
+            value if converter is None or value is None else (converter(value) if value != '' else None)
+            for value, converter in zip(values, self.converters)
+        )
+
+    def decode_rows(self, rows: Iterable[dict], skip_header: bool = False) -> Iterator[Tuple[object, ...]]:
+        """
+        Lazily decode rows. ``skip_header`` drops the first row without copying the list.
+        """
+        if skip_header:
+            rows = itertools.islice(rows, 1, None)
+        plan = self._plan
+        # decode_row inlined to avoid a method call per row
+        for row in rows:
+            values = [datum.get('VarCharValue') for datum in row['Data']]
+            for index, converter in plan:
+                value = values[index]
+                if value is not None:
+                    values[index] = converter(value)
+            yield tuple(values)
+
+    def decode_columns(self, rows: Iterable[dict], skip_header: bool = False) -> Dict[str, list]:
+        """
+        Decode rows into one list per column.
+        """
+        if skip_header:
+            rows = itertools.islice(rows, 1, None)
+        columns: List[list] = [[] for _ in self.names]
+        appends = [column.append for column in columns]
+        for row in rows:
+            for append, datum in zip(appends, row['Data']):
+                append(datum.get('VarCharValue'))
+        # convert column by column so each converter runs in a tight loop
+        for index, converter in self._plan:
+            columns[index] = [None if value is None else converter(value) for value in columns[index]]
+        return dict(zip(self.names, columns))
+
+
+def _synthetic_page(rows: int) -> dict:
+    column_info = [
+        {'Name': 'id', 'Type': 'bigint'},
+        {'Name': 'name', 'Type': 'varchar'},
+        {'Name': 'email', 'Type': 'varchar'},
+        {'Name': 'score', 'Type': 'double'},
+        {'Name': 'created', 'Type': 'timestamp'},
+    ]
+    header = {'Data': [{'VarCharValue': column['Name']} for column in column_info]}
+    data = [
+        {'Data': [
+            {'VarCharValue': str(i)},
+            {'VarCharValue': 'user%d' % i},
+            {'VarCharValue': 'user%d@example.com' % i},
+            {'VarCharValue': '%.2f' % (i / 7)},
+            {'VarCharValue': '2023-10-30 17:%02d:00.000' % (i % 60)} if i % 10 else {},
+        ]}
+        for i in range(rows)
+    ]
+    return {'ResultSet': {'Rows': [header] + data, 'ResultSetMetadata': {'ColumnInfo': column_info}}}
+
+
+def benchmark(rows: int = 100000) -> None:
+    """
+    Compare nested positional lookups with the decoder on a synthetic page.
+    """
+    result = _synthetic_page(rows)
+    columns = len(result['ResultSet']['ResultSetMetadata']['ColumnInfo'])
+
+    start = time.perf_counter()
+    nested = []
+    for i in range(1, len(result['ResultSet']['Rows'])):
+        nested.append(tuple(result['ResultSet']['Rows'][i]['Data'][j].get('VarCharValue') for j in range(columns)))
+    nested_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decoder = ResultDecoder.from_result(result)
+    decoded = list(decoder.decode_rows(result['ResultSet']['Rows'], skip_header=True))
+    decoder_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decoder.decode_columns(result['ResultSet']['Rows'], skip_header=True)
+    columns_seconds = time.perf_counter() - start
+
+    assert len(nested) == len(decoded) == rows
+    print("nested lookups (strings): %.3fs" % nested_seconds)
+    print("decoder rows (typed):     %.3fs" % decoder_seconds)
+    print("decoder columns (typed):  %.3fs" % columns_seconds)
+
+
+if __name__ == '__main__':
+    benchmark()
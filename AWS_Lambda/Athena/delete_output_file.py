@@ -1,29 +1,35 @@
+from cleanup import CleanupQueue, iter_stale_output_keys, output_keys, output_location
+from lambda_common import tracing
+from lambda_common.clients import get_client
+
+# S3 constant (the query output location of the Athena Lambda, only Athena's output objects directly under it are deleted)
+S3_OUTPUT = 's3://your_athena_query_output_backet_name'
+S3_BUCKET, S3_OUTPUT_PREFIX = output_location(S3_OUTPUT)
+
+# number of retries
+RETRY_COUNT = 10
+
+# output objects queued for batched deletion (no backlog file: the next sweep lists anything left behind)
+cleanup_queue = CleanupQueue(lambda: get_client('s3'), S3_BUCKET, max_attempts=RETRY_COUNT)
+
+
 # If you want to delete output file
-# s3 client
-client = boto3.client('s3')
-
-# created s3 object
-s3_objects_key = []
-s3_object_key_csv = query_execution_id + '.csv'
-s3_objects_key.append({'Key': s3_object_key_csv})
-s3_object_key_metadata = query_execution_id + '.csv.metadata'
-s3_objects_key.append({'Key': s3_object_key_metadata})
-
-# delete s3 object
-for i in range(1, 1 + RETRY_COUNT):
-    response = client.delete_objects(
-        Bucket=S3_BUCKET,
-        Delete={
-            'Objects': s3_objects_key
-            }
-            )
-
-if response['ResponseMetadata']['HTTPStatusCode'] == 200:
-    print("delete %s complete" % s3_objects_key)
-    break
-else:
-    print(response['ResponseMetadata']['HTTPStatusCode'])
-    time.sleep(i)
-
-else:
-raise Exception('object %s delete failed' % s3_objects_key)
\ No newline at end of file
+def delete_output_file(query_execution_id):
+
+    # created s3 object (deleted later by the cleanup thread in batches of up to 1000 keys)
+    cleanup_queue.enqueue(output_keys(query_execution_id, S3_OUTPUT_PREFIX))
+
+
+# scheduled job (e.g. EventBridge rate(15 minutes)): sweep leftover output objects
+@tracing.traced
+def lambda_handler(event, context):
+
+    # s3 client (shared across warm invocations)
+    client = get_client('s3')
+
+    # output objects older than SWEEP_MIN_AGE, deleted 1000 at a time while listing
+    with tracing.span('sweep'):
+        deleted = cleanup_queue.delete(iter_stale_output_keys(client, S3_BUCKET, S3_OUTPUT_PREFIX))
+    tracing.count('deleted_objects', deleted)
+    print("delete %d objects complete" % deleted)
+    return cleanup_queue.metrics()
@@ -0,0 +1,310 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# index file format (little endian)
+#   header:  magic, version, slot count (power of two), entry count
+#   slots:   (key hash, record offset) * slot count, offset 0 = empty
+#   records: key length, value length, row count, key, value
+MAGIC = b'LKIX'
+VERSION = 1
+HEADER = struct.Struct('<4sIQQ')
+SLOT = struct.Struct('<QQ')
+RECORD = struct.Struct('<HHI')
+
+MANIFEST = 'manifest.json'
+LOAD_FACTOR = 0.6
+
+# layers are merged into one when there are more than this
+MAX_LAYERS = 8
+
+# returned when a key matched more than one row (the Athena lookup returns None for those too)
+AMBIGUOUS = object()
+
+
+def key_hash(key: bytes) -> int:
+    # stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+
+def read_segment(path: str, key_field: str = 'name', value_field: str = 'email') -> Iterator[Tuple[str, str]]:
+    """
+    Yield ``(key, value)`` from a JSONL export (e.g. ``data.py``). Records without either field are skipped.
+    """
+    with open(path, encoding='utf-8') as fp:
+        for line in fp:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            key, value = record.get(key_field), record.get(value_field)
+            if key is not None and value is not None:
+                yield str(key), str(value)
+
+
+def write_layer(path: str, entries: Dict[str, Tuple[str, int]]) -> None:
+    """
+    Write an index file for ``{key: (value, row count)}`` atomically.
+    """
+    slot_count = 8
+    while slot_count * LOAD_FACTOR < len(entries):
+        slot_count *= 2
+    mask = slot_count - 1
+    slots = bytearray(SLOT.size * slot_count)
+    records = bytearray()
+    records_start = HEADER.size + len(slots)
+
+    for key, (value, count) in entries.items():
+        key_bytes, value_bytes = key.encode('utf-8'), value.encode('utf-8')
+        if len(key_bytes) > 0xFFFF or len(value_bytes) > 0xFFFF:
+            raise ValueError('key or value longer than 65535 bytes: %r' % key[:50])
+        hashed = key_hash(key_bytes)
+        slot = hashed & mask
+        # linear probing
+        while SLOT.unpack_from(slots, slot * SLOT.size)[1]:
+            slot = (slot + 1) & mask
+        SLOT.pack_into(slots, slot * SLOT.size, hashed, records_start + len(records))
+        records += RECORD.pack(len(key_bytes), len(value_bytes), count) + key_bytes + value_bytes
+
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, 'wb') as fp:
+        fp.write(HEADER.pack(MAGIC, VERSION, slot_count, len(entries)))
+        fp.write(slots)
+        fp.write(records)
+    os.replace(tmp_path, path)
+
+
+class IndexLayer:
+    """
+    A read-only, memory-mapped index file. Lookups hash the key and probe a few slots,
+    so they cost microseconds and only touch the pages they need.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as fp:
+            self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.slot_count, self.entry_count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a version %d lookup index' % (path, VERSION))
+        self._mask = self.slot_count - 1
+
+    def __len__(self) -> int:
+        return self.entry_count
+
+    def get(self, key: str) -> Optional[Tuple[str, int]]:
+        """
+        Return ``(value, row count)`` for ``key``, or None.
+        """
+        key_bytes = key.encode('utf-8')
+        hashed = key_hash(key_bytes)
+        index_map = self._map
+        slot = hashed & self._mask
+        while True:
+            slot_hash, offset = SLOT.unpack_from(index_map, HEADER.size + slot * SLOT.size)
+            if not offset:
+                return None
+            if slot_hash == hashed:
+                key_length, value_length, count = RECORD.unpack_from(index_map, offset)
+                start = offset + RECORD.size
+                if index_map[start:start + key_length] == key_bytes:
+                    return index_map[start + key_length:start + key_length + value_length].decode('utf-8'), count
+            slot = (slot + 1) & self._mask
+
+    def items(self) -> Iterator[Tuple[str, str, int]]:
+        """
+        Iterate over ``(key, value, row count)`` in file order.
+        """
+        offset = HEADER.size + self.slot_count * SLOT.size
+        while offset < len(self._map):
+            key_length, value_length, count = RECORD.unpack_from(self._map, offset)
+            start = offset + RECORD.size
+            key = self._map[start:start + key_length].decode('utf-8')
+            value = self._map[start + key_length:start + key_length + value_length].decode('utf-8')
+            yield key, value, count
+            offset = start + key_length + value_length
+
+    def close(self) -> None:
+        self._map.close()
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        for block in iter(lambda: fp.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_manifest(directory: str) -> dict:
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as fp:
+            return json.load(fp)
+    except FileNotFoundError:
+        return {'version': VERSION, 'layers': [], 'segments': {}}
+
+
+def _write_manifest(directory: str, manifest: dict) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, 'w', encoding='utf-8') as fp:
+        json.dump(manifest, fp, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST))
+
+
+def _merge(entries: Dict[str, Tuple[str, int]], key: str, value: str, count: int = 1) -> None:
+    previous = entries.get(key)
+    entries[key] = (value, count) if previous is None else (value, previous[1] + count)
+
+
+def update_index(directory: str, segments: Sequence[str], key_field: str = 'name', value_field: str = 'email', max_layers: int = MAX_LAYERS) -> List[str]:
+    """
+    Add new JSONL segments to the index in ``directory``.
+
+    Segments already recorded in the manifest (same name and SHA-256) are skipped, the new
+    ones are written as one additional layer, and the layers are merged when there are more
+    than ``max_layers``. A recorded segment whose content changed raises ``ValueError``;
+    rebuild the index from scratch in that case.
+
+    :return: The names of the segments that were added.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = _read_manifest(directory)
+    known = manifest['segments']
+
+    # layers merged by the previous update are no longer referenced
+    for name in manifest.pop('compacted_layers', []):
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+    added = []
+    entries: Dict[str, Tuple[str, int]] = {}
+    for path in segments:
+        name = os.path.basename(path)
+        digest = _file_digest(path)
+        if name in known:
+            if known[name] != digest:
+                raise ValueError('segment %s changed since it was indexed, rebuild the index' % name)
+            continue
+        for key, value in read_segment(path, key_field, value_field):
+            _merge(entries, key, value)
+        known[name] = digest
+        added.append(name)
+
+    if entries:
+        layer = 'layer-%05d.idx' % (max([int(name[6:11]) for name in manifest['layers']] or [0]) + 1)
+        write_layer(os.path.join(directory, layer), entries)
+        manifest['layers'].append(layer)
+    if len(manifest['layers']) > max_layers:
+        _compact(directory, manifest)
+    _write_manifest(directory, manifest)
+    return added
+
+
+def _compact(directory: str, manifest: dict) -> None:
+    entries: Dict[str, Tuple[str, int]] = {}
+    for layer_name in manifest['layers']:
+        layer = IndexLayer(os.path.join(directory, layer_name))
+        for key, value, count in layer.items():
+            _merge(entries, key, value, count)
+        layer.close()
+    old_layers = manifest['layers']
+    # the merged layer takes the newest number so readers of the old manifest are not affected
+    merged = old_layers[-1][:6] + '%05d.idx' % (int(old_layers[-1][6:11]) + 1)
+    write_layer(os.path.join(directory, merged), entries)
+    manifest['layers'] = [merged]
+    manifest['compacted_layers'] = old_layers
+
+
+class LookupIndex:
+    """
+    Read-only view of an index directory: every layer listed in the manifest, memory-mapped.
+
+    Row counts are summed across layers, so a key exported more than once reads as ``AMBIGUOUS``,
+    matching the Athena lookup that only uses single matches.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        manifest = _read_manifest(directory)
+        # newest first; a key found in more than one layer sums its row counts and reads as AMBIGUOUS
+        self.layers = [IndexLayer(os.path.join(directory, name)) for name in reversed(manifest['layers'])]
+
+    def __len__(self) -> int:
+        return sum(len(layer) for layer in self.layers)
+
+    def get(self, key: str):
+        """
+        Return the value for ``key``, ``AMBIGUOUS`` when it matched several rows, or None when it is not indexed.
+        """
+        value, total = None, 0
+        for layer in self.layers:
+            found = layer.get(key)
+            if found is not None:
+                if value is None:
+                    value = found[0]
+                total += found[1]
+        if total > 1:
+            return AMBIGUOUS
+        return value
+
+    def close(self) -> None:
+        for layer in self.layers:
+            layer.close()
+
+
+def open_index(directory: Optional[str]) -> Optional[LookupIndex]:
+    """
+    Open the index in ``directory``, or return None when there is none (e.g. not deployed).
+    """
+    if not directory or not os.path.isfile(os.path.join(directory, MANIFEST)):
+        return None
+    return LookupIndex(directory)
+
+
+def benchmark(index: LookupIndex, keys: Sequence[str], rounds: int = 10) -> None:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for key in keys:
+            index.get(key)
+    elapsed = time.perf_counter() - start
+    print("%d lookups in %.3fs (%.2f us/lookup)" % (rounds * len(keys), elapsed, elapsed / (rounds * len(keys)) * 1e6))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Build or update the memory-mapped name -> email lookup index from JSONL segments.')
+    parser.add_argument('index_dir', help='index directory (manifest.json and layer files)')
+    parser.add_argument('segments', nargs='*', help='JSONL segments to add (already indexed ones are skipped)')
+    parser.add_argument('--key-field', default='name', help='key field of the records (default: name)')
+    parser.add_argument('--value-field', default='email', help='value field of the records (default: email)')
+    parser.add_argument('--max-layers', type=int, default=MAX_LAYERS, help='merge the layers when there are more than this (default: %d)' % MAX_LAYERS)
+    parser.add_argument('--lookup', metavar='KEY', help='look up a key after updating')
+    parser.add_argument('--benchmark', action='store_true', help='time lookups of every indexed key')
+    args = parser.parse_args(argv)
+
+    added = update_index(args.index_dir, args.segments, args.key_field, args.value_field, args.max_layers)
+    print("added %d segments: %s" % (len(added), ', '.join(added)))
+
+    index = open_index(args.index_dir)
+    if index is None:
+        return 0
+    print("%d entries in %d layers" % (len(index), len(index.layers)))
+    if args.lookup is not None:
+        value = index.get(args.lookup)
+        print('ambiguous' if value is AMBIGUOUS else value)
+    if args.benchmark:
+        benchmark(index, [key for layer in index.layers for key, _, _ in layer.items()])
+    index.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
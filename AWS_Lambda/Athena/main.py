@@ -1,80 +1,222 @@
+import itertools
 import time
-import boto3
+
+from cache import QueryResultCache
+from cleanup import CleanupQueue, output_keys, output_location
+from lambda_common import tracing
+from lambda_common.clients import client_init_seconds, get_client, mark_invocation
+from lookup_index import AMBIGUOUS, open_index
+from polling import DEADLINE_MARGIN_MS, wait_for_query
+from query_builder import TableSpec, build_select, partitions_from_event
+from results import MAX_PAGE_SIZE, iter_query_rows, iter_result_rows
+from scheduler import PRIORITY_LOW, PRIORITY_NORMAL, DynamoDBSlots, QueryScheduler, SchedulerBusy, deadline_from_context
 
 # athena constant
 DATABASE = 'your_athena_database_name'
 TABLE = 'your_athena_table_name'
+WORKGROUP = 'primary'
+
+# concurrency constant (in-flight queries per workgroup, across all containers when SLOT_TABLE is set)
+MAX_IN_FLIGHT = 20
+
+# DynamoDB table (partition key "workgroup") sharing the query slots across containers; set it when deploying,
+# None caps only this container (concurrent invocations run in separate containers and are not limited)
+SLOT_TABLE = None
 
 # S3 constant
 S3_OUTPUT = 's3://your_athena_query_output_backet_name'
-S3_BUCKET = 'your_athena_query_output_backet_name'
+S3_BUCKET, S3_OUTPUT_PREFIX = output_location(S3_OUTPUT)
 
 # number of retries
 RETRY_COUNT = 10
 
 # query constant
 COLUMN = 'your_column_name'
-
-
+EMAIL_COLUMN = 'email'
+
+# table spec (only these columns are read, partition keys found in the event prune the scan)
+PARTITION_KEYS = ()
+TABLE_SPEC = TableSpec(DATABASE, TABLE, (COLUMN, EMAIL_COLUMN), PARTITION_KEYS)
+
+# cache constant (set CACHE_DIR to None to disable the /tmp tier)
+CACHE_TTL = 300
+CACHE_MAX_ENTRIES = 1024
+CACHE_DIR = '/tmp/athena_query_cache'
+
+# cleanup constant (output objects are deleted in the background; the /tmp backlog only outlives a
+# runtime restart in the same container, delete_output_file.lambda_handler sweeps the rest)
+CLEANUP_OUTPUT = True
+CLEANUP_BACKLOG = '/tmp/athena_cleanup_backlog'
+
+# local index constant (built offline with lookup_index.py and shipped e.g. as a Lambda layer, None to always query athena)
+INDEX_DIR = '/opt/lookup_index'
+
+# batch constant (keywords per IN (...) query)
+BATCH_MAX_ITEMS = 500
+
+# result cache shared across warm invocations
+cache = QueryResultCache(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, disk_dir=CACHE_DIR)
+
+# name -> email index, memory-mapped once per container (None when not deployed)
+index = open_index(INDEX_DIR)
+
+# caps concurrent queries and queues the excess by priority (per workgroup across containers with SLOT_TABLE)
+scheduler = QueryScheduler(max_in_flight=MAX_IN_FLIGHT, shared=DynamoDBSlots(get_client('dynamodb'), SLOT_TABLE) if SLOT_TABLE else None)
+if not SLOT_TABLE:
+    print("SCHEDULER:SLOT_TABLE is not set, MAX_IN_FLIGHT=%d is enforced per container only" % MAX_IN_FLIGHT)
+
+# output objects queued for batched deletion, shared across warm invocations
+cleanup_queue = CleanupQueue(lambda: get_client('s3'), S3_BUCKET, backlog_path=CLEANUP_BACKLOG, max_attempts=RETRY_COUNT)
+
+
+def execute_query(client, query, context, max_rows=2, priority=PRIORITY_NORMAL):
+
+    # wait for a free slot (fails fast with SchedulerBusy when the deadline can not be met)
+    with scheduler.slot(WORKGROUP, priority, deadline_from_context(context, DEADLINE_MARGIN_MS)) as waited:
+        tracing.record('scheduler_wait', waited)
+
+        # Execution
+        with tracing.span('submit'):
+            response = client.start_query_execution(
+                QueryString=query,
+                QueryExecutionContext={
+                    'Database': DATABASE
+                },
+                ResultConfiguration={
+                    'OutputLocation': S3_OUTPUT,
+                },
+                WorkGroup=WORKGROUP
+            )
+
+        # get query execution id
+        query_execution_id = response['QueryExecutionId']
+        print(query_execution_id)
+
+        # get execution status
+        with tracing.span('poll'):
+            poll = wait_for_query(client, query_execution_id, context)
+        print("STATUS:%s polls=%d elapsed=%.3fs queued=%.3fs" % (poll.state, poll.polls, poll.elapsed, waited))
+
+    # athena's own view of the query (queue wait and engine time)
+    statistics = poll.execution.get('Statistics', {})
+    tracing.count('queries')
+    tracing.count('polls', poll.polls)
+    tracing.count('scanned_bytes', statistics.get('DataScannedInBytes', 0))
+    tracing.record('athena_queue', statistics.get('QueryQueueTimeInMillis', 0) / 1000)
+    tracing.record('athena_execution', statistics.get('EngineExecutionTimeInMillis', 0) / 1000)
+
+    # get query results (stop after max_rows rows)
+    with tracing.span('fetch'):
+        if max_rows is not None and max_rows <= MAX_PAGE_SIZE:
+            # fits in the first page, no need to check the output size
+            rows = iter_result_rows(client, query_execution_id)
+        else:
+            # large results are read from the output CSV on S3
+            rows = iter_query_rows(client, query_execution_id, get_client('s3'), poll.execution)
+        rows = list(itertools.islice(rows, max_rows))
+    tracing.count('rows', len(rows))
+
+    # the output objects are no longer needed once the rows are read
+    if CLEANUP_OUTPUT:
+        with tracing.span('cleanup'):
+            cleanup_queue.enqueue(output_keys(query_execution_id, S3_OUTPUT_PREFIX))
+    return rows
+
+
+def lookup_many(client, keywords, context, partitions=None, priority=PRIORITY_LOW):
+
+    # one query per BATCH_MAX_ITEMS keywords, rows are fanned back out by keyword (the first column)
+    rows_by_keyword = {keyword: [] for keyword in keywords}
+    unique_keywords = list(rows_by_keyword)
+    for i in range(0, len(unique_keywords), BATCH_MAX_ITEMS):
+        chunk = unique_keywords[i:i + BATCH_MAX_ITEMS]
+        query = build_select(TABLE_SPEC, {COLUMN: chunk}, partitions)
+        for row in execute_query(client, query, context, max_rows=None, priority=priority):
+            # typed columns (e.g. bigint) are matched against the keyword strings
+            key = row[0] if row[0] in rows_by_keyword else str(row[0])
+            rows_by_keyword.setdefault(key, []).append(row)
+    return rows_by_keyword
+
+
+def email_from_rows(rows):
+    # only a single match is used
+    if len(rows) == 1:
+        return rows[0][1]
+    return None
+
+
+def lookup_local(keyword, partitions=None):
+    # returns (found, email); the index is not partitioned, so partitioned lookups always go to athena
+    if index is None or partitions:
+        return False, None
+    value = index.get(str(keyword))
+    if value is None:
+        return False, None
+    return True, None if value is AMBIGUOUS else value
+
+
+@tracing.traced
 def lambda_handler(event, context):
 
+    # cold / warm start
+    cold_start = mark_invocation()
+    start = time.perf_counter()
+    tracing.annotate(cold_start=cold_start)
+
+    # batch event: {"names": [...]} -> {name: email}
+    if 'names' in event:
+        partitions = partitions_from_event(TABLE_SPEC, event)
+
+        # answer from the local index first, only misses go to athena
+        emails = {}
+        with tracing.span('index'):
+            for keyword in event['names']:
+                found, email = lookup_local(keyword, partitions)
+                if found:
+                    emails[keyword] = email
+        misses = [keyword for keyword in event['names'] if keyword not in emails]
+        tracing.count('index_hits', len(emails))
+        if misses:
+            try:
+                rows_by_keyword = lookup_many(get_client('athena'), misses, context, partitions, event.get('priority', PRIORITY_LOW))
+            except SchedulerBusy as e:
+                print("BUSY:%s retry_after=%.1fs" % (e.workgroup, e.retry_after))
+                raise
+            for keyword in misses:
+                emails[keyword] = email_from_rows(rows_by_keyword.get(keyword, []))
+        print("BATCH:%d names index_hits=%d latency=%.3fs" % (len(emails), len(emails) - len(set(misses)), time.perf_counter() - start))
+        return {keyword: emails[keyword] for keyword in event['names']}
+
     # get keyword
     keyword = event['name']
+    partitions = partitions_from_event(TABLE_SPEC, event)
+
+    # local index (microseconds), athena only on a miss
+    with tracing.span('index'):
+        found, email = lookup_local(keyword, partitions)
+    if found:
+        tracing.count('index_hits')
+        print("INDEX:hit latency=%.6fs" % (time.perf_counter() - start))
+        return email
 
-    # created query
-    query = "SELECT * FROM %s.%s where %s = '%s';" % (DATABASE, TABLE, COLUMN, keyword)
-
-    # athena client
-    client = boto3.client('athena')
-
-    # Execution
-    response = client.start_query_execution(
-        QueryString=query,
-        QueryExecutionContext={
-            'Database': DATABASE
-        },
-        ResultConfiguration={
-            'OutputLocation': S3_OUTPUT,
-        }
-    )
-
-    # get query execution id
-    query_execution_id = response['QueryExecutionId']
-    print(query_execution_id)
-
-    # get execution status
-    for i in range(1, 1 + RETRY_COUNT):
-
-        # get query execution
-        query_status = client.get_query_execution(QueryExecutionId=query_execution_id)
-        query_execution_status = query_status['QueryExecution']['Status']['State']
-
-        if query_execution_status == 'SUCCEEDED':
-            print("STATUS:" + query_execution_status)
-            break
+    # created query (projected columns and partition predicates only)
+    query = build_select(TABLE_SPEC, {COLUMN: keyword}, partitions)
 
-        if query_execution_status == 'FAILED':
-            raise Exception("STATUS:" + query_execution_status)
+    # athena client (shared across warm invocations)
+    client = get_client('athena')
 
-        else:
-            print("STATUS:" + query_execution_status)
-            time.sleep(i)
-    else:
-        client.stop_query_execution(QueryExecutionId=query_execution_id)
-        raise Exception('TIME OVER')
+    # get query results (cached, only a single match is used)
+    priority = event.get('priority', PRIORITY_NORMAL)
+    try:
+        rows = cache.get_or_execute(query, lambda: execute_query(client, query, context, priority=priority))
+    except SchedulerBusy as e:
+        print("BUSY:%s retry_after=%.1fs" % (e.workgroup, e.retry_after))
+        raise
+    print(rows)
 
-    # get query results
-    result = client.get_query_results(QueryExecutionId=query_execution_id)
-    print(result)
+    print("START:%s latency=%.3fs client_init=%s" % ('cold' if cold_start else 'warm', time.perf_counter() - start, client_init_seconds()))
+    print("CACHE:%s" % cache.metrics())
+    print("SCHEDULER:%s" % scheduler.metrics())
 
     # get data
-    if len(result['ResultSet']['Rows']) == 2:
-
-        email = result['ResultSet']['Rows'][1]['Data'][1]['VarCharValue']
-
-        return email
-
-    else:
-        return None
-    
-
+    return email_from_rows(rows)
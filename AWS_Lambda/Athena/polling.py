@@ -0,0 +1,85 @@
+import random
+import time
+from typing import Callable, Iterator, NamedTuple, Optional
+
+# polling constant
+INITIAL_DELAY = 0.2
+MAX_DELAY = 5.0
+BACKOFF_FACTOR = 2.0
+
+# stop polling this long before the Lambda timeout so there is time to clean up
+DEADLINE_MARGIN_MS = 3000
+
+# deadline when no Lambda context is available (e.g. local runs)
+DEFAULT_MAX_WAIT = 60.0
+
+
+class QueryFailed(Exception):
+    pass
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+class PollResult(NamedTuple):
+    state: str
+    polls: int
+    elapsed: float
+    execution: dict
+
+
+def backoff_delays(initial_delay: float = INITIAL_DELAY, max_delay: float = MAX_DELAY, factor: float = BACKOFF_FACTOR, rng: Optional[random.Random] = None) -> Iterator[float]:
+    """
+    Yield capped exponential delays with jitter.
+
+    Each delay is drawn between half and all of ``min(max_delay, initial_delay * factor ** n)``,
+    so the first polls are fast and concurrent pollers do not synchronize.
+    """
+    rng = rng or random.Random()
+    base = initial_delay
+    while True:
+        yield base / 2 + rng.uniform(0, base / 2)
+        base = min(max_delay, base * factor)
+
+
+def wait_for_query(client, query_execution_id: str, context=None, max_wait: float = DEFAULT_MAX_WAIT, margin_ms: int = DEADLINE_MARGIN_MS, delays: Optional[Iterator[float]] = None, sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.monotonic) -> PollResult:
+    """
+    Poll ``get_query_execution`` until the query finishes or the deadline passes.
+
+    The deadline is taken from ``context.get_remaining_time_in_millis()`` minus ``margin_ms``
+    when a Lambda context is given, otherwise ``max_wait`` seconds from now. On timeout the
+    query is stopped with ``stop_query_execution``.
+
+    :return: The final state, the number of polls, the wall time in seconds and the QueryExecution dict.
+    :raises QueryFailed: The query FAILED or was CANCELLED.
+    :raises QueryTimeout: The query did not finish before the deadline.
+    """
+    start = clock()
+    if context is not None:
+        deadline = start + (context.get_remaining_time_in_millis() - margin_ms) / 1000
+    else:
+        deadline = start + max_wait
+    delays = delays or backoff_delays()
+
+    polls = 0
+    while True:
+        # get query execution
+        query_status = client.get_query_execution(QueryExecutionId=query_execution_id)
+        polls += 1
+        execution = query_status['QueryExecution']
+        state = execution['Status']['State']
+
+        if state == 'SUCCEEDED':
+            return PollResult(state, polls, clock() - start, execution)
+
+        if state in ('FAILED', 'CANCELLED'):
+            reason = execution['Status'].get('StateChangeReason', '')
+            raise QueryFailed("STATUS:" + state + (" " + reason if reason else ""))
+
+        remaining = deadline - clock()
+        if remaining <= 0:
+            client.stop_query_execution(QueryExecutionId=query_execution_id)
+            raise QueryTimeout('TIME OVER after %d polls in %.3f seconds' % (polls, clock() - start))
+
+        sleep(min(next(delays), remaining))
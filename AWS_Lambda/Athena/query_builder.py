@@ -0,0 +1,117 @@
+import math
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+# filter value -> `=` for a scalar, `IN (...)` for these collection types
+_COLLECTIONS = (list, tuple, set, frozenset)
+
+
+class TableSpec(NamedTuple):
+    """
+    What the query builder needs to know about a table.
+
+    :param columns: Columns returned by lookups, in result order. Only these are read (and scanned).
+    :param partition_keys: Partition columns. Predicates on them prune whole S3 prefixes.
+    """
+    database: str
+    table: str
+    columns: Tuple[str, ...]
+    partition_keys: Tuple[str, ...] = ()
+
+
+def quote_identifier(name: str) -> str:
+    """
+    Quote a database, table or column name for Athena (Presto/Trino) SQL.
+    """
+    if not name or '\0' in name:
+        raise ValueError('invalid identifier: %r' % name)
+    return '"%s"' % name.replace('"', '""')
+
+
+def quote_literal(value: object) -> str:
+    """
+    Render a Python value as an Athena SQL literal.
+
+    Strings have their single quotes doubled, dates and datetimes become typed literals and
+    numbers are written as is. Anything else is rejected rather than formatted with ``str()``.
+    """
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            raise ValueError('non-finite number: %r' % value)
+        return repr(value)
+    if isinstance(value, Decimal):
+        if not value.is_finite():
+            raise ValueError('non-finite number: %r' % value)
+        return "DECIMAL '%s'" % value
+    if isinstance(value, datetime):
+        return "TIMESTAMP '%s'" % value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return "DATE '%s'" % value.isoformat()
+    if isinstance(value, str):
+        if '\0' in value:
+            raise ValueError('string literal contains NUL')
+        return "'%s'" % value.replace("'", "''")
+    raise TypeError('unsupported literal type: %s' % type(value).__name__)
+
+
+def _predicate(column: str, value: object) -> str:
+    if isinstance(value, _COLLECTIONS):
+        values = list(dict.fromkeys(value))
+        if not values:
+            # nothing can match an empty IN list, which is not valid SQL
+            return 'FALSE'
+        if len(values) == 1:
+            return _predicate(column, values[0])
+        return '%s IN (%s)' % (quote_identifier(column), ', '.join(quote_literal(item) for item in values))
+    if value is None:
+        return '%s IS NULL' % quote_identifier(column)
+    return '%s = %s' % (quote_identifier(column), quote_literal(value))
+
+
+def build_select(spec: TableSpec, filters: Dict[str, object], partitions: Optional[Dict[str, object]] = None, columns: Optional[Sequence[str]] = None, limit: Optional[int] = None) -> str:
+    """
+    Build a ``SELECT`` that reads only the projected columns and prunes partitions.
+
+    Example:
+    >>> spec = TableSpec('db', 'users', ('name', 'email'), ('dt',))
+    >>> print(build_select(spec, {'name': "o'brien"}, {'dt': '2024-01-01'}))
+    SELECT "name", "email" FROM "db"."users" WHERE "dt" = '2024-01-01' AND "name" = 'o''brien'
+
+    :param filters: Column -> value (``=``) or list of values (``IN (...)``).
+    :param partitions: Partition key -> value or list of values. Keys must be in ``spec.partition_keys``.
+    :param columns: Columns to return. Defaults to ``spec.columns``.
+    :param limit: Optional ``LIMIT``.
+    """
+    partitions = partitions or {}
+    unknown = [key for key in partitions if key not in spec.partition_keys]
+    if unknown:
+        raise ValueError('not partition keys of %s.%s: %s' % (spec.database, spec.table, ', '.join(unknown)))
+    columns = list(columns or spec.columns)
+    if not columns:
+        raise ValueError('at least one column is required')
+
+    # partition predicates first so they are easy to spot in the query history
+    predicates: List[str] = [_predicate(key, partitions[key]) for key in spec.partition_keys if key in partitions]
+    predicates.extend(_predicate(column, value) for column, value in filters.items())
+
+    query = 'SELECT %s FROM %s.%s' % (', '.join(quote_identifier(column) for column in columns), quote_identifier(spec.database), quote_identifier(spec.table))
+    if predicates:
+        query += ' WHERE ' + ' AND '.join(predicates)
+    if limit is not None:
+        query += ' LIMIT %d' % limit
+    return query
+
+
+def partitions_from_event(spec: TableSpec, event: dict) -> Dict[str, object]:
+    """
+    Pick the partition values an event carries, e.g. ``{"name": ..., "dt": "2024-01-01"}`` -> ``{"dt": "2024-01-01"}``.
+    """
+    return {key: event[key] for key in spec.partition_keys if event.get(key) is not None}
+
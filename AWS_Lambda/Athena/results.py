@@ -0,0 +1,132 @@
+import codecs
+import csv
+from typing import Iterator, Optional, Sequence, Tuple
+
+from botocore.exceptions import ClientError
+
+from decoder import ResultDecoder
+
+# athena returns at most 1000 rows per page
+MAX_PAGE_SIZE = 1000
+
+# results whose CSV is at least this large are read from S3 instead of get_query_results
+S3_THRESHOLD_BYTES = 1024 * 1024
+
+# bytes per ranged GET of the result CSV
+RANGE_SIZE = 8 * 1024 * 1024
+
+
+def iter_result_pages(client, query_execution_id: str, page_size: int = MAX_PAGE_SIZE) -> Iterator[dict]:
+    """
+    Lazily fetch ``get_query_results`` pages by following ``NextToken``.
+
+    Only one page is held at a time, and no further page is requested once the caller stops iterating.
+    """
+    kwargs = {'QueryExecutionId': query_execution_id, 'MaxResults': page_size}
+    while True:
+        page = client.get_query_results(**kwargs)
+        yield page
+        next_token = page.get('NextToken')
+        if not next_token:
+            return
+        kwargs['NextToken'] = next_token
+
+
+def iter_result_rows(client, query_execution_id: str, page_size: int = MAX_PAGE_SIZE, skip_header: bool = True) -> Iterator[Tuple[object, ...]]:
+    """
+    Yield the result rows of a query page by page, decoding them as they arrive.
+
+    Values are converted to Python types with a ``ResultDecoder`` built from the first page's ``ColumnInfo``.
+
+    :param skip_header: Skip the column header row that Athena puts first in the first page of SELECT results.
+    """
+    decoder = None
+    for page_number, page in enumerate(iter_result_pages(client, query_execution_id, page_size)):
+        if decoder is None:
+            decoder = ResultDecoder.from_result(page)
+        yield from decoder.decode_rows(page['ResultSet']['Rows'], skip_header=skip_header and page_number == 0)
+
+
+def split_s3_uri(uri: str) -> Tuple[str, str]:
+    """
+    Split ``s3://bucket/key`` into ``(bucket, key)``.
+    """
+    if not uri.startswith('s3://'):
+        raise ValueError('not an S3 URI: %s' % uri)
+    bucket, _, key = uri[len('s3://'):].partition('/')
+    return bucket, key
+
+
+def iter_s3_lines(s3, bucket: str, key: str, size: int, range_size: int = RANGE_SIZE) -> Iterator[str]:
+    """
+    Yield the lines (with their newline) of a UTF-8 S3 object, fetched ``range_size`` bytes at a time.
+
+    Multi-byte characters split across ranges are decoded incrementally, and only one range
+    plus the current partial line is held in memory.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ''
+    for start in range(0, size, range_size):
+        end = min(start + range_size, size) - 1
+        body = s3.get_object(Bucket=bucket, Key=key, Range='bytes=%d-%d' % (start, end))['Body']
+        lines = (pending + decoder.decode(body.read(), final=end == size - 1)).split('\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    if pending:
+        yield pending
+
+
+def iter_s3_csv_rows(s3, output_location: str, column_info: Sequence[dict], size: Optional[int] = None, range_size: int = RANGE_SIZE, skip_header: bool = True) -> Iterator[Tuple[object, ...]]:
+    """
+    Yield the rows of a query's output CSV (``<OutputLocation>``, e.g. ``s3://bucket/<query_execution_id>.csv``).
+
+    The object is parsed incrementally as ranges arrive, and values are converted with the same
+    ``ResultDecoder`` plan as the API path. Athena writes NULL as an empty field, so NULL and ``''``
+    can not be told apart in varchar columns; both become ``''``.
+
+    :param column_info: ``ResultSetMetadata.ColumnInfo`` of the query.
+    :param size: The object size if already known (e.g. from ``head_object``).
+    """
+    bucket, key = split_s3_uri(output_location)
+    if size is None:
+        size = s3.head_object(Bucket=bucket, Key=key)['ContentLength']
+    convert = ResultDecoder(column_info).convert_strings
+    # quoted values may contain newlines, csv.reader joins those lines back together
+    reader = csv.reader(iter_s3_lines(s3, bucket, key, size, range_size))
+    if skip_header:
+        next(reader, None)
+    for values in reader:
+        yield convert(values)
+
+
+def iter_query_rows(client, query_execution_id: str, s3, execution: Optional[dict] = None, threshold: int = S3_THRESHOLD_BYTES, page_size: int = MAX_PAGE_SIZE, range_size: int = RANGE_SIZE, skip_header: bool = True) -> Iterator[Tuple[object, ...]]:
+    """
+    Yield the result rows of a finished query from the API or straight from the output CSV on S3.
+
+    The size of the output object decides: small results are paged with ``get_query_results``,
+    large ones are streamed from S3 with ranged GETs, which is much faster than JSON paging.
+    The API path is also used when the output is not a CSV (e.g. DDL) or can not be read.
+
+    :param s3: An S3 client with read access to the query output location.
+    :param execution: The ``QueryExecution`` of the query (e.g. ``PollResult.execution``). Fetched when omitted.
+    """
+    if execution is None:
+        execution = client.get_query_execution(QueryExecutionId=query_execution_id)['QueryExecution']
+    output_location = execution.get('ResultConfiguration', {}).get('OutputLocation', '')
+
+    size = None
+    if output_location.endswith('.csv'):
+        bucket, key = split_s3_uri(output_location)
+        try:
+            size = s3.head_object(Bucket=bucket, Key=key)['ContentLength']
+        except ClientError as e:
+            print("S3 result unavailable, using get_query_results: %s" % e)
+
+    if size is None or size < threshold:
+        yield from iter_result_rows(client, query_execution_id, page_size, skip_header)
+        return
+
+    # one row is enough for ColumnInfo
+    column_info = client.get_query_results(QueryExecutionId=query_execution_id, MaxResults=1)['ResultSet']['ResultSetMetadata']['ColumnInfo']
+    yield from iter_s3_csv_rows(s3, output_location, column_info, size, range_size, skip_header)
@@ -0,0 +1,351 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Iterator, List, Optional
+
+from botocore.exceptions import ClientError
+
+# priority constant (lower runs first)
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9
+
+# in-flight queries per workgroup (keep below the account's active DML query quota)
+DEFAULT_MAX_IN_FLIGHT = 20
+
+# assumed query duration until real ones have been measured
+DEFAULT_QUERY_SECONDS = 2.0
+
+# smoothing of the measured query duration
+EWMA_ALPHA = 0.2
+
+# wait times kept for the metrics percentiles
+WAIT_SAMPLES = 1000
+
+# shared slots: a lease outlives the caller's deadline by this many seconds before others may reclaim it
+LEASE_GRACE_SECONDS = 5
+# lease length without a deadline (the Lambda timeout limit)
+DEFAULT_LEASE_SECONDS = 900
+# polling for a free shared slot (seconds, doubled up to the maximum, with jitter)
+SLOT_POLL_INITIAL = 0.1
+SLOT_POLL_MAX = 1.0
+# share of the shared slots low priority queries may not take, kept for normal and high priority ones
+LOW_PRIORITY_HEADROOM = 0.2
+
+
+class SchedulerBusy(Exception):
+    """
+    Raised when a query can not start before the caller's deadline.
+
+    :ivar retry_after: Seconds after which a retry is likely to be admitted.
+    """
+
+    def __init__(self, workgroup: str, retry_after: float):
+        super().__init__('workgroup %s is busy, retry after %.1fs' % (workgroup, retry_after))
+        self.workgroup = workgroup
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ('priority', 'event', 'granted', 'cancelled')
+
+    def __init__(self, priority: int):
+        self.priority = priority
+        self.event = threading.Event()
+        self.granted = False
+        self.cancelled = False
+
+
+class _Workgroup:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiting = 0
+        # (priority, sequence, waiter)
+        self.heap: List[tuple] = []
+        self.query_seconds = DEFAULT_QUERY_SECONDS
+        self.waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self.counts = {'admitted': 0, 'queued': 0, 'rejected': 0, 'max_queue_depth': 0, 'shared_admitted': 0, 'shared_rejected': 0}
+
+
+def deadline_from_context(context, margin_ms: int = 0, clock: Callable[[], float] = time.monotonic) -> Optional[float]:
+    """
+    Return the ``clock()`` time ``margin_ms`` before the Lambda times out, or None without a context.
+    """
+    if context is None:
+        return None
+    return clock() + (context.get_remaining_time_in_millis() - margin_ms) / 1000
+
+
+class DynamoDBSlots:
+    """
+    Per-workgroup query slots shared by every Lambda container, in a DynamoDB table with the
+    string partition key ``workgroup``.
+
+    Each item holds the leases of the running queries (lease id -> expiry, epoch seconds) and a
+    version. A slot is taken by writing the item back with one more lease, conditional on the
+    version read, so concurrent containers never exceed ``limit`` together. Expired leases (a
+    container that timed out before releasing) are dropped on the next write.
+
+    Priorities can not be queued across containers, so ``PRIORITY_LOW`` queries leave
+    ``LOW_PRIORITY_HEADROOM`` of the slots to the others instead.
+
+    :param dynamodb: A DynamoDB client.
+    :param table_name: The table of the slot items.
+    """
+
+    def __init__(self, dynamodb, table_name: str, clock: Callable[[], float] = time.time, sleep: Callable[[float], None] = time.sleep):
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.clock = clock
+        self.sleep = sleep
+
+    def _read(self, workgroup: str):
+        item = self.dynamodb.get_item(TableName=self.table_name, Key={'workgroup': {'S': workgroup}}, ConsistentRead=True).get('Item')
+        if item is None:
+            return {}, None
+        leases = {lease: float(value['N']) for lease, value in item.get('leases', {}).get('M', {}).items()}
+        return leases, item['version']['N']
+
+    def _write(self, workgroup: str, leases: Dict[str, float], version: Optional[str]) -> bool:
+        # returns False when another container wrote the item since it was read
+        condition, values = ('attribute_not_exists(workgroup)', {}) if version is None else ('version = :version', {':version': {'N': version}})
+        kwargs = {'ExpressionAttributeValues': values} if values else {}
+        try:
+            self.dynamodb.put_item(
+                TableName=self.table_name,
+                Item={
+                    'workgroup': {'S': workgroup},
+                    'leases': {'M': {lease: {'N': repr(expires)} for lease, expires in leases.items()}},
+                    'version': {'N': str(int(version or 0) + 1)},
+                },
+                ConditionExpression=condition,
+                **kwargs
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+        return True
+
+    @staticmethod
+    def _allowed(limit: int, priority: int) -> int:
+        if priority >= PRIORITY_LOW and limit > 1:
+            return limit - max(1, int(limit * LOW_PRIORITY_HEADROOM))
+        return limit
+
+    def try_acquire(self, workgroup: str, limit: int, priority: int = PRIORITY_NORMAL, expires_at: Optional[float] = None) -> Optional[str]:
+        """
+        Take a slot if one is free.
+
+        :param expires_at: Epoch seconds after which the lease may be reclaimed.
+        :return: The lease id, or None when every slot is taken.
+        """
+        while True:
+            leases, version = self._read(workgroup)
+            now = self.clock()
+            live = {lease: expires for lease, expires in leases.items() if expires > now}
+            if len(live) >= self._allowed(limit, priority):
+                return None
+            lease = uuid.uuid4().hex
+            live[lease] = expires_at if expires_at is not None else now + DEFAULT_LEASE_SECONDS
+            if self._write(workgroup, live, version):
+                return lease
+
+    def acquire(self, workgroup: str, limit: int, priority: int = PRIORITY_NORMAL, expires_at: Optional[float] = None, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Wait up to ``timeout`` seconds (None: indefinitely) for a slot, polling with jittered backoff.
+
+        :return: The lease id, or None when no slot was free in time.
+        """
+        give_up = None if timeout is None else self.clock() + timeout
+        delay = SLOT_POLL_INITIAL
+        while True:
+            lease = self.try_acquire(workgroup, limit, priority, expires_at)
+            if lease is not None:
+                return lease
+            now = self.clock()
+            if give_up is not None and now >= give_up:
+                return None
+            pause = random.uniform(delay / 2, delay)
+            self.sleep(pause if give_up is None else min(pause, give_up - now))
+            delay = min(delay * 2, SLOT_POLL_MAX)
+
+    def release(self, workgroup: str, lease: str) -> None:
+        while True:
+            leases, version = self._read(workgroup)
+            if lease not in leases:
+                return
+            del leases[lease]
+            if self._write(workgroup, leases, version):
+                return
+
+    def in_flight(self, workgroup: str) -> int:
+        now = self.clock()
+        return sum(1 for expires in self._read(workgroup)[0].values() if expires > now)
+
+
+class QueryScheduler:
+    """
+    Cap in-flight Athena queries per workgroup and queue the excess by priority.
+
+    A caller holds a slot from ``start_query_execution`` until the query finishes. When every
+    slot is taken the caller waits in a priority queue (FIFO within a priority) and the next
+    freed slot is handed to the first waiter. Before queueing, the wait is estimated from the
+    queue position and the measured query duration; when the wait plus one query would not
+    fit before the caller's deadline, ``SchedulerBusy`` is raised at once with a ``retry_after``
+    hint instead of burning the polling budget.
+
+    The queue only orders the threads of one execution environment. A Lambda container runs one
+    invocation at a time, so to cap the queries of concurrent invocations pass ``shared``
+    (``DynamoDBSlots``): ``slot`` then also holds a shared slot, waiting for one until the
+    deadline and raising ``SchedulerBusy`` when none frees up in time.
+
+    :param max_in_flight: The default limit per workgroup.
+    :param limits: Per-workgroup overrides, e.g. ``{"adhoc": 5}``.
+    :param shared: ``DynamoDBSlots`` applying the same limits across containers, or None.
+    """
+
+    def __init__(self, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, limits: Optional[Dict[str, int]] = None, clock: Callable[[], float] = time.monotonic, shared: Optional[DynamoDBSlots] = None):
+        if max_in_flight <= 0:
+            raise ValueError('max_in_flight must be greater than 0')
+        self.max_in_flight = max_in_flight
+        self.limits = dict(limits or {})
+        self.clock = clock
+        self.shared = shared
+        self._workgroups: Dict[str, _Workgroup] = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def _workgroup(self, workgroup: str) -> _Workgroup:
+        state = self._workgroups.get(workgroup)
+        if state is None:
+            state = self._workgroups[workgroup] = _Workgroup(self.limits.get(workgroup, self.max_in_flight))
+        return state
+
+    def _estimate_wait(self, state: _Workgroup, priority: int) -> float:
+        # every `limit` queries ahead of us take about one query duration to drain
+        ahead = sum(1 for _, _, waiter in state.heap if not waiter.cancelled and waiter.priority <= priority)
+        return (ahead // state.limit + 1) * state.query_seconds
+
+    def acquire(self, workgroup: str = 'primary', priority: int = PRIORITY_NORMAL, deadline: Optional[float] = None) -> float:
+        """
+        Wait for a slot in ``workgroup``.
+
+        :param deadline: The ``clock()`` time by which the query must have finished, or None to wait indefinitely.
+        :return: The seconds spent waiting.
+        :raises SchedulerBusy: When the slot (plus one query) can not be had before ``deadline``.
+        """
+        start = self.clock()
+        with self._lock:
+            state = self._workgroup(workgroup)
+            if state.in_flight < state.limit and state.waiting == 0:
+                state.in_flight += 1
+                state.counts['admitted'] += 1
+                state.waits.append(0.0)
+                return 0.0
+
+            estimate = self._estimate_wait(state, priority)
+            if deadline is not None and start + estimate + state.query_seconds > deadline:
+                state.counts['rejected'] += 1
+                raise SchedulerBusy(workgroup, estimate)
+
+            waiter = _Waiter(priority)
+            heapq.heappush(state.heap, (priority, next(self._sequence), waiter))
+            state.waiting += 1
+            state.counts['queued'] += 1
+            state.counts['max_queue_depth'] = max(state.counts['max_queue_depth'], state.waiting)
+
+        timeout = None if deadline is None else max(0.0, deadline - state.query_seconds - self.clock())
+        waiter.event.wait(timeout)
+        with self._lock:
+            # a slot handed over just after the timeout still counts
+            if not waiter.granted:
+                waiter.cancelled = True
+                state.waiting -= 1
+                state.counts['rejected'] += 1
+                raise SchedulerBusy(workgroup, self._estimate_wait(state, priority))
+            waited = self.clock() - start
+            state.counts['admitted'] += 1
+            state.waits.append(waited)
+            return waited
+
+    def release(self, workgroup: str = 'primary', query_seconds: Optional[float] = None) -> None:
+        """
+        Free a slot, handing it to the first waiter if any.
+
+        :param query_seconds: How long the slot was held, to refine wait estimates.
+        """
+        with self._lock:
+            state = self._workgroup(workgroup)
+            if query_seconds is not None:
+                state.query_seconds += EWMA_ALPHA * (query_seconds - state.query_seconds)
+            while state.heap:
+                _, _, waiter = heapq.heappop(state.heap)
+                if waiter.cancelled:
+                    continue
+                waiter.granted = True
+                state.waiting -= 1
+                waiter.event.set()
+                return
+            state.in_flight -= 1
+
+    @contextmanager
+    def slot(self, workgroup: str = 'primary', priority: int = PRIORITY_NORMAL, deadline: Optional[float] = None) -> Iterator[float]:
+        """
+        Hold a slot for the duration of the block. Yields the seconds spent waiting.
+        """
+        waited = self.acquire(workgroup, priority, deadline)
+        lease = start = None
+        try:
+            if self.shared is not None:
+                shared_start = self.clock()
+                lease = self._acquire_shared(workgroup, priority, deadline)
+                waited += self.clock() - shared_start
+            start = self.clock()
+            yield waited
+        finally:
+            if lease is not None:
+                self.shared.release(workgroup, lease)
+            # a slot given back without running a query does not count as a query duration
+            self.release(workgroup, self.clock() - start if start is not None else None)
+
+    def _acquire_shared(self, workgroup: str, priority: int, deadline: Optional[float]) -> str:
+        with self._lock:
+            state = self._workgroup(workgroup)
+            query_seconds = state.query_seconds
+        timeout = expires_at = None
+        if deadline is not None:
+            timeout = max(0.0, deadline - query_seconds - self.clock())
+            expires_at = self.shared.clock() + (deadline - self.clock()) + LEASE_GRACE_SECONDS
+        lease = self.shared.acquire(workgroup, state.limit, priority, expires_at, timeout)
+        with self._lock:
+            if lease is None:
+                state.counts['shared_rejected'] += 1
+                raise SchedulerBusy(workgroup, query_seconds)
+            state.counts['shared_admitted'] += 1
+        return lease
+
+    def metrics(self) -> Dict[str, dict]:
+        """
+        Return per-workgroup in-flight count, queue depth, counters and wait-time percentiles (seconds).
+        """
+        metrics = {}
+        with self._lock:
+            for workgroup, state in self._workgroups.items():
+                waits = sorted(state.waits)
+                metrics[workgroup] = dict(
+                    state.counts,
+                    in_flight=state.in_flight,
+                    queue_depth=state.waiting,
+                    query_seconds=round(state.query_seconds, 3),
+                    wait_p50=waits[len(waits) // 2] if waits else 0.0,
+                    wait_p95=waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+                    wait_max=waits[-1] if waits else 0.0,
+                )
+        return metrics
@@ -0,0 +1,131 @@
+import tempfile
+import threading
+import time
+import unittest
+
+# run from AWS_Lambda: python -m pytest Athena/test_cache.py
+from cache import QueryResultCache, normalize_sql
+from lambda_common.fakes import FakeClock, wait_until
+
+
+class TestQueryResultCache(unittest.TestCase):
+
+    def test_normalize_keeps_literals(self):
+        self.assertEqual(normalize_sql("SELECT *\n  FROM t where x = 'a  b';"), "SELECT * FROM t where x = 'a  b'")
+
+    def test_ttl(self):
+        clock = FakeClock(1000.0)
+        cache = QueryResultCache(ttl=10, clock=clock)
+        self.assertEqual(cache.get_or_execute('SELECT 1', lambda: 'first'), 'first')
+        clock.now += 9
+        self.assertEqual(cache.get_or_execute('SELECT  1;', lambda: 'second'), 'first')
+        clock.now += 1
+        self.assertIsNone(cache.get('SELECT 1'))
+        self.assertEqual(cache.get_or_execute('SELECT 1', lambda: 'second'), 'second')
+        metrics = cache.metrics()
+        self.assertEqual((metrics['hits'], metrics['misses']), (1, 2))
+
+    def test_lru_eviction(self):
+        cache = QueryResultCache(max_entries=2)
+        cache.get_or_execute('a', lambda: 1)
+        cache.get_or_execute('b', lambda: 2)
+        cache.get('a')
+        cache.get_or_execute('c', lambda: 3)
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+
+    def test_disk_tier_survives_a_new_cache(self):
+        clock = FakeClock(1000.0)
+        with tempfile.TemporaryDirectory() as disk_dir:
+            QueryResultCache(ttl=10, disk_dir=disk_dir, clock=clock).get_or_execute('SELECT 1', lambda: [1])
+            cache = QueryResultCache(ttl=10, disk_dir=disk_dir, clock=clock)
+            self.assertEqual(cache.get('SELECT 1'), [1])
+            self.assertEqual(cache.metrics()['disk_hits'], 1)
+            clock.now += 10
+            self.assertIsNone(QueryResultCache(ttl=10, disk_dir=disk_dir, clock=clock).get('SELECT 1'))
+
+    def test_cached_none_is_a_hit(self):
+        cache = QueryResultCache()
+        calls = []
+        for _ in range(3):
+            self.assertIsNone(cache.get_or_execute('SELECT 1', lambda: calls.append(1)))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.get('SELECT 1', 'missing'), None)
+        self.assertEqual(cache.get('SELECT 2', 'missing'), 'missing')
+        self.assertEqual(cache.metrics()['hits'], 3)
+
+    def test_disk_reads_do_not_hold_the_lock(self):
+        with tempfile.TemporaryDirectory() as disk_dir:
+            cache = QueryResultCache(disk_dir=disk_dir)
+            cache.get_or_execute('SELECT 1', lambda: 1)
+            entered, release = threading.Event(), threading.Event()
+            read_disk = cache._read_disk
+
+            def slow_read_disk(key):
+                entered.set()
+                release.wait(5)
+                return read_disk(key)
+
+            cache._read_disk = slow_read_disk
+            thread = threading.Thread(target=cache.get_or_execute, args=('SELECT 2', lambda: 2))
+            thread.start()
+            try:
+                self.assertTrue(entered.wait(5))
+                # a memory hit on another query is not blocked by the pending disk read
+                results = []
+                reader = threading.Thread(target=lambda: results.append(cache.get('SELECT 1')))
+                reader.start()
+                reader.join(1)
+                self.assertEqual(results, [1])
+            finally:
+                release.set()
+                thread.join()
+            self.assertEqual(cache.get('SELECT 2'), 2)
+
+    def test_single_flight(self):
+        cache = QueryResultCache()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def execute():
+            calls.append(1)
+            release.wait(5)
+            return 'rows'
+
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_execute('SELECT 1', execute))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        wait_until(lambda: cache.metrics()['shared'] == 4)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['rows'] * 5)
+
+    def test_errors_are_shared_but_not_cached(self):
+        cache = QueryResultCache()
+        release = threading.Event()
+        errors = []
+
+        def execute():
+            release.wait(5)
+            raise RuntimeError('query failed')
+
+        def lookup():
+            try:
+                cache.get_or_execute('SELECT 1', execute)
+            except RuntimeError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=lookup) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        wait_until(lambda: cache.metrics()['shared'] == 2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(cache.get_or_execute('SELECT 1', lambda: 'ok'), 'ok')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+import uuid
+from datetime import datetime, timedelta, timezone
+
+# run from AWS_Lambda: python -m pytest Athena/test_cleanup.py
+from cleanup import CleanupQueue, iter_stale_output_keys, output_keys, output_location
+from lambda_common.fakes import ClientError, FakeS3Client
+
+
+class ScriptedS3:
+    """
+    ``delete_objects`` fails the keys in ``failing`` for their first ``failures`` attempts.
+    """
+
+    def __init__(self, failing=(), failures=0, raises=0):
+        self.failing = set(failing)
+        self.failures = failures
+        self.raises = raises
+        self.batches = []
+        self.attempts = {}
+
+    def delete_objects(self, Bucket, Delete):
+        keys = [obj['Key'] for obj in Delete['Objects']]
+        self.batches.append(keys)
+        if self.raises:
+            self.raises -= 1
+            raise ClientError('SlowDown', 'Please reduce your request rate.', 'DeleteObjects')
+        errors = []
+        for key in keys:
+            if key in self.failing:
+                self.attempts[key] = self.attempts.get(key, 0) + 1
+                if self.attempts[key] <= self.failures:
+                    errors.append({'Key': key, 'Code': 'InternalError'})
+        return {'Errors': errors} if errors else {}
+
+class TestCleanupQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.sleeps = []
+
+    def queue(self, s3, **kwargs):
+        return CleanupQueue(lambda: s3, 'bucket', flush_interval=3600, sleep=self.sleeps.append, **kwargs)
+
+    def test_output_location(self):
+        self.assertEqual(output_location('s3://bucket/athena/results/'), ('bucket', 'athena/results/'))
+        self.assertEqual(output_location('s3://bucket'), ('bucket', ''))
+        self.assertEqual(output_keys('q1', 'out/'), ['out/q1.csv', 'out/q1.csv.metadata'])
+
+    def test_failed_keys_are_retried_with_backoff(self):
+        s3 = ScriptedS3(failing=['b'], failures=2)
+        queue = self.queue(s3)
+        queue.enqueue(['a', 'b', 'c'])
+        self.assertEqual(queue.flush(), 3)
+        self.assertEqual(s3.batches, [['a', 'b', 'c'], ['b'], ['b']])
+        self.assertEqual(self.sleeps, [0.5, 1.0])
+        self.assertEqual(queue.metrics()['retries'], 2)
+
+    def test_keys_are_dropped_after_max_attempts(self):
+        s3 = ScriptedS3(failing=['b'], failures=10)
+        queue = self.queue(s3, max_attempts=3)
+        queue.enqueue(['a', 'b'])
+        self.assertEqual(queue.flush(), 1)
+        self.assertEqual(len(s3.batches), 3)
+        self.assertEqual(self.sleeps, [0.5, 1.0])
+        metrics = queue.metrics()
+        self.assertEqual((metrics['deleted'], metrics['failed'], metrics['pending']), (1, 1, 0))
+
+    def test_request_errors_retry_the_whole_batch(self):
+        s3 = ScriptedS3(raises=1)
+        queue = self.queue(s3)
+        queue.enqueue(['a', 'b'])
+        self.assertEqual(queue.flush(), 2)
+        self.assertEqual(s3.batches, [['a', 'b'], ['a', 'b']])
+
+    def test_backlog_survives_a_restart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            backlog_path = os.path.join(directory, 'cleanup', 'backlog')
+            self.queue(ScriptedS3(), backlog_path=backlog_path).enqueue(['a', 'b', 'a'])
+            restarted = self.queue(ScriptedS3(), backlog_path=backlog_path)
+            self.assertEqual(len(restarted), 2)
+            self.assertEqual(restarted.flush(), 2)
+            self.assertEqual(len(self.queue(ScriptedS3(), backlog_path=backlog_path)), 0)
+
+    def test_delete_streams_full_batches(self):
+        s3 = ScriptedS3()
+        queue = self.queue(s3)
+        self.assertEqual(queue.delete('key%d' % i for i in range(2500)), 2500)
+        self.assertEqual([len(batch) for batch in s3.batches], [1000, 1000, 500])
+
+class TestStaleOutputSweep(unittest.TestCase):
+
+    def test_only_old_output_directly_under_the_prefix(self):
+        qid = str(uuid.uuid4())
+        with tempfile.TemporaryDirectory() as root:
+            s3 = FakeS3Client(root)
+            keys = ['out/%s.csv' % qid, 'out/%s.csv.metadata' % qid, 'out/%s.txt' % qid, 'out/notes.csv', 'out/data/%s.csv' % qid, 'other/%s.csv' % qid]
+            for key in keys:
+                s3.put_object(Bucket='bucket', Key=key, Body=b'x')
+            later = datetime.now(timezone.utc) + timedelta(hours=1)
+            self.assertEqual(sorted(iter_stale_output_keys(s3, 'bucket', 'out/', now=later)), sorted(keys[:3]))
+            # fresh objects may still be read by a running query
+            self.assertEqual(list(iter_stale_output_keys(s3, 'bucket', 'out/')), [])
+            # the bucket root only matches the top-level output
+            self.assertEqual(list(iter_stale_output_keys(s3, 'bucket', '', now=later)), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from datetime import date, datetime
+from decimal import Decimal
+
+# run from AWS_Lambda: python -m pytest Athena/test_decoder.py
+from decoder import ResultDecoder, converter_for
+
+COLUMN_INFO = [
+    {'Name': 'id', 'Type': 'bigint'},
+    {'Name': 'name', 'Type': 'varchar'},
+    {'Name': 'price', 'Type': 'decimal(10,2)'},
+    {'Name': 'active', 'Type': 'boolean'},
+    {'Name': 'day', 'Type': 'date'},
+    {'Name': 'created', 'Type': 'timestamp'},
+    {'Name': 'tags', 'Type': 'array'},
+]
+
+
+def row(*values):
+    return {'Data': [{} if value is None else {'VarCharValue': value} for value in values]}
+
+
+HEADER = row('id', 'name', 'price', 'active', 'day', 'created', 'tags')
+
+class TestDecoder(unittest.TestCase):
+
+    def test_converter_for(self):
+        self.assertIs(converter_for('BIGINT'), int)
+        self.assertIs(converter_for('decimal(10,2)'), Decimal)
+        self.assertIsNone(converter_for('varchar'))
+        self.assertIsNone(converter_for('map(varchar,integer)'))
+
+    def test_decode_row(self):
+        decoder = ResultDecoder(COLUMN_INFO)
+        self.assertEqual(
+            decoder.decode_row(row('7', 'a', '1.50', 'true', '2024-01-02', '2024-01-02 03:04:05.000', '[1, 2]')),
+            (7, 'a', Decimal('1.50'), True, date(2024, 1, 2), datetime(2024, 1, 2, 3, 4, 5), '[1, 2]'),
+        )
+
+    def test_null_stays_none(self):
+        decoder = ResultDecoder(COLUMN_INFO)
+        self.assertEqual(decoder.decode_row(row(None, None, None, 'false', None, None, None)), (None, None, None, False, None, None, None))
+
+    def test_decode_rows_skips_header(self):
+        result = {'ResultSet': {'Rows': [HEADER, row('1', 'a', None, 'true', None, None, None), row('2', 'b', None, 'false', None, None, None)], 'ResultSetMetadata': {'ColumnInfo': COLUMN_INFO}}}
+        decoder = ResultDecoder.from_result(result)
+        rows = list(decoder.decode_rows(result['ResultSet']['Rows'], skip_header=True))
+        self.assertEqual([(r[0], r[1], r[3]) for r in rows], [(1, 'a', True), (2, 'b', False)])
+
+    def test_decode_columns(self):
+        decoder = ResultDecoder(COLUMN_INFO[:2])
+        columns = decoder.decode_columns([row('id', 'name'), row('1', 'a'), row(None, 'b')], skip_header=True)
+        self.assertEqual(columns, {'id': [1, None], 'name': ['a', 'b']})
+
+    def test_convert_strings_empty_is_null_for_typed_columns(self):
+        decoder = ResultDecoder(COLUMN_INFO[:3])
+        self.assertEqual(decoder.convert_strings(['', '', '']), (None, '', None))
+        self.assertEqual(decoder.convert_strings(['3', 'x', '0.10']), (3, 'x', Decimal('0.10')))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import contextlib
+import importlib.util
+import io
+import os
+import tempfile
+import unittest
+
+# run from AWS_Lambda: python -m pytest Athena/test_handler.py
+from cache import QueryResultCache
+from lambda_common.clients import set_client
+from lambda_common.fakes import FakeAthenaClient, FakeContext, FakeS3Client
+
+
+def load_main():
+    # main.py shares its module name with calculate_intervals/main.py, so load it under its own name
+    spec = importlib.util.spec_from_file_location('athena_main', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+main = load_main()
+
+
+class TypedAthena(FakeAthenaClient):
+    """
+    Reports the lookup column as bigint, so the decoded keys come back as int while the event names are strings.
+    """
+
+    def _execute(self, execution):
+        super()._execute(execution)
+        for column in execution.columns:
+            if column['Name'] == main.COLUMN:
+                column['Type'] = 'bigint'
+
+
+class TestBatchHandler(unittest.TestCase):
+
+    def setUp(self):
+        self._root = tempfile.TemporaryDirectory()
+        self.addCleanup(self._root.cleanup)
+        self.s3 = FakeS3Client(self._root.name)
+        for name in ('index', 'cache', 'CLEANUP_OUTPUT', 'BATCH_MAX_ITEMS'):
+            self.addCleanup(setattr, main, name, getattr(main, name))
+        main.index = None
+        main.cache = QueryResultCache()
+        main.CLEANUP_OUTPUT = False
+
+    def use_athena(self, records, athena_class=FakeAthenaClient):
+        self.athena = athena_class({'%s.%s' % (main.DATABASE, main.TABLE): records}, self.s3)
+        set_client('athena', self.athena)
+        set_client('s3', self.s3)
+
+    def handle(self, event):
+        # the handler prints query ids and metrics
+        with contextlib.redirect_stdout(io.StringIO()):
+            return main.lambda_handler(event, FakeContext())
+
+    def record(self, name, email):
+        return {main.COLUMN: name, main.EMAIL_COLUMN: email}
+
+    def test_repeated_names_are_queried_once(self):
+        self.use_athena([self.record('alice', 'alice@example.com'), self.record('bob', 'bob@example.com')])
+        emails = self.handle({'names': ['alice', 'bob', 'alice']})
+        self.assertEqual(emails, {'alice': 'alice@example.com', 'bob': 'bob@example.com'})
+        self.assertEqual(self.athena.calls['StartQueryExecution'], 1)
+
+    def test_names_above_batch_max_items_are_split(self):
+        main.BATCH_MAX_ITEMS = 2
+        self.use_athena([self.record('user%d' % i, 'user%d@example.com' % i) for i in range(5)])
+        names = ['user%d' % i for i in range(5)]
+        emails = self.handle({'names': names + ['user0']})
+        self.assertEqual(emails, {name: '%s@example.com' % name for name in names})
+        # 5 distinct names in IN (...) lists of at most 2
+        self.assertEqual(self.athena.calls['StartQueryExecution'], 3)
+
+    def test_typed_keys_match_string_names(self):
+        self.use_athena([self.record('1', 'one@example.com'), self.record('2', 'two@example.com')], TypedAthena)
+        self.assertEqual(self.handle({'names': ['1', '2']}), {'1': 'one@example.com', '2': 'two@example.com'})
+
+    def test_ambiguous_and_missing_names_are_none(self):
+        self.use_athena([self.record('alice', 'alice@example.com'), self.record('twin', 'a@example.com'), self.record('twin', 'b@example.com')])
+        emails = self.handle({'names': ['alice', 'twin', 'nobody']})
+        self.assertEqual(emails, {'alice': 'alice@example.com', 'twin': None, 'nobody': None})
+        self.assertEqual(self.athena.calls['StartQueryExecution'], 1)
+
+
+class TestHandlerSetup(unittest.TestCase):
+
+    def test_unset_slot_table_is_reported(self):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            load_main()
+        self.assertIn('MAX_IN_FLIGHT=%d is enforced per container only' % main.MAX_IN_FLIGHT, out.getvalue())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+import unittest
+
+# run from AWS_Lambda: python -m pytest Athena/test_lookup_index.py
+from lookup_index import AMBIGUOUS, MANIFEST, LookupIndex, open_index, update_index
+
+class TestLookupIndex(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.index_dir = os.path.join(self._tmp.name, 'index')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def segment(self, name, records):
+        path = os.path.join(self._tmp.name, name)
+        with open(path, 'w', encoding='utf-8') as fp:
+            for record in records:
+                fp.write(json.dumps(record) + '\n')
+        return path
+
+    def layers(self):
+        return sorted(name for name in os.listdir(self.index_dir) if name.endswith('.idx'))
+
+    def test_build_and_lookup(self):
+        records = [{'name': 'user%d' % i, 'email': 'user%d@example.com' % i} for i in range(1000)]
+        records += [{'name': 'twin', 'email': 'a@example.com'}, {'name': 'twin', 'email': 'b@example.com'}, {'name': 'nomail'}]
+        self.assertEqual(update_index(self.index_dir, [self.segment('part-0.jsonl', records)]), ['part-0.jsonl'])
+        index = open_index(self.index_dir)
+        self.assertEqual(index.get('user123'), 'user123@example.com')
+        self.assertEqual(index.get('ユーザー'), None)
+        self.assertIs(index.get('twin'), AMBIGUOUS)
+        self.assertIsNone(index.get('nomail'))
+        self.assertEqual(len(index), 1001)
+        index.close()
+
+    def test_update_adds_a_layer_and_skips_known_segments(self):
+        first = self.segment('part-0.jsonl', [{'name': 'a', 'email': 'a@example.com'}])
+        second = self.segment('part-1.jsonl', [{'name': 'b', 'email': 'b@example.com'}, {'name': 'a', 'email': 'a2@example.com'}])
+        update_index(self.index_dir, [first])
+        self.assertEqual(update_index(self.index_dir, [first, second]), ['part-1.jsonl'])
+        self.assertEqual(update_index(self.index_dir, [first, second]), [])
+        index = LookupIndex(self.index_dir)
+        self.assertEqual(len(index.layers), 2)
+        self.assertEqual(index.get('b'), 'b@example.com')
+        # exported in two segments: more than one row, like the Athena lookup
+        self.assertIs(index.get('a'), AMBIGUOUS)
+        index.close()
+
+    def test_compaction(self):
+        paths = [self.segment('part-%d.jsonl' % i, [{'name': 'k%d' % i, 'email': 'v%d' % i}]) for i in range(3)]
+        for path in paths[:2]:
+            update_index(self.index_dir, [path], max_layers=2)
+        self.assertEqual(self.layers(), ['layer-00001.idx', 'layer-00002.idx'])
+        update_index(self.index_dir, paths, max_layers=2)
+        # the merged layer is written, the old ones stay until the next update for readers of the old manifest
+        self.assertEqual(self.layers(), ['layer-00001.idx', 'layer-00002.idx', 'layer-00003.idx', 'layer-00004.idx'])
+        index = open_index(self.index_dir)
+        self.assertEqual(len(index.layers), 1)
+        self.assertEqual([index.get('k%d' % i) for i in range(3)], ['v0', 'v1', 'v2'])
+        index.close()
+        update_index(self.index_dir, paths, max_layers=2)
+        self.assertEqual(self.layers(), ['layer-00004.idx'])
+
+    def test_changed_segment_is_rejected(self):
+        path = self.segment('part-0.jsonl', [{'name': 'a', 'email': 'a@example.com'}])
+        update_index(self.index_dir, [path])
+        self.segment('part-0.jsonl', [{'name': 'a', 'email': 'changed@example.com'}])
+        with self.assertRaisesRegex(ValueError, 'part-0.jsonl changed'):
+            update_index(self.index_dir, [path])
+
+    def test_no_index(self):
+        self.assertIsNone(open_index(None))
+        self.assertIsNone(open_index(self.index_dir))
+        update_index(self.index_dir, [])
+        self.assertTrue(os.path.isfile(os.path.join(self.index_dir, MANIFEST)))
+        self.assertEqual(len(open_index(self.index_dir)), 0)
+
+if __name__ == "__main__":
+    unittest.main()
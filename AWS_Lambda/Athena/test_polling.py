@@ -0,0 +1,64 @@
+import random
+import unittest
+
+# run from AWS_Lambda: python -m pytest Athena/test_polling.py
+from lambda_common.fakes import FakeClock, FakeContext
+from polling import QueryFailed, QueryTimeout, backoff_delays, wait_for_query
+
+
+class ScriptedAthena:
+
+    def __init__(self, states):
+        self.states = list(states)
+        self.stopped = []
+
+    def get_query_execution(self, QueryExecutionId):
+        state = self.states.pop(0) if len(self.states) > 1 else self.states[0]
+        return {'QueryExecution': {'QueryExecutionId': QueryExecutionId, 'Status': {'State': state, 'StateChangeReason': 'boom'}}}
+
+    def stop_query_execution(self, QueryExecutionId):
+        self.stopped.append(QueryExecutionId)
+
+class TestPolling(unittest.TestCase):
+
+    def test_backoff_is_capped_with_jitter(self):
+        delays = backoff_delays(0.2, 1.0, 2.0, random.Random(0))
+        bases = [0.2, 0.4, 0.8, 1.0, 1.0, 1.0]
+        for base in bases:
+            delay = next(delays)
+            self.assertGreaterEqual(delay, base / 2)
+            self.assertLessEqual(delay, base)
+
+    def test_succeeds_after_polls(self):
+        clock = FakeClock()
+        client = ScriptedAthena(['QUEUED', 'RUNNING', 'RUNNING', 'SUCCEEDED'])
+        result = wait_for_query(client, 'q1', delays=iter([0.1, 0.2, 0.4]), sleep=clock.sleep, clock=clock)
+        self.assertEqual(result.state, 'SUCCEEDED')
+        self.assertEqual(result.polls, 4)
+        self.assertEqual(clock.sleeps, [0.1, 0.2, 0.4])
+        self.assertAlmostEqual(result.elapsed, 0.7)
+
+    def test_failed_query(self):
+        clock = FakeClock()
+        with self.assertRaisesRegex(QueryFailed, 'FAILED boom'):
+            wait_for_query(ScriptedAthena(['RUNNING', 'FAILED']), 'q1', delays=iter([0.1]), sleep=clock.sleep, clock=clock)
+
+    def test_deadline_from_context_stops_query(self):
+        clock = FakeClock()
+        client = ScriptedAthena(['RUNNING'])
+        # 5 s left, 3 s margin: polling must stop 2 s in, never sleeping past the deadline
+        context = FakeContext(timeout=5.0, clock=clock)
+        with self.assertRaises(QueryTimeout):
+            wait_for_query(client, 'q1', context, delays=backoff_delays(rng=random.Random(0)), sleep=clock.sleep, clock=clock)
+        self.assertEqual(client.stopped, ['q1'])
+        self.assertAlmostEqual(clock.now, 2.0)
+
+    def test_max_wait_without_context(self):
+        clock = FakeClock()
+        client = ScriptedAthena(['QUEUED'])
+        with self.assertRaises(QueryTimeout):
+            wait_for_query(client, 'q1', max_wait=10.0, delays=iter([4.0] * 10), sleep=clock.sleep, clock=clock)
+        self.assertEqual(clock.sleeps, [4.0, 4.0, 2.0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from datetime import date, datetime
+from decimal import Decimal
+
+# run from AWS_Lambda: python -m pytest Athena/test_query_builder.py
+from lambda_common.fakes import FakeAthenaClient
+from query_builder import TableSpec, build_select, partitions_from_event, quote_identifier, quote_literal
+
+SPEC = TableSpec('db', 'users', ('name', 'email'), ('dt',))
+
+class TestQueryBuilder(unittest.TestCase):
+
+    def test_quote_literal(self):
+        self.assertEqual(quote_literal("o'brien"), "'o''brien'")
+        self.assertEqual(quote_literal("x' OR '1'='1"), "'x'' OR ''1''=''1'")
+        self.assertEqual(quote_literal(None), 'NULL')
+        self.assertEqual(quote_literal(True), 'TRUE')
+        self.assertEqual(quote_literal(3), '3')
+        self.assertEqual(quote_literal(Decimal('1.50')), "DECIMAL '1.50'")
+        self.assertEqual(quote_literal(date(2024, 1, 2)), "DATE '2024-01-02'")
+        self.assertEqual(quote_literal(datetime(2024, 1, 2, 3, 4, 5)), "TIMESTAMP '2024-01-02 03:04:05'")
+
+    def test_quote_literal_rejects(self):
+        with self.assertRaises(ValueError):
+            quote_literal(float('nan'))
+        with self.assertRaises(ValueError):
+            quote_literal('a\0b')
+        with self.assertRaises(TypeError):
+            quote_literal(object())
+
+    def test_quote_identifier(self):
+        self.assertEqual(quote_identifier('we"ird'), '"we""ird"')
+        with self.assertRaises(ValueError):
+            quote_identifier('')
+
+    def test_partition_predicates_come_first(self):
+        query = build_select(SPEC, {'name': ['a', 'b', 'a']}, {'dt': '2024-01-01'}, limit=10)
+        self.assertEqual(query, 'SELECT "name", "email" FROM "db"."users" WHERE "dt" = \'2024-01-01\' AND "name" IN (\'a\', \'b\') LIMIT 10')
+
+    def test_predicate_shapes(self):
+        self.assertEqual(build_select(SPEC, {'name': None}, columns=['email']), 'SELECT "email" FROM "db"."users" WHERE "name" IS NULL')
+        self.assertEqual(build_select(SPEC, {'name': ['a']}), 'SELECT "name", "email" FROM "db"."users" WHERE "name" = \'a\'')
+        self.assertEqual(build_select(SPEC, {'name': []}), 'SELECT "name", "email" FROM "db"."users" WHERE FALSE')
+
+    def test_unknown_partition_key(self):
+        with self.assertRaisesRegex(ValueError, 'not partition keys of db.users: name'):
+            build_select(SPEC, {}, {'name': 'a'})
+
+    def test_partitions_from_event(self):
+        self.assertEqual(partitions_from_event(SPEC, {'name': 'a', 'dt': '2024-01-01'}), {'dt': '2024-01-01'})
+        self.assertEqual(partitions_from_event(SPEC, {'name': 'a', 'dt': None}), {})
+
+    def test_pruning_reduces_scanned_bytes(self):
+        records = [{'name': 'user%d' % i, 'email': 'user%d@example.com' % i, 'age': i, 'dt': '2024-01-%02d' % (i % 10 + 1)} for i in range(100)]
+        athena = FakeAthenaClient({'db.users': records}, partition_keys={'db.users': ('dt',)})
+
+        def scanned(query):
+            qid = athena.start_query_execution(QueryString=query)['QueryExecutionId']
+            return athena.get_query_execution(QueryExecutionId=qid)['QueryExecution']['Statistics']['DataScannedInBytes']
+
+        full = scanned('SELECT * FROM db.users WHERE name = \'user5\'')
+        pruned = scanned(build_select(SPEC, {'name': 'user5'}, {'dt': '2024-01-06'}))
+        self.assertLess(pruned * 10, full)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import itertools
+import tempfile
+import unittest
+
+# run from AWS_Lambda: python -m pytest Athena/test_results.py
+from lambda_common.fakes import FakeAthenaClient, FakeS3Client
+from results import iter_query_rows, iter_result_pages, iter_result_rows, iter_s3_csv_rows, iter_s3_lines
+
+RECORDS = [{'id': i, 'name': 'user%d' % i} for i in range(25)]
+
+
+class PagedAthena:
+    """
+    Serves ``RECORDS`` like ``get_query_results``: the header row counts against ``MaxResults`` on the first page.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_query_results(self, QueryExecutionId, MaxResults, NextToken=None):
+        self.calls += 1
+        offset = int(NextToken or 0)
+        rows = [] if offset else [{'Data': [{'VarCharValue': 'id'}, {'VarCharValue': 'name'}]}]
+        end = offset + MaxResults - len(rows)
+        rows.extend({'Data': [{'VarCharValue': str(record['id'])}, {'VarCharValue': record['name']}]} for record in RECORDS[offset:end])
+        page = {'ResultSet': {'Rows': rows, 'ResultSetMetadata': {'ColumnInfo': [{'Name': 'id', 'Type': 'integer'}, {'Name': 'name', 'Type': 'varchar'}]}}}
+        if end < len(RECORDS):
+            page['NextToken'] = str(end)
+        return page
+
+class TestResultPaging(unittest.TestCase):
+
+    def setUp(self):
+        self.athena = PagedAthena()
+
+    def test_follows_next_token(self):
+        pages = list(iter_result_pages(self.athena, 'q1', page_size=10))
+        # the header row takes one slot of the first page
+        self.assertEqual([len(page['ResultSet']['Rows']) for page in pages], [10, 10, 6])
+        self.assertNotIn('NextToken', pages[-1])
+
+    def test_rows_skip_only_the_first_header(self):
+        rows = list(iter_result_rows(self.athena, 'q1', page_size=7))
+        self.assertEqual(rows, [(record['id'], record['name']) for record in RECORDS])
+
+    def test_stops_fetching_when_caller_stops(self):
+        rows = list(itertools.islice(iter_result_rows(self.athena, 'q1', page_size=10), 5))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(self.athena.calls, 1)
+
+class TestS3Results(unittest.TestCase):
+
+    def setUp(self):
+        self._root = tempfile.TemporaryDirectory()
+        self.s3 = FakeS3Client(self._root.name)
+
+    def tearDown(self):
+        self._root.cleanup()
+
+    def put(self, key, text):
+        data = text.encode('utf-8')
+        self.s3.put_object(Bucket='out', Key=key, Body=data)
+        return len(data)
+
+    def test_multibyte_characters_across_ranges(self):
+        text = 'あいう\nえお\n末尾'
+        size = self.put('lines.txt', text)
+        # 3-byte characters never line up with 4-byte ranges
+        self.assertEqual(list(iter_s3_lines(self.s3, 'out', 'lines.txt', size, range_size=4)), ['あいう\n', 'えお\n', '末尾'])
+        self.assertEqual(self.s3.calls['GetObject'], -(-size // 4))
+
+    def test_csv_rows_with_quoted_newlines(self):
+        column_info = [{'Name': 'id', 'Type': 'integer'}, {'Name': 'note', 'Type': 'varchar'}]
+        self.put('q.csv', '"id","note"\n"1","a\nb"\n"2","日本"\n,""\n')
+        rows = list(iter_s3_csv_rows(self.s3, 's3://out/q.csv', column_info, range_size=5))
+        self.assertEqual(rows, [(1, 'a\nb'), (2, '日本'), (None, '')])
+
+    def test_large_results_are_read_from_s3(self):
+        athena = FakeAthenaClient({'db.users': RECORDS}, self.s3)
+        qid = athena.start_query_execution(QueryString='SELECT * FROM db.users ORDER BY id', ResultConfiguration={'OutputLocation': 's3://out/results/'})['QueryExecutionId']
+        rows = list(iter_query_rows(athena, qid, self.s3, threshold=0, range_size=64))
+        self.assertEqual(rows, [(record['id'], record['name']) for record in RECORDS])
+        # only the ColumnInfo comes from the API
+        self.assertEqual(athena.calls['GetQueryResults'], 1)
+        self.assertGreater(self.s3.calls['GetObject'], 1)
+
+    def test_small_or_missing_results_use_the_api(self):
+        athena = FakeAthenaClient({'db.users': RECORDS}, self.s3)
+        qid = athena.start_query_execution(QueryString='SELECT * FROM db.users ORDER BY id', ResultConfiguration={'OutputLocation': 's3://out/results/'})['QueryExecutionId']
+        expected = [(record['id'], record['name']) for record in RECORDS]
+        self.assertEqual(list(iter_query_rows(athena, qid, self.s3)), expected)
+        self.s3.delete_objects(Bucket='out', Delete={'Objects': [{'Key': 'results/%s.csv' % qid}]})
+        self.assertEqual(list(iter_query_rows(athena, qid, self.s3, threshold=0)), expected)
+        self.assertNotIn('GetObject', self.s3.calls)
+
+if __name__ == "__main__":
+    unittest.main()
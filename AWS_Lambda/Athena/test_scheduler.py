@@ -0,0 +1,119 @@
+import threading
+import time
+import unittest
+
+# run from AWS_Lambda: python -m pytest Athena/test_scheduler.py
+from lambda_common.fakes import FakeClock, FakeDynamoDBClient, wait_until
+from scheduler import PRIORITY_HIGH, PRIORITY_LOW, DynamoDBSlots, QueryScheduler, SchedulerBusy
+
+
+class RacingDynamoDB(FakeDynamoDBClient):
+    """
+    Lets ``race()`` write the item between another caller's read and write, once.
+    """
+
+    def __init__(self, tables):
+        super().__init__(tables)
+        self.race = None
+
+    def put_item(self, **kwargs):
+        race, self.race = self.race, None
+        if race is not None:
+            race()
+        return super().put_item(**kwargs)
+
+
+class TestQueryScheduler(unittest.TestCase):
+
+    def test_fails_fast_when_the_deadline_is_too_close(self):
+        clock = FakeClock(1000.0)
+        scheduler = QueryScheduler(max_in_flight=1, clock=clock)
+        self.assertEqual(scheduler.acquire(deadline=clock() + 10), 0.0)
+        with self.assertRaises(SchedulerBusy) as raised:
+            # one query ahead plus our own does not fit in 3 s
+            scheduler.acquire(deadline=clock() + 3)
+        self.assertEqual(raised.exception.retry_after, 2.0)
+        self.assertEqual(clock.sleeps, [])
+        self.assertEqual(scheduler.metrics()['primary']['rejected'], 1)
+
+    def test_freed_slot_goes_to_the_highest_priority(self):
+        scheduler = QueryScheduler(max_in_flight=1)
+        scheduler.acquire()
+        order = []
+
+        def wait(name, priority):
+            scheduler.acquire(priority=priority)
+            order.append(name)
+            scheduler.release()
+
+        threads = [threading.Thread(target=wait, args=('low', PRIORITY_LOW))]
+        threads[0].start()
+        wait_until(lambda: scheduler.metrics()['primary']['queue_depth'] == 1)
+        threads.append(threading.Thread(target=wait, args=('high', PRIORITY_HIGH)))
+        threads[1].start()
+        wait_until(lambda: scheduler.metrics()['primary']['queue_depth'] == 2)
+        scheduler.release()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(order, ['high', 'low'])
+        self.assertEqual(scheduler.metrics()['primary']['in_flight'], 0)
+
+    def test_shared_slots_across_containers(self):
+        clock = FakeClock(1000.0)
+        shared = DynamoDBSlots(FakeDynamoDBClient({'slots': 'workgroup'}), 'slots', clock=clock, sleep=clock.sleep)
+        first, second = QueryScheduler(max_in_flight=1, shared=shared), QueryScheduler(max_in_flight=1, shared=shared)
+        with first.slot(deadline=time.monotonic() + 60):
+            with self.assertRaises(SchedulerBusy):
+                with second.slot(deadline=time.monotonic() + 3):
+                    pass
+        self.assertEqual(second.metrics()['primary']['shared_rejected'], 1)
+        # both local slots were given back
+        self.assertEqual(second.metrics()['primary']['in_flight'], 0)
+        with second.slot():
+            self.assertEqual(shared.in_flight('primary'), 1)
+        self.assertEqual(shared.in_flight('primary'), 0)
+
+class TestDynamoDBSlots(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock(1000.0)
+        self.dynamodb = RacingDynamoDB({'slots': 'workgroup'})
+        self.slots = DynamoDBSlots(self.dynamodb, 'slots', clock=self.clock, sleep=self.clock.sleep)
+
+    def test_limit_and_release(self):
+        leases = [self.slots.try_acquire('wg', 2) for _ in range(3)]
+        self.assertIsNotNone(leases[0])
+        self.assertIsNotNone(leases[1])
+        self.assertIsNone(leases[2])
+        self.slots.release('wg', leases[0])
+        self.assertIsNotNone(self.slots.try_acquire('wg', 2))
+
+    def test_expired_leases_are_reclaimed(self):
+        self.assertIsNotNone(self.slots.try_acquire('wg', 1, expires_at=self.clock() + 30))
+        self.assertIsNone(self.slots.try_acquire('wg', 1))
+        self.clock.now += 30
+        self.assertIsNotNone(self.slots.try_acquire('wg', 1))
+        self.assertEqual(self.slots.in_flight('wg'), 1)
+
+    def test_low_priority_leaves_headroom(self):
+        for _ in range(4):
+            self.assertIsNotNone(self.slots.try_acquire('wg', 5, PRIORITY_LOW))
+        self.assertIsNone(self.slots.try_acquire('wg', 5, PRIORITY_LOW))
+        self.assertIsNotNone(self.slots.try_acquire('wg', 5))
+
+    def test_concurrent_writer_is_detected(self):
+        other = DynamoDBSlots(self.dynamodb, 'slots', clock=self.clock)
+        taken = []
+        self.dynamodb.race = lambda: taken.append(other.try_acquire('wg', 1))
+        # the write conflicts, the re-read sees the other container's lease
+        self.assertIsNone(self.slots.try_acquire('wg', 1))
+        self.assertIsNotNone(taken[0])
+        self.assertEqual(self.slots.in_flight('wg'), 1)
+
+    def test_acquire_gives_up_after_timeout(self):
+        self.slots.try_acquire('wg', 1)
+        self.assertIsNone(self.slots.acquire('wg', 1, timeout=2.0))
+        self.assertAlmostEqual(sum(self.clock.sleeps), 2.0)
+
+if __name__ == "__main__":
+    unittest.main()
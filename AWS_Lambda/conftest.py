@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the Lambda packages import lambda_common as a top-level package (deployed as a layer or at the zip root)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -1,28 +1,119 @@
 import sys
-import boto3
 import json
 import logging
 import os
 import datetime
 import calendar
+import time
  
 from base64 import b64decode
 from urllib.request import Request, urlopen
 from urllib.error import URLError, HTTPError
+
+from coalesce import CrawlerCoalescer, DynamoDBStateStore, MemoryStateStore, success_objects
+from lambda_common import tracing
+from lambda_common.clients import client_init_seconds, get_client, mark_invocation
+from partitions import SCHEMA_MARKER, PartitionRegistrar
  
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
- 
-glue = boto3.client('glue')
- 
+
+# crawler constant
+CRAWLER_NAME = 'glue クローラ名'
+
+# "bucket/key" prefix -> crawler, the longest matching prefix wins ('' matches every object)
+CRAWLERS = {'': CRAWLER_NAME}
+
+# seconds after a start during which new data only marks a pending rerun
+DEBOUNCE_SECONDS = 60
+
+# DynamoDB table (partition key "crawler") to share the pending state across containers; set it when deploying,
+# None keeps it in the memory of each container (a rerun marked in one container is not seen by the others)
+STATE_TABLE = None
+
+# (database, table) whose new partitions are registered directly; other data, unknown keys and schema changes run the crawler
+PARTITION_TABLES = []
+
+# state store and partition registrar shared across warm invocations
+_state_store = None
+_registrar = None
+
+
+def state_store():
+    global _state_store
+    if _state_store is None:
+        if STATE_TABLE:
+            _state_store = DynamoDBStateStore(get_client('dynamodb'), STATE_TABLE)
+        else:
+            logger.warning("STATE_TABLE is not set, pending crawler reruns are kept in this container only")
+            _state_store = MemoryStateStore()
+    return _state_store
+
+
+def registrar(glue):
+    global _registrar
+    if _registrar is None and PARTITION_TABLES:
+        _registrar = PartitionRegistrar(glue, PARTITION_TABLES)
+    return _registrar
+
+
+def crawler_for(bucket, key):
+    path = bucket + '/' + key
+    prefix = max((prefix for prefix in CRAWLERS if path.startswith(prefix)), key=len, default=None)
+    return CRAWLERS[prefix] if prefix is not None else None
+
+
+@tracing.traced
 def lambda_handler(event, context):
-    if 'eventSource' in event['Records'][0]:
-        
-        if event['Records'][0]['eventSource'] == 'aws:s3':
-            reason = event['Records'][0]['s3']
-            bucket = event['Records'][0]['s3']['bucket']['name']
-            key = event['Records'][0]['s3']['object']['key']
-
-            if ('_SUCCESS' in key):
-                logger.info("bucket: " + str(bucket) + " key: " + str(key))
-                response = glue.start_crawler(Name='glue クローラ名')
+    cold_start = mark_invocation()
+    start = time.perf_counter()
+    tracing.annotate(cold_start=cold_start)
+    with tracing.span('client'):
+        glue = get_client('glue')
+    coalescer = CrawlerCoalescer(glue, state_store(), DEBOUNCE_SECONDS)
+
+    # crawl finished (EventBridge "Glue Crawler State Change") or scheduled sweep: start the pending reruns
+    if event.get('source') in ('aws.glue', 'aws.events'):
+        crawlers = [event['detail']['crawlerName']] if event.get('source') == 'aws.glue' else None
+        if crawlers and _registrar is not None:
+            # the crawl may have changed the tables, read them again
+            _registrar.invalidate()
+        with tracing.span('start_crawler'):
+            outcomes = coalescer.run_pending(crawlers)
+
+    # S3 events: register the partitions of known tables, then one crawler request per crawler
+    # with the newest event time for everything else
+    else:
+        tracing.count('records', len(event.get('Records', [])))
+        partition_registrar = registrar(glue)
+        objects = {}
+        crawl = []
+        for bucket, key, event_time in success_objects(event, ('_SUCCESS', SCHEMA_MARKER)):
+            logger.info("bucket: " + str(bucket) + " key: " + str(key))
+            with tracing.span('parse_partition'):
+                partition = partition_registrar.partition_for(bucket, key) if partition_registrar else None
+            if partition is not None:
+                objects.setdefault(partition, []).append((bucket, key, event_time))
+            else:
+                crawl.append((bucket, key, event_time))
+
+        if objects:
+            with tracing.span('register_partitions'):
+                registered, failed = partition_registrar.register(objects)
+            tracing.count('partitions_registered', len(registered))
+            logger.info("partitions registered: %d failed: %d", len(registered), len(failed))
+            for partition in failed:
+                crawl.extend(objects[partition])
+
+        latest = {}
+        for bucket, key, event_time in crawl:
+            crawler = crawler_for(bucket, key)
+            if crawler is not None:
+                latest[crawler] = max(latest.get(crawler, event_time), event_time)
+        with tracing.span('start_crawler'):
+            outcomes = {crawler: coalescer.request(crawler, event_time) for crawler, event_time in latest.items()}
+
+    tracing.count('crawlers_started', sum(1 for outcome in outcomes.values() if outcome == 'started'))
+    logger.info("crawlers: %s", outcomes)
+    logger.info("start: %s latency: %.3fs client_init: %s", 'cold' if cold_start else 'warm', time.perf_counter() - start, client_init_seconds())
+    return outcomes
@@ -0,0 +1,223 @@
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import unquote_plus
+
+from botocore.exceptions import ClientError
+
+# a crawler is not started again within this many seconds of its last start
+DEBOUNCE_SECONDS = 60
+
+RUNNING_STATES = ('RUNNING', 'STOPPING')
+
+
+def success_objects(event: dict, names: Tuple[str, ...] = ('_SUCCESS',)) -> Iterator[Tuple[str, str, float]]:
+    """
+    Yield ``(bucket, key, event time as epoch seconds)`` for every S3 record of a ``_SUCCESS`` object
+    (or any key containing one of ``names``).
+    """
+    for record in event.get('Records', []):
+        if record.get('eventSource') != 'aws:s3':
+            continue
+        bucket = record['s3']['bucket']['name']
+        # keys in S3 notifications are URL encoded
+        key = unquote_plus(record['s3']['object']['key'])
+        if not any(name in key for name in names):
+            continue
+        event_time = record.get('eventTime')
+        yield bucket, key, datetime.fromisoformat(event_time.replace('Z', '+00:00')).timestamp() if event_time else time.time()
+
+
+class MemoryStateStore:
+    """
+    Crawler state (last start, pending rerun) kept in the container. Fine for a single
+    concurrent execution; use ``DynamoDBStateStore`` to share the state across containers.
+    """
+
+    def __init__(self):
+        self._items: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def get(self, crawler: str) -> dict:
+        with self._lock:
+            return dict(self._items.get(crawler, {}))
+
+    def mark_pending(self, crawler: str, now: float) -> None:
+        with self._lock:
+            item = self._items.setdefault(crawler, {})
+            item['pending'] = True
+            item.setdefault('pending_since', now)
+
+    def claim_pending(self, crawler: str) -> bool:
+        """
+        Clear the pending flag and return True if it was set, so only one caller starts the rerun.
+        """
+        with self._lock:
+            item = self._items.get(crawler, {})
+            if not item.get('pending'):
+                return False
+            item['pending'] = False
+            item.pop('pending_since', None)
+            return True
+
+    def record_start(self, crawler: str, now: float) -> None:
+        with self._lock:
+            item = self._items.setdefault(crawler, {})
+            item['last_start'] = now
+            item['pending'] = False
+            item.pop('pending_since', None)
+
+    def pending_crawlers(self) -> List[str]:
+        with self._lock:
+            return [crawler for crawler, item in self._items.items() if item.get('pending')]
+
+
+class DynamoDBStateStore:
+    """
+    Crawler state in a DynamoDB table with the string partition key ``crawler``.
+
+    ``claim_pending`` is a conditional update, so concurrent containers start a rerun only once.
+    """
+
+    def __init__(self, dynamodb, table_name: str):
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+
+    def get(self, crawler: str) -> dict:
+        item = self.dynamodb.get_item(TableName=self.table_name, Key={'crawler': {'S': crawler}}, ConsistentRead=True).get('Item', {})
+        state = {}
+        if 'pending' in item:
+            state['pending'] = item['pending']['BOOL']
+        for name in ('last_start', 'pending_since'):
+            if name in item:
+                state[name] = float(item[name]['N'])
+        return state
+
+    def mark_pending(self, crawler: str, now: float) -> None:
+        self.dynamodb.update_item(
+            TableName=self.table_name,
+            Key={'crawler': {'S': crawler}},
+            UpdateExpression='SET pending = :true, pending_since = if_not_exists(pending_since, :now)',
+            ExpressionAttributeValues={':true': {'BOOL': True}, ':now': {'N': repr(now)}},
+        )
+
+    def claim_pending(self, crawler: str) -> bool:
+        try:
+            self.dynamodb.update_item(
+                TableName=self.table_name,
+                Key={'crawler': {'S': crawler}},
+                UpdateExpression='SET pending = :false REMOVE pending_since',
+                ConditionExpression='pending = :true',
+                ExpressionAttributeValues={':true': {'BOOL': True}, ':false': {'BOOL': False}},
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+        return True
+
+    def record_start(self, crawler: str, now: float) -> None:
+        self.dynamodb.update_item(
+            TableName=self.table_name,
+            Key={'crawler': {'S': crawler}},
+            UpdateExpression='SET last_start = :now, pending = :false REMOVE pending_since',
+            ExpressionAttributeValues={':now': {'N': repr(now)}, ':false': {'BOOL': False}},
+        )
+
+    def pending_crawlers(self) -> List[str]:
+        crawlers = []
+        kwargs = {'TableName': self.table_name, 'FilterExpression': 'pending = :true', 'ExpressionAttributeValues': {':true': {'BOOL': True}}}
+        while True:
+            response = self.dynamodb.scan(**kwargs)
+            crawlers.extend(item['crawler']['S'] for item in response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return crawlers
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+class CrawlerCoalescer:
+    """
+    Start Glue crawlers at most once per burst of ``_SUCCESS`` events.
+
+    - requests for the same crawler in one batch are merged by the caller (one ``request`` per crawler)
+    - data that landed before the running crawl started is already covered and ignored
+    - data that landed during a running crawl, or within ``debounce`` seconds of the last start,
+      sets a "pending rerun" flag instead of starting a crawl
+    - ``run_pending`` (called when a crawl finishes and on a schedule) starts exactly one
+      follow-up crawl per pending crawler, however many events set the flag
+
+    :param glue: A Glue client.
+    :param store: ``MemoryStateStore`` or ``DynamoDBStateStore``.
+    """
+
+    def __init__(self, glue, store, debounce: float = DEBOUNCE_SECONDS, clock=time.time):
+        self.glue = glue
+        self.store = store
+        self.debounce = debounce
+        self.clock = clock
+
+    def _running_since(self, crawler: str) -> Optional[float]:
+        # epoch seconds the running crawl started at, or None when it is not running
+        info = self.glue.get_crawler(Name=crawler)['Crawler']
+        if info['State'] not in RUNNING_STATES:
+            return None
+        return self.clock() - info.get('CrawlElapsedTime', 0) / 1000
+
+    def _start(self, crawler: str) -> str:
+        now = self.clock()
+        try:
+            self.glue.start_crawler(Name=crawler)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'CrawlerRunningException':
+                raise
+            self.store.mark_pending(crawler, now)
+            return 'pending'
+        self.store.record_start(crawler, now)
+        return 'started'
+
+    def request(self, crawler: str, data_time: Optional[float] = None) -> str:
+        """
+        Ask for a crawl of data that landed at ``data_time`` (epoch seconds, e.g. the newest S3 event time).
+
+        :return: ``started``, ``covered`` (the running crawl started after the data landed),
+            ``pending`` (a crawl is running) or ``debounced`` (started too recently).
+        """
+        now = self.clock()
+        running_since = self._running_since(crawler)
+        if running_since is not None:
+            if data_time is not None and data_time < running_since:
+                return 'covered'
+            self.store.mark_pending(crawler, now)
+            return 'pending'
+        if now - self.store.get(crawler).get('last_start', float('-inf')) < self.debounce:
+            self.store.mark_pending(crawler, now)
+            return 'debounced'
+        return self._start(crawler)
+
+    def run_pending(self, crawlers: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        """
+        Start one rerun for every pending crawler (or the given ones) that is idle and out of its debounce window.
+
+        :return: The outcome per pending crawler: ``started``, ``pending``, ``running``, ``debounced`` or ``claimed``
+            (another caller started it).
+        """
+        pending = set(self.store.pending_crawlers())
+        if crawlers is not None:
+            pending &= set(crawlers)
+        outcomes = {}
+        for crawler in sorted(pending):
+            if self._running_since(crawler) is not None:
+                outcomes[crawler] = 'running'
+            elif self.clock() - self.store.get(crawler).get('last_start', float('-inf')) < self.debounce:
+                outcomes[crawler] = 'debounced'
+            elif not self.store.claim_pending(crawler):
+                outcomes[crawler] = 'claimed'
+            else:
+                try:
+                    outcomes[crawler] = self._start(crawler)
+                except Exception:
+                    # the claim cleared the flag; put it back so the rerun is not lost
+                    self.store.mark_pending(crawler, self.clock())
+                    raise
+        return outcomes
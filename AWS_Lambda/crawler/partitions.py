@@ -0,0 +1,194 @@
+import copy
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import unquote
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+# batch_create_partition accepts at most 100 partitions per call
+MAX_PARTITIONS_PER_CALL = 100
+
+# seconds table definitions (location, partition keys, storage descriptor) are cached
+TABLE_CACHE_TTL = 300
+
+# partitions remembered as registered per container (least recently seen dropped first)
+MAX_REGISTERED = 10000
+
+# a job writes this object next to _SUCCESS when it changed the schema, so the full crawler runs
+SCHEMA_MARKER = '_SCHEMA_CHANGED'
+
+
+class Partition(NamedTuple):
+    database: str
+    table: str
+    values: Tuple[str, ...]
+    location: str
+
+
+class _Table(NamedTuple):
+    database: str
+    name: str
+    location: str
+    partition_keys: Tuple[str, ...]
+    storage_descriptor: dict
+
+
+def _error_code(error: Exception) -> str:
+    # API errors carry a code, connection errors and timeouts (BotoCoreError) only their type
+    if isinstance(error, ClientError):
+        return error.response['Error']['Code']
+    return type(error).__name__
+
+
+def parse_partition_values(relative_key: str) -> Optional[List[Tuple[str, str]]]:
+    """
+    Parse the ``k=v`` directories of a key relative to the table location, e.g.
+    ``dt=2024-01-01/hour=05/_SUCCESS`` -> ``[("dt", "2024-01-01"), ("hour", "05")]``.
+
+    Values are unescaped like Hive (``%2F`` -> ``/``). Returns None when a directory is not ``k=v``.
+    """
+    directories = relative_key.split('/')[:-1]
+    pairs = []
+    for directory in directories:
+        name, sep, value = directory.partition('=')
+        if not sep or not name:
+            return None
+        pairs.append((name, unquote(value)))
+    return pairs
+
+
+class PartitionRegistrar:
+    """
+    Register the partition of a newly written S3 prefix in the Glue catalog directly, instead of running a crawler.
+
+    The tables in ``tables`` are looked up with ``get_table`` (cached for ``TABLE_CACHE_TTL``
+    seconds). An object under a table's location whose ``k=v`` directories match the table's
+    partition keys in order is turned into a ``Partition``; anything else (unknown prefix,
+    different partition keys, the ``SCHEMA_MARKER`` object) needs the full crawler. A table
+    ``get_table`` fails for (e.g. not created yet) is skipped until the next reload, so its
+    objects go to the crawler too.
+
+    :param glue: A Glue client.
+    :param tables: ``[(database, table), ...]`` to register partitions for.
+    """
+
+    def __init__(self, glue, tables: Sequence[Tuple[str, str]], cache_ttl: float = TABLE_CACHE_TTL, max_registered: int = MAX_REGISTERED, clock=time.monotonic):
+        self.glue = glue
+        self.tables = list(tables)
+        self.cache_ttl = cache_ttl
+        self.max_registered = max_registered
+        self.clock = clock
+        self._tables: List[_Table] = []
+        self._loaded_at: Optional[float] = None
+        # partitions registered by this container, skipped on repeated events
+        self.registered: 'OrderedDict[Partition, None]' = OrderedDict()
+
+    def _load_tables(self) -> List[_Table]:
+        if self._loaded_at is None or self.clock() - self._loaded_at >= self.cache_ttl:
+            tables = []
+            for database, name in self.tables:
+                try:
+                    table = self.glue.get_table(DatabaseName=database, Name=name)['Table']
+                except (ClientError, BotoCoreError) as e:
+                    print("get_table %s.%s failed: %s" % (database, name, _error_code(e)))
+                    continue
+                descriptor = table['StorageDescriptor']
+                location = descriptor['Location'].rstrip('/') + '/'
+                partition_keys = tuple(key['Name'] for key in table.get('PartitionKeys', []))
+                tables.append(_Table(database, name, location, partition_keys, descriptor))
+            # longest location first so nested table locations match the right table
+            tables.sort(key=lambda table: len(table.location), reverse=True)
+            self._tables, self._loaded_at = tables, self.clock()
+        return self._tables
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    def partition_for(self, bucket: str, key: str) -> Optional[Partition]:
+        """
+        Return the partition an object belongs to, or None when the full crawler is needed.
+        """
+        if key.rsplit('/', 1)[-1] == SCHEMA_MARKER:
+            return None
+        path = 's3://%s/%s' % (bucket, key)
+        for table in self._load_tables():
+            if not path.startswith(table.location):
+                continue
+            relative_key = path[len(table.location):]
+            pairs = parse_partition_values(relative_key)
+            # other partition keys than the table's (or none) mean the layout changed
+            if pairs is None or not table.partition_keys or tuple(name for name, _ in pairs) != table.partition_keys:
+                return None
+            # the location keeps the escaped directory names as written
+            location = table.location + relative_key.rsplit('/', 1)[0] + '/'
+            return Partition(table.database, table.name, tuple(value for _, value in pairs), location)
+        return None
+
+    def _table(self, database: str, name: str) -> Optional[_Table]:
+        for table in self._load_tables():
+            if (table.database, table.name) == (database, name):
+                return table
+        return None
+
+    @staticmethod
+    def _storage_descriptor(table: _Table, partition: Partition) -> dict:
+        descriptor = copy.deepcopy(table.storage_descriptor)
+        descriptor['Location'] = partition.location
+        return descriptor
+
+    def _remember(self, partition: Partition) -> None:
+        self.registered[partition] = None
+        self.registered.move_to_end(partition)
+        while len(self.registered) > self.max_registered:
+            self.registered.popitem(last=False)
+
+    def register(self, partitions: Iterable[Partition]) -> Tuple[List[Partition], List[Partition]]:
+        """
+        Create the partitions with ``batch_create_partition``, up to 100 per call and table.
+
+        Partitions that already exist count as registered. A call that raises (e.g. throttling or a connection error)
+        fails all of its partitions, the other calls still run, and so do the partitions of a
+        table whose definition could not be loaded.
+
+        :return: The registered partitions and the ones that failed.
+        """
+        by_table: Dict[Tuple[str, str], Dict[Tuple[str, ...], Partition]] = {}
+        for partition in partitions:
+            if partition in self.registered:
+                self.registered.move_to_end(partition)
+            else:
+                by_table.setdefault((partition.database, partition.table), {})[partition.values] = partition
+
+        registered, failed = [], []
+        for (database, table), table_partitions in by_table.items():
+            pending = list(table_partitions.values())
+            table_info = self._table(database, table)
+            if table_info is None:
+                print("register %s.%s %d partitions failed: table not loaded" % (database, table, len(pending)))
+                failed.extend(pending)
+                continue
+            for i in range(0, len(pending), MAX_PARTITIONS_PER_CALL):
+                chunk = pending[i:i + MAX_PARTITIONS_PER_CALL]
+                try:
+                    response = self.glue.batch_create_partition(
+                        DatabaseName=database,
+                        TableName=table,
+                        PartitionInputList=[{'Values': list(partition.values), 'StorageDescriptor': self._storage_descriptor(table_info, partition)} for partition in chunk],
+                    )
+                except (ClientError, BotoCoreError) as e:
+                    print("register %s.%s %d partitions failed: %s" % (database, table, len(chunk), _error_code(e)))
+                    failed.extend(chunk)
+                    continue
+                errors = {}
+                for error in response.get('Errors', []):
+                    if error['ErrorDetail']['ErrorCode'] != 'AlreadyExistsException':
+                        errors[tuple(error['PartitionValues'])] = error['ErrorDetail']['ErrorCode']
+                for partition in chunk:
+                    if partition.values in errors:
+                        print("register %s.%s %s failed: %s" % (database, table, partition.values, errors[partition.values]))
+                        failed.append(partition)
+                    else:
+                        self._remember(partition)
+                        registered.append(partition)
+        return registered, failed
@@ -0,0 +1,109 @@
+import time
+import unittest
+from datetime import datetime, timezone
+
+# run from AWS_Lambda: python -m pytest crawler/test_basic.py
+import basic
+from coalesce import MemoryStateStore
+from lambda_common.clients import set_client
+from lambda_common.fakes import ClientError, FakeContext, FakeGlueClient
+
+
+def s3_event(*keys, event_time=None):
+    event_time = datetime.fromtimestamp(event_time or time.time(), timezone.utc).isoformat()
+    return {'Records': [{'eventSource': 'aws:s3', 'eventTime': event_time, 's3': {'bucket': {'name': bucket}, 'object': {'key': key}}} for bucket, key in keys]}
+
+
+def crawler_state_change(crawler):
+    return {'source': 'aws.glue', 'detail-type': 'Glue Crawler State Change', 'detail': {'crawlerName': crawler, 'state': 'Succeeded'}}
+
+
+SCHEDULED = {'source': 'aws.events', 'detail-type': 'Scheduled Event', 'detail': {}}
+
+
+class ThrottledGlue(FakeGlueClient):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.throttled = False
+
+    def batch_create_partition(self, **kwargs):
+        if self.throttled:
+            raise ClientError('ThrottlingException', 'Rate exceeded', 'BatchCreatePartition')
+        return super().batch_create_partition(**kwargs)
+
+class TestHandler(unittest.TestCase):
+
+    def setUp(self):
+        for name in ('CRAWLERS', 'DEBOUNCE_SECONDS', 'PARTITION_TABLES', '_state_store', '_registrar'):
+            self.addCleanup(setattr, basic, name, getattr(basic, name))
+        basic.CRAWLERS = {'': 'all', 'lake/': 'lake', 'lake/events/': 'events'}
+        basic.DEBOUNCE_SECONDS = 0
+        basic.PARTITION_TABLES = []
+        basic._state_store = MemoryStateStore()
+        basic._registrar = None
+        self.glue = ThrottledGlue(['all', 'lake', 'events'], crawl_seconds=300)
+        set_client('glue', self.glue)
+
+    def handle(self, event):
+        return basic.lambda_handler(event, FakeContext())
+
+    def test_crawler_for_longest_prefix(self):
+        self.assertEqual(basic.crawler_for('lake', 'events/dt=2024-01-01/_SUCCESS'), 'events')
+        self.assertEqual(basic.crawler_for('lake', 'eventsx/_SUCCESS'), 'lake')
+        self.assertEqual(basic.crawler_for('other', 'events/_SUCCESS'), 'all')
+        basic.CRAWLERS = {'lake/events/': 'events'}
+        self.assertIsNone(basic.crawler_for('other', 'events/_SUCCESS'))
+
+    def test_s3_records_start_each_crawler_once(self):
+        outcomes = self.handle(s3_event(
+            ('lake', 'events/dt=2024-01-01/_SUCCESS'),
+            ('lake', 'events/dt=2024-01-02/_SUCCESS'),
+            ('lake', 'events/dt=2024-01-02/part-0.parquet'),
+            ('lake', 'other/_SUCCESS'),
+            ('archive', 'x/_SUCCESS'),
+        ))
+        self.assertEqual(outcomes, {'events': 'started', 'lake': 'started', 'all': 'started'})
+        self.assertEqual(sorted(name for name, _ in self.glue.starts), ['all', 'events', 'lake'])
+
+    def test_state_change_runs_the_pending_rerun(self):
+        self.assertEqual(self.handle(s3_event(('lake', 'events/dt=2024-01-01/_SUCCESS'))), {'events': 'started'})
+        # data landing during the crawl marks one rerun, however many objects arrive
+        for day in (2, 3):
+            self.assertEqual(self.handle(s3_event(('lake', 'events/dt=2024-01-0%d/_SUCCESS' % day), event_time=time.time() + 1)), {'events': 'pending'})
+        self.assertEqual(self.handle(crawler_state_change('events')), {'events': 'running'})
+
+        self.glue.crawl_seconds = 0
+        self.assertEqual(self.handle(crawler_state_change('lake')), {})
+        self.assertEqual(self.handle(crawler_state_change('events')), {'events': 'started'})
+        self.assertEqual(self.handle(crawler_state_change('events')), {})
+        self.assertEqual([name for name, _ in self.glue.starts], ['events', 'events'])
+
+    def test_scheduled_sweep_runs_every_pending_crawler(self):
+        self.handle(s3_event(('lake', 'events/_SUCCESS'), ('lake', 'other/_SUCCESS')))
+        self.handle(s3_event(('lake', 'events/_SUCCESS'), ('lake', 'other/_SUCCESS'), event_time=time.time() + 1))
+        self.glue.crawl_seconds = 0
+        self.assertEqual(self.handle(SCHEDULED), {'events': 'started', 'lake': 'started'})
+
+    def test_partitions_are_registered_and_failures_crawled(self):
+        self.glue.add_table('db', 'events', 's3://lake/events/', ['id'], ['dt'])
+        basic.PARTITION_TABLES = [('db', 'events')]
+        outcomes = self.handle(s3_event(('lake', 'events/dt=2024-01-01/_SUCCESS'), ('lake', 'other/_SUCCESS')))
+        self.assertEqual(outcomes, {'lake': 'started'})
+        self.assertEqual(self.glue.get_partitions(DatabaseName='db', TableName='events')['Partitions'][0]['Values'], ['2024-01-01'])
+
+        # registration fails: the table's crawler picks the objects up instead
+        self.glue.throttled = True
+        self.assertEqual(self.handle(s3_event(('lake', 'events/dt=2024-01-02/_SUCCESS'))), {'events': 'started'})
+        self.assertEqual([name for name, _ in self.glue.starts], ['lake', 'events'])
+
+    def test_memory_state_store_is_reported(self):
+        self.addCleanup(setattr, basic, 'STATE_TABLE', basic.STATE_TABLE)
+        basic.STATE_TABLE = None
+        basic._state_store = None
+        with self.assertLogs(level='WARNING') as logs:
+            self.assertIsInstance(basic.state_store(), MemoryStateStore)
+        self.assertIn('STATE_TABLE is not set', logs.output[0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+
+# run from AWS_Lambda: python -m pytest crawler/test_coalesce.py
+from coalesce import CrawlerCoalescer, MemoryStateStore, success_objects
+from lambda_common.fakes import ClientError, FakeClock, FakeGlueClient
+
+
+class FailingGlue(FakeGlueClient):
+    """
+    ``start_crawler`` raises ``error`` once.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.error = None
+
+    def start_crawler(self, Name, **kwargs):
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+        return super().start_crawler(Name=Name, **kwargs)
+
+class TestCrawlerCoalescer(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock(1700000000.0)
+        self.glue = FailingGlue(['c'], crawl_seconds=300, clock=self.clock)
+        self.store = MemoryStateStore()
+        self.coalescer = CrawlerCoalescer(self.glue, self.store, debounce=60, clock=self.clock)
+
+    def test_burst_starts_one_crawl(self):
+        self.assertEqual(self.coalescer.request('c', self.clock()), 'started')
+        self.clock.now += 10
+        # landed after the crawl started: needs a rerun
+        self.assertEqual(self.coalescer.request('c', self.clock()), 'pending')
+        # landed before the crawl started: already covered
+        self.assertEqual(self.coalescer.request('c', self.clock() - 20), 'covered')
+        self.assertEqual(self.coalescer.run_pending(), {'c': 'running'})
+        self.clock.now += 300
+        self.assertEqual(self.coalescer.run_pending(), {'c': 'started'})
+        self.assertEqual(self.coalescer.run_pending(), {})
+        self.assertEqual(len(self.glue.starts), 2)
+
+    def test_debounce(self):
+        self.glue.crawl_seconds = 1
+        self.coalescer.request('c')
+        self.clock.now += 30
+        self.assertEqual(self.coalescer.request('c'), 'debounced')
+        self.assertEqual(self.coalescer.run_pending(), {'c': 'debounced'})
+        self.clock.now += 30
+        self.assertEqual(self.coalescer.run_pending(), {'c': 'started'})
+
+    def test_crawler_started_elsewhere_sets_pending(self):
+        self.glue.error = ClientError('CrawlerRunningException', 'Crawler with name c has already started', 'StartCrawler')
+        self.assertEqual(self.coalescer.request('c'), 'pending')
+        self.assertEqual(self.store.pending_crawlers(), ['c'])
+
+    def test_failed_rerun_keeps_the_pending_flag(self):
+        self.store.mark_pending('c', self.clock())
+        self.glue.error = ClientError('ThrottlingException', 'Rate exceeded', 'StartCrawler')
+        with self.assertRaises(ClientError):
+            self.coalescer.run_pending()
+        self.assertEqual(self.store.pending_crawlers(), ['c'])
+        self.assertEqual(self.coalescer.run_pending(), {'c': 'started'})
+        self.assertEqual(self.store.pending_crawlers(), [])
+
+    def test_other_caller_claimed_the_rerun(self):
+        self.store.mark_pending('c', self.clock())
+        claim_pending = self.store.claim_pending
+
+        def claimed_elsewhere(crawler):
+            # another container claims between our pending_crawlers() and claim_pending()
+            claim_pending(crawler)
+            return claim_pending(crawler)
+
+        self.store.claim_pending = claimed_elsewhere
+        self.assertEqual(self.coalescer.run_pending(), {'c': 'claimed'})
+        self.assertEqual(self.glue.starts, [])
+
+    def test_success_objects(self):
+        event = {'Records': [
+            {'eventSource': 'aws:s3', 'eventTime': '2024-01-01T00:00:00.000Z', 's3': {'bucket': {'name': 'b'}, 'object': {'key': 'db/t/dt%3D2024-01-01/_SUCCESS'}}},
+            {'eventSource': 'aws:s3', 's3': {'bucket': {'name': 'b'}, 'object': {'key': 'db/t/dt%3D2024-01-01/part-0.parquet'}}},
+            {'eventSource': 'aws:sqs'},
+        ]}
+        self.assertEqual(list(success_objects(event)), [('b', 'db/t/dt=2024-01-01/_SUCCESS', 1704067200.0)])
+
+if __name__ == "__main__":
+    unittest.main()
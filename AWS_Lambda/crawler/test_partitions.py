@@ -0,0 +1,132 @@
+import unittest
+
+from botocore.exceptions import EndpointConnectionError
+
+# run from AWS_Lambda: python -m pytest crawler/test_partitions.py
+from lambda_common.fakes import ClientError, FakeClock, FakeGlueClient
+from partitions import SCHEMA_MARKER, Partition, PartitionRegistrar, parse_partition_values
+
+
+GLUE_ENDPOINT = 'https://glue.us-east-1.amazonaws.com/'
+
+
+class ThrottledGlue(FakeGlueClient):
+    """
+    The first ``throttled`` calls to ``batch_create_partition`` raise ``error`` (``ThrottlingException``),
+    and ``get_table`` raises ``EndpointConnectionError`` for the tables in ``unreachable``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.throttled = 0
+        self.error = ClientError('ThrottlingException', 'Rate exceeded', 'BatchCreatePartition')
+        self.unreachable = set()
+
+    def batch_create_partition(self, **kwargs):
+        if self.throttled:
+            self.throttled -= 1
+            raise self.error
+        return super().batch_create_partition(**kwargs)
+
+    def get_table(self, DatabaseName, Name, **kwargs):
+        if (DatabaseName, Name) in self.unreachable:
+            raise EndpointConnectionError(endpoint_url=GLUE_ENDPOINT)
+        return super().get_table(DatabaseName=DatabaseName, Name=Name, **kwargs)
+
+class TestParsePartitionValues(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(parse_partition_values('dt=2024-01-01/hour=05/_SUCCESS'), [('dt', '2024-01-01'), ('hour', '05')])
+        self.assertEqual(parse_partition_values('path=a%2Fb/_SUCCESS'), [('path', 'a/b')])
+        self.assertEqual(parse_partition_values('_SUCCESS'), [])
+        self.assertIsNone(parse_partition_values('2024/_SUCCESS'))
+        self.assertIsNone(parse_partition_values('=x/_SUCCESS'))
+
+class TestPartitionRegistrar(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.glue = ThrottledGlue(clock=self.clock)
+        self.glue.add_table('db', 'events', 's3://lake/events', ['id'], ['dt', 'hour'])
+        self.glue.add_table('db', 'archive', 's3://lake/events/archive/', ['id'], ['dt'])
+        self.registrar = PartitionRegistrar(self.glue, [('db', 'events'), ('db', 'archive')], cache_ttl=300, clock=self.clock)
+
+    def partitions(self, count):
+        return [self.registrar.partition_for('lake', 'events/dt=2024-01-%02d/hour=%02d/_SUCCESS' % (i // 24 + 1, i % 24)) for i in range(count)]
+
+    def test_partition_for(self):
+        self.assertEqual(
+            self.registrar.partition_for('lake', 'events/dt=2024-01-01/hour=05/_SUCCESS'),
+            Partition('db', 'events', ('2024-01-01', '05'), 's3://lake/events/dt=2024-01-01/hour=05/'),
+        )
+        # the nested table's location is longer, so it wins
+        self.assertEqual(self.registrar.partition_for('lake', 'events/archive/dt=2023-12-31/_SUCCESS').table, 'archive')
+        self.assertIsNone(self.registrar.partition_for('lake', 'events/hour=05/dt=2024-01-01/_SUCCESS'))
+        self.assertIsNone(self.registrar.partition_for('lake', 'events/dt=2024-01-01/_SUCCESS'))
+        self.assertIsNone(self.registrar.partition_for('lake', 'events/dt=2024-01-01/hour=05/%s' % SCHEMA_MARKER))
+        self.assertIsNone(self.registrar.partition_for('lake', 'other/dt=2024-01-01/hour=05/_SUCCESS'))
+        self.assertEqual(self.glue.calls['GetTable'], 2)
+
+    def test_register_in_batches_of_100(self):
+        partitions = self.partitions(250)
+        registered, failed = self.registrar.register(partitions + partitions[:10])
+        self.assertEqual((len(registered), failed), (250, []))
+        self.assertEqual(self.glue.calls['BatchCreatePartition'], 3)
+        stored = self.glue.get_partition(DatabaseName='db', TableName='events', PartitionValues=['2024-01-02', '03'])['Partition']
+        self.assertEqual(stored['StorageDescriptor']['Location'], 's3://lake/events/dt=2024-01-02/hour=03/')
+        # registered by this container: no further calls
+        self.assertEqual(self.registrar.register(partitions[:5]), ([], []))
+        self.assertEqual(self.glue.calls['BatchCreatePartition'], 3)
+
+    def test_existing_partitions_count_as_registered(self):
+        partitions = self.partitions(2)
+        PartitionRegistrar(self.glue, [('db', 'events')]).register(partitions[:1])
+        registered, failed = self.registrar.register(partitions)
+        self.assertEqual((registered, failed), (partitions, []))
+
+    def test_throttled_call_fails_only_its_chunk(self):
+        self.glue.throttled = 1
+        partitions = self.partitions(150)
+        registered, failed = self.registrar.register(partitions)
+        self.assertEqual((failed, registered), (partitions[:100], partitions[100:]))
+        # failed partitions are not remembered, so the next event retries them
+        self.assertEqual(self.registrar.register(partitions), (partitions[:100], []))
+
+    def test_connection_errors_fail_like_api_errors(self):
+        self.glue.error = EndpointConnectionError(endpoint_url=GLUE_ENDPOINT)
+        self.glue.throttled = 1
+        partitions = self.partitions(150)
+        registered, failed = self.registrar.register(partitions)
+        self.assertEqual((failed, registered), (partitions[:100], partitions[100:]))
+
+        # a table that can not be loaded sends its objects to the crawler
+        self.glue.unreachable.add(('db', 'archive'))
+        registrar = PartitionRegistrar(self.glue, [('db', 'events'), ('db', 'archive')], clock=self.clock)
+        self.assertIsNone(registrar.partition_for('lake', 'events/archive/dt=2023-12-31/_SUCCESS'))
+        self.assertIsNotNone(registrar.partition_for('lake', 'events/dt=2024-01-01/hour=05/_SUCCESS'))
+        partition = Partition('db', 'archive', ('2023-12-31',), 's3://lake/events/archive/dt=2023-12-31/')
+        self.assertEqual(registrar.register([partition]), ([], [partition]))
+
+    def test_missing_table_is_skipped(self):
+        registrar = PartitionRegistrar(self.glue, [('db', 'missing'), ('db', 'events')], clock=self.clock)
+        self.assertIsNotNone(registrar.partition_for('lake', 'events/dt=2024-01-01/hour=05/_SUCCESS'))
+        self.assertIsNone(registrar.partition_for('lake', 'missing/dt=2024-01-01/_SUCCESS'))
+        partition = Partition('db', 'missing', ('2024-01-01',), 's3://lake/missing/dt=2024-01-01/')
+        self.assertEqual(registrar.register([partition]), ([], [partition]))
+        # created later: picked up once the cached definitions expire
+        self.glue.add_table('db', 'missing', 's3://lake/missing/', ['id'], ['dt'])
+        self.assertIsNone(registrar.partition_for('lake', 'missing/dt=2024-01-01/_SUCCESS'))
+        self.clock.now += 300
+        self.assertIsNotNone(registrar.partition_for('lake', 'missing/dt=2024-01-01/_SUCCESS'))
+
+    def test_registered_partitions_are_capped(self):
+        registrar = PartitionRegistrar(self.glue, [('db', 'events')], max_registered=2, clock=self.clock)
+        partitions = self.partitions(3)
+        registrar.register(partitions[:2])
+        registrar.register(partitions[:1])
+        registrar.register(partitions[2:])
+        # the least recently seen one was dropped
+        self.assertEqual(list(registrar.registered), [partitions[0], partitions[2]])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import threading
+import time
+from typing import Dict, Tuple
+
+import boto3
+from botocore.config import Config
+
+# connection pool constant
+MAX_POOL_CONNECTIONS = 50
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 60
+MAX_ATTEMPTS = 3
+
+CLIENT_CONFIG = Config(
+    max_pool_connections=MAX_POOL_CONNECTIONS,
+    tcp_keepalive=True,
+    connect_timeout=CONNECT_TIMEOUT,
+    read_timeout=READ_TIMEOUT,
+    retries={'max_attempts': MAX_ATTEMPTS, 'mode': 'standard'},
+)
+
+# clients live at module scope so warm invocations reuse credentials, endpoints and TLS connections
+_session = None
+_clients: Dict[Tuple, object] = {}
+_client_init_seconds: Dict[str, float] = {}
+_lock = threading.Lock()
+_cold_start = True
+
+
+def get_client(service_name: str, **kwargs):
+    """
+    Return a shared boto3 client, creating it on first use.
+
+    Clients are created once per container from a single boto3 session with a tuned
+    connection pool and TCP keep-alive, so warm invocations skip credential resolution,
+    endpoint setup and TLS handshakes.
+    """
+    key = (service_name, tuple(sorted(kwargs.items())))
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    global _session
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            start = time.perf_counter()
+            if _session is None:
+                _session = boto3.session.Session()
+            client = _session.client(service_name, config=kwargs.pop('config', CLIENT_CONFIG), **kwargs)
+            _client_init_seconds[service_name] = _client_init_seconds.get(service_name, 0.0) + time.perf_counter() - start
+            _clients[key] = client
+    return client
+
+
+def set_client(service_name: str, client, **kwargs) -> None:
+    """
+    Use ``client`` for ``get_client(service_name, **kwargs)``, e.g. a stand-in from ``lambda_common.fakes``.
+    """
+    with _lock:
+        _clients[(service_name, tuple(sorted(kwargs.items())))] = client
+
+
+def mark_invocation() -> bool:
+    """
+    Record the start of an invocation and return True for the first one in this container (cold start).
+    """
+    global _cold_start
+    cold, _cold_start = _cold_start, False
+    return cold
+
+
+def client_init_seconds() -> Dict[str, float]:
+    """
+    Return the time spent creating clients, per service.
+    """
+    return dict(_client_init_seconds)
@@ -0,0 +1,654 @@
+import csv
+import io
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence
+
+import botocore.exceptions
+
+
+class ClientError(botocore.exceptions.ClientError):
+    """
+    ``botocore.exceptions.ClientError`` raised by the fakes, so handlers catch it the same way.
+    """
+
+    def __init__(self, code: str, message: str, operation_name: str):
+        super().__init__({'Error': {'Code': code, 'Message': message}, 'ResponseMetadata': {'HTTPStatusCode': 400}}, operation_name)
+
+
+class _Exceptions:
+    ClientError = ClientError
+    NoSuchKey = ClientError
+    InvalidRequestException = ClientError
+
+
+def _ok(**fields) -> dict:
+    fields['ResponseMetadata'] = {'HTTPStatusCode': 200}
+    return fields
+
+
+def parse_s3_uri(uri: str):
+    """
+    Split ``s3://bucket/prefix`` into ``(bucket, prefix)``.
+    """
+    if not uri.startswith('s3://'):
+        raise ValueError('not an S3 URI: %s' % uri)
+    bucket, _, prefix = uri[len('s3://'):].partition('/')
+    return bucket, prefix
+
+
+class _Body:
+    def __init__(self, data: bytes):
+        self._stream = io.BytesIO(data)
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        return self._stream.read() if amt is None else self._stream.read(amt)
+
+    def iter_chunks(self, chunk_size: int = 1024 * 1024):
+        while True:
+            chunk = self._stream.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self) -> None:
+        self._stream.close()
+
+
+class FakeS3Client:
+    """
+    S3 client stand-in backed by the local filesystem (``root/<bucket>/<key>``).
+
+    Implements the boto3 method shapes used by the Lambdas: ``put_object``, ``get_object``
+    (with ``Range``), ``head_object``, ``delete_objects`` and ``list_objects_v2``.
+
+    :param latency: Seconds added to every call.
+    """
+
+    exceptions = _Exceptions
+
+    def __init__(self, root: str, latency: float = 0.0):
+        self.root = root
+        self.latency = latency
+        self.calls: Dict[str, int] = {}
+
+    def _call(self, operation: str) -> None:
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _path(self, bucket: str, key: str) -> str:
+        return os.path.join(self.root, bucket, *key.split('/'))
+
+    def put_object(self, Bucket: str, Key: str, Body=b'', **kwargs) -> dict:
+        self._call('PutObject')
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = Body.encode('utf-8') if isinstance(Body, str) else (Body.read() if hasattr(Body, 'read') else Body)
+        with open(path, 'wb') as fp:
+            fp.write(data)
+        return _ok(ETag='"%s"' % uuid.uuid4().hex)
+
+    def head_object(self, Bucket: str, Key: str, **kwargs) -> dict:
+        self._call('HeadObject')
+        path = self._path(Bucket, Key)
+        if not os.path.isfile(path):
+            raise ClientError('404', 'Not Found', 'HeadObject')
+        return _ok(ContentLength=os.path.getsize(path))
+
+    def get_object(self, Bucket: str, Key: str, Range: Optional[str] = None, **kwargs) -> dict:
+        self._call('GetObject')
+        path = self._path(Bucket, Key)
+        if not os.path.isfile(path):
+            raise ClientError('NoSuchKey', 'The specified key does not exist.', 'GetObject')
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        if Range:
+            match = re.fullmatch(r'bytes=(\d+)-(\d*)', Range)
+            if match is None:
+                raise ClientError('InvalidRange', 'Invalid range %s' % Range, 'GetObject')
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            if start >= size:
+                raise ClientError('InvalidRange', 'The requested range is not satisfiable', 'GetObject')
+        with open(path, 'rb') as fp:
+            fp.seek(start)
+            data = fp.read(end - start + 1)
+        response = _ok(Body=_Body(data), ContentLength=len(data))
+        if Range:
+            response['ContentRange'] = 'bytes %d-%d/%d' % (start, end, size)
+        return response
+
+    def delete_objects(self, Bucket: str, Delete: dict, **kwargs) -> dict:
+        self._call('DeleteObjects')
+        if len(Delete['Objects']) > 1000:
+            raise ClientError('MalformedXML', 'at most 1000 keys per request', 'DeleteObjects')
+        deleted = []
+        for obj in Delete['Objects']:
+            try:
+                os.remove(self._path(Bucket, obj['Key']))
+            except FileNotFoundError:
+                pass
+            deleted.append({'Key': obj['Key']})
+        return _ok(Deleted=deleted)
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = '', MaxKeys: int = 1000, ContinuationToken: Optional[str] = None, Delimiter: Optional[str] = None, **kwargs) -> dict:
+        self._call('ListObjectsV2')
+        base = os.path.join(self.root, Bucket)
+        contents = []
+        common_prefixes = set()
+        for directory, _, files in os.walk(base):
+            for name in files:
+                path = os.path.join(directory, name)
+                key = os.path.relpath(path, base).replace(os.sep, '/')
+                if not key.startswith(Prefix):
+                    continue
+                # keys with the delimiter after the prefix are rolled up into CommonPrefixes
+                if Delimiter and Delimiter in key[len(Prefix):]:
+                    common_prefixes.add(key[:key.index(Delimiter, len(Prefix)) + len(Delimiter)])
+                    continue
+                contents.append({'Key': key, 'Size': os.path.getsize(path), 'LastModified': datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)})
+        contents.sort(key=lambda obj: obj['Key'])
+        # the continuation token is the last key of the previous page
+        if ContinuationToken:
+            contents = [obj for obj in contents if obj['Key'] > ContinuationToken]
+        page = contents[:MaxKeys]
+        response = _ok(Contents=page, KeyCount=len(page), IsTruncated=len(contents) > MaxKeys)
+        if common_prefixes:
+            response['CommonPrefixes'] = [{'Prefix': prefix} for prefix in sorted(common_prefixes)]
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = page[-1]['Key']
+        return response
+
+
+def load_records(path: str) -> List[dict]:
+    """
+    Load fixture records from a JSONL file (one object per line, e.g. ``Athena/data.py``) or a CSV file with a header.
+    """
+    with open(path, encoding='utf-8') as fp:
+        text = fp.read()
+    if text.lstrip().startswith('{'):
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+def _athena_type(values: Sequence[object]) -> str:
+    present = [value for value in values if value is not None]
+    if present and all(isinstance(value, bool) for value in present):
+        return 'boolean'
+    if present and all(isinstance(value, int) and not isinstance(value, bool) for value in present):
+        return 'bigint'
+    if present and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        return 'double'
+    return 'varchar'
+
+
+def _format_value(value: object) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+_LITERAL = r"'((?:[^']|'')*)'|([\w.:-]+)"
+
+
+def _predicate_values(sql: str, column: str) -> Optional[set]:
+    # values of `column = v` or `column IN (v, ...)`, None when the query has no such predicate
+    values = None
+    for match in re.finditer(r'\b%s\s*=\s*(?:%s)' % (re.escape(column), _LITERAL), sql, re.IGNORECASE):
+        values = (values or set()) | {match.group(1).replace("''", "'") if match.group(1) is not None else match.group(2)}
+    for match in re.finditer(r'\b%s\s+IN\s*\(([^)]*)\)' % re.escape(column), sql, re.IGNORECASE):
+        values = (values or set()) | {quoted.replace("''", "'") if bare == '' else bare for quoted, bare in re.findall(_LITERAL, match.group(1))}
+    return values
+
+
+class _Execution:
+    def __init__(self, query_execution_id: str, query: str, output_location: str, work_group: str, submitted: float):
+        self.id = query_execution_id
+        self.query = query
+        self.output_location = output_location
+        self.work_group = work_group
+        self.submitted = submitted
+        self.submitted_at = datetime.now(timezone.utc)
+        self.columns: List[dict] = []
+        self.rows: List[tuple] = []
+        self.error: Optional[str] = None
+        self.cancelled = False
+        self.scanned_bytes = 0
+
+
+class FakeAthenaClient:
+    """
+    Athena client stand-in that runs queries on SQLite over JSONL/CSV fixtures.
+
+    Tables are registered as ``database.table`` and queried with the same SQL the Lambda sends
+    (``SELECT * FROM database.table where ...``). Results are served page by page through
+    ``get_query_results`` and also written as CSV to the output location on the fake S3, like Athena.
+
+    Each query spends ``queue_latency`` seconds QUEUED and ``execution_latency`` seconds RUNNING
+    before it SUCCEEDED, and every API call adds ``api_latency`` seconds, so polling, paging and
+    caching paths can be benchmarked offline.
+
+    ``DataScannedInBytes`` is estimated like a columnar table: only the columns the query names
+    (all of them for ``*``) of the rows in the partitions it selects are counted.
+
+    :param tables: ``{"database.table": "path/to/fixture.jsonl" or [records]}``.
+    :param partition_keys: ``{"database.table": ("dt", ...)}``. Partition columns are stored in the fixture records.
+    :param s3: A ``FakeS3Client`` that receives the result CSV files, or None.
+    :param max_concurrent: Queries beyond this number of RUNNING ones fail with TooManyRequestsException.
+    """
+
+    exceptions = _Exceptions
+
+    def __init__(self, tables: Dict[str, object], s3: Optional[FakeS3Client] = None, partition_keys: Optional[Dict[str, Sequence[str]]] = None, queue_latency: float = 0.0, execution_latency: float = 0.0, api_latency: float = 0.0, max_concurrent: Optional[int] = None, clock: Callable[[], float] = time.monotonic):
+        self.s3 = s3
+        self.queue_latency = queue_latency
+        self.execution_latency = execution_latency
+        self.api_latency = api_latency
+        self.max_concurrent = max_concurrent
+        self.clock = clock
+        self.calls: Dict[str, int] = {}
+        self._tables: Dict[str, tuple] = {}
+        self._executions: Dict[str, _Execution] = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(':memory:', check_same_thread=False)
+        partition_keys = partition_keys or {}
+        for name, source in tables.items():
+            self.add_table(name, load_records(source) if isinstance(source, str) else list(source), partition_keys.get(name, ()))
+
+    def add_table(self, name: str, records: List[dict], partition_keys: Sequence[str] = ()) -> None:
+        database, _, table = name.rpartition('.')
+        database = database or 'default'
+        attached = {row[1] for row in self._db.execute('PRAGMA database_list')}
+        if database not in attached:
+            self._db.execute("ATTACH DATABASE ':memory:' AS \"%s\"" % database)
+        columns: List[str] = []
+        for record in records:
+            for column in record:
+                if column not in columns:
+                    columns.append(column)
+        self._db.execute('CREATE TABLE "%s"."%s" (%s)' % (database, table, ', '.join('"%s"' % column for column in columns)))
+        self._db.executemany(
+            'INSERT INTO "%s"."%s" VALUES (%s)' % (database, table, ', '.join('?' for _ in columns)),
+            [tuple(record.get(column) for column in columns) for record in records],
+        )
+        self._tables['%s.%s' % (database, table)] = (columns, records, tuple(partition_keys))
+
+    def _call(self, operation: str) -> None:
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.api_latency:
+            time.sleep(self.api_latency)
+
+    def _get(self, query_execution_id: str, operation: str) -> _Execution:
+        execution = self._executions.get(query_execution_id)
+        if execution is None:
+            raise ClientError('InvalidRequestException', 'QueryExecution %s was not found' % query_execution_id, operation)
+        return execution
+
+    def _state(self, execution: _Execution) -> str:
+        if execution.cancelled:
+            return 'CANCELLED'
+        elapsed = self.clock() - execution.submitted
+        if elapsed < self.queue_latency:
+            return 'QUEUED'
+        if elapsed < self.queue_latency + self.execution_latency:
+            return 'RUNNING'
+        return 'FAILED' if execution.error else 'SUCCEEDED'
+
+    def _running(self) -> int:
+        return sum(1 for execution in self._executions.values() if self._state(execution) in ('QUEUED', 'RUNNING'))
+
+    def _execute(self, execution: _Execution) -> None:
+        sql = execution.query.strip().rstrip(';')
+        try:
+            with self._lock:
+                cursor = self._db.execute(sql)
+                rows = cursor.fetchall()
+            names = [description[0] for description in cursor.description or []]
+        except sqlite3.Error as e:
+            execution.error = 'SYNTAX_ERROR: %s' % e
+            return
+        execution.columns = [
+            {'Name': name, 'Label': name, 'Type': _athena_type([row[index] for row in rows])}
+            for index, name in enumerate(names)
+        ]
+        execution.rows = rows
+        execution.scanned_bytes = self._scanned_bytes(sql)
+        if self.s3 is not None and execution.output_location:
+            self._write_output(execution)
+
+    def _scanned_bytes(self, sql: str) -> int:
+        unquoted = sql.replace('"', '')
+        # identifiers are looked up outside string literals only
+        identifiers = re.sub(r"'(?:[^']|'')*'", "''", unquoted)
+        select_all = re.search(r'(^|[\s,(])\*', identifiers) is not None
+        scanned = 0
+        for name, (columns, records, partition_keys) in self._tables.items():
+            if not re.search(r'\b%s\b' % re.escape(name), identifiers, re.IGNORECASE):
+                continue
+            # partition columns come from the S3 path and are not scanned
+            projected = [column for column in columns if column not in partition_keys and (select_all or re.search(r'\b%s\b' % re.escape(column), identifiers))]
+            selected = records
+            for key in partition_keys:
+                values = _predicate_values(unquoted, key)
+                if values is not None:
+                    selected = [record for record in selected if _format_value(record.get(key)) in values]
+            scanned += sum(len(_format_value(record[column]).encode('utf-8')) for record in selected for column in projected if record.get(column) is not None)
+        return scanned
+
+    def _write_output(self, execution: _Execution) -> None:
+        bucket, key = parse_s3_uri(execution.output_location)
+
+        # athena quotes every value and leaves NULL empty
+        def encode(value):
+            value = _format_value(value)
+            return '' if value is None else '"%s"' % value.replace('"', '""')
+
+        lines = [','.join('"%s"' % column['Name'] for column in execution.columns)]
+        lines.extend(','.join(encode(value) for value in row) for row in execution.rows)
+        self.s3.put_object(Bucket=bucket, Key=key, Body=('\n'.join(lines) + '\n').encode('utf-8'))
+        self.s3.put_object(Bucket=bucket, Key=key + '.metadata', Body=json.dumps(execution.columns).encode('utf-8'))
+
+    def start_query_execution(self, QueryString: str, QueryExecutionContext: Optional[dict] = None, ResultConfiguration: Optional[dict] = None, WorkGroup: str = 'primary', **kwargs) -> dict:
+        self._call('StartQueryExecution')
+        if self.max_concurrent is not None and self._running() >= self.max_concurrent:
+            raise ClientError('TooManyRequestsException', 'Too many concurrent queries', 'StartQueryExecution')
+        query_execution_id = str(uuid.uuid4())
+        output_location = ''
+        if ResultConfiguration and ResultConfiguration.get('OutputLocation'):
+            output_location = ResultConfiguration['OutputLocation'].rstrip('/') + '/' + query_execution_id + '.csv'
+        execution = _Execution(query_execution_id, QueryString, output_location, WorkGroup, self.clock())
+        self._executions[query_execution_id] = execution
+        self._execute(execution)
+        return _ok(QueryExecutionId=query_execution_id)
+
+    def get_query_execution(self, QueryExecutionId: str, **kwargs) -> dict:
+        self._call('GetQueryExecution')
+        execution = self._get(QueryExecutionId, 'GetQueryExecution')
+        state = self._state(execution)
+        status = {'State': state, 'SubmissionDateTime': execution.submitted_at}
+        if state == 'FAILED':
+            status['StateChangeReason'] = execution.error
+        finished = state in ('SUCCEEDED', 'FAILED', 'CANCELLED')
+        statistics = {
+            'QueryQueueTimeInMillis': int(self.queue_latency * 1000),
+            'EngineExecutionTimeInMillis': int(self.execution_latency * 1000) if finished else 0,
+            'TotalExecutionTimeInMillis': int((self.queue_latency + self.execution_latency) * 1000) if finished else 0,
+            'DataScannedInBytes': execution.scanned_bytes if finished else 0,
+        }
+        return _ok(QueryExecution={
+            'QueryExecutionId': execution.id,
+            'Query': execution.query,
+            'WorkGroup': execution.work_group,
+            'ResultConfiguration': {'OutputLocation': execution.output_location},
+            'Status': status,
+            'Statistics': statistics,
+        })
+
+    def stop_query_execution(self, QueryExecutionId: str, **kwargs) -> dict:
+        self._call('StopQueryExecution')
+        execution = self._get(QueryExecutionId, 'StopQueryExecution')
+        if self._state(execution) in ('QUEUED', 'RUNNING'):
+            execution.cancelled = True
+        return _ok()
+
+    def get_query_results(self, QueryExecutionId: str, MaxResults: int = 1000, NextToken: Optional[str] = None, **kwargs) -> dict:
+        self._call('GetQueryResults')
+        execution = self._get(QueryExecutionId, 'GetQueryResults')
+        state = self._state(execution)
+        if state != 'SUCCEEDED':
+            raise ClientError('InvalidRequestException', 'Query has not yet finished. Current state: %s' % state, 'GetQueryResults')
+        if not 1 <= MaxResults <= 1000:
+            raise ClientError('InvalidRequestException', 'MaxResults must be between 1 and 1000', 'GetQueryResults')
+
+        # the header row counts against MaxResults on the first page
+        offset = int(NextToken) if NextToken else 0
+        rows = []
+        if offset == 0:
+            rows.append({'Data': [{'VarCharValue': column['Name']} for column in execution.columns]})
+        end = offset + MaxResults - len(rows)
+        for row in execution.rows[offset:end]:
+            rows.append({'Data': [{} if value is None else {'VarCharValue': _format_value(value)} for value in row]})
+        response = _ok(ResultSet={'Rows': rows, 'ResultSetMetadata': {'ColumnInfo': execution.columns}}, UpdateCount=0)
+        if end < len(execution.rows):
+            response['NextToken'] = str(end)
+        return response
+
+
+class FakeGlueClient:
+    """
+    Glue client stand-in for the crawler Lambda.
+
+    A started crawler is RUNNING for ``crawl_seconds`` and READY afterwards; starting a running
+    crawler raises ``CrawlerRunningException`` like Glue. Every start is recorded in ``starts``.
+
+    Tables added with ``add_table`` make up an in-memory Data Catalog for ``get_table``,
+    ``batch_create_partition`` (at most 100 per call, existing ones reported as
+    ``AlreadyExistsException``), ``get_partition`` and ``get_partitions``.
+
+    :param crawlers: Known crawler names. Unknown names raise ``EntityNotFoundException``.
+    """
+
+    exceptions = _Exceptions
+
+    def __init__(self, crawlers: Sequence[str] = (), crawl_seconds: float = 60.0, clock: Callable[[], float] = time.time):
+        self.crawl_seconds = crawl_seconds
+        self.clock = clock
+        self.calls: Dict[str, int] = {}
+        self.starts: List[tuple] = []
+        self._crawl_started: Dict[str, Optional[float]] = {name: None for name in crawlers}
+        # (database, table) -> table, and -> {values: partition}
+        self._tables: Dict[tuple, dict] = {}
+        self._partitions: Dict[tuple, Dict[tuple, dict]] = {}
+
+    def add_table(self, database: str, name: str, location: str, columns: Sequence[str] = (), partition_keys: Sequence[str] = ()) -> None:
+        """
+        Add a Parquet table whose columns and partition keys are all strings.
+        """
+        self._tables[(database, name)] = {
+            'Name': name,
+            'DatabaseName': database,
+            'StorageDescriptor': {
+                'Columns': [{'Name': column, 'Type': 'string'} for column in columns],
+                'Location': location,
+                'InputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat',
+                'OutputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat',
+                'SerdeInfo': {'SerializationLibrary': 'org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe'},
+                'Compressed': False,
+            },
+            'PartitionKeys': [{'Name': key, 'Type': 'string'} for key in partition_keys],
+            'TableType': 'EXTERNAL_TABLE',
+        }
+        self._partitions.setdefault((database, name), {})
+
+    def _table(self, database: str, name: str, operation: str) -> dict:
+        if (database, name) not in self._tables:
+            raise ClientError('EntityNotFoundException', 'Table %s not found' % name, operation)
+        return self._tables[(database, name)]
+
+    def _call(self, operation: str) -> None:
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+
+    def _started(self, name: str, operation: str) -> Optional[float]:
+        if name not in self._crawl_started:
+            raise ClientError('EntityNotFoundException', 'Crawler with name %s does not exist' % name, operation)
+        return self._crawl_started[name]
+
+    def get_crawler(self, Name: str, **kwargs) -> dict:
+        self._call('GetCrawler')
+        started = self._started(Name, 'GetCrawler')
+        crawler = {'Name': Name, 'State': 'READY'}
+        if started is not None:
+            elapsed = self.clock() - started
+            if elapsed < self.crawl_seconds:
+                crawler['State'] = 'RUNNING'
+                crawler['CrawlElapsedTime'] = int(elapsed * 1000)
+            else:
+                crawler['LastCrawl'] = {'Status': 'SUCCEEDED', 'StartTime': datetime.fromtimestamp(started, timezone.utc)}
+        return _ok(Crawler=crawler)
+
+    def start_crawler(self, Name: str, **kwargs) -> dict:
+        self._call('StartCrawler')
+        started = self._started(Name, 'StartCrawler')
+        if started is not None and self.clock() - started < self.crawl_seconds:
+            raise ClientError('CrawlerRunningException', 'Crawler with name %s has already started' % Name, 'StartCrawler')
+        self._crawl_started[Name] = self.clock()
+        self.starts.append((Name, self._crawl_started[Name]))
+        return _ok()
+
+    def get_table(self, DatabaseName: str, Name: str, **kwargs) -> dict:
+        self._call('GetTable')
+        return _ok(Table=json.loads(json.dumps(self._table(DatabaseName, Name, 'GetTable'))))
+
+    def batch_create_partition(self, DatabaseName: str, TableName: str, PartitionInputList: List[dict], **kwargs) -> dict:
+        self._call('BatchCreatePartition')
+        table = self._table(DatabaseName, TableName, 'BatchCreatePartition')
+        if len(PartitionInputList) > 100:
+            raise ClientError('ValidationException', 'PartitionInputList must have at most 100 members', 'BatchCreatePartition')
+        partitions = self._partitions[(DatabaseName, TableName)]
+        errors = []
+        for partition_input in PartitionInputList:
+            values = tuple(partition_input['Values'])
+            if len(values) != len(table['PartitionKeys']):
+                errors.append({'PartitionValues': list(values), 'ErrorDetail': {'ErrorCode': 'InvalidInputException', 'ErrorMessage': 'The number of partition keys do not match the number of partition values'}})
+            elif values in partitions:
+                errors.append({'PartitionValues': list(values), 'ErrorDetail': {'ErrorCode': 'AlreadyExistsException', 'ErrorMessage': 'Partition already exists.'}})
+            else:
+                partitions[values] = dict(json.loads(json.dumps(partition_input)), DatabaseName=DatabaseName, TableName=TableName, CreationTime=datetime.fromtimestamp(self.clock(), timezone.utc))
+        return _ok(Errors=errors) if errors else _ok()
+
+    def get_partition(self, DatabaseName: str, TableName: str, PartitionValues: List[str], **kwargs) -> dict:
+        self._call('GetPartition')
+        self._table(DatabaseName, TableName, 'GetPartition')
+        partition = self._partitions[(DatabaseName, TableName)].get(tuple(PartitionValues))
+        if partition is None:
+            raise ClientError('EntityNotFoundException', 'Cannot find partition.', 'GetPartition')
+        return _ok(Partition=partition)
+
+    def get_partitions(self, DatabaseName: str, TableName: str, MaxResults: int = 1000, NextToken: Optional[str] = None, **kwargs) -> dict:
+        self._call('GetPartitions')
+        self._table(DatabaseName, TableName, 'GetPartitions')
+        partitions = [partition for _, partition in sorted(self._partitions[(DatabaseName, TableName)].items())]
+        start = int(NextToken or 0)
+        response = _ok(Partitions=partitions[start:start + MaxResults])
+        if start + MaxResults < len(partitions):
+            response['NextToken'] = str(start + MaxResults)
+        return response
+
+
+class FakeDynamoDBClient:
+    """
+    DynamoDB client stand-in holding items in memory, for the state shared across Lambda containers.
+
+    Implements ``get_item`` and ``put_item``. ``ConditionExpression`` supports the subset used by the
+    Lambdas: clauses ``attribute_not_exists(name)``, ``attribute_exists(name)`` and ``name = :value``
+    joined by ``OR``; a failed condition raises ``ConditionalCheckFailedException``.
+
+    :param tables: Table name -> partition key attribute name.
+    :param latency: Seconds added to every call.
+    """
+
+    exceptions = _Exceptions
+
+    def __init__(self, tables: Dict[str, str], latency: float = 0.0):
+        self.key_names = dict(tables)
+        self.latency = latency
+        self.calls: Dict[str, int] = {}
+        self._items: Dict[tuple, dict] = {}
+        self._lock = threading.Lock()
+
+    def _call(self, operation: str) -> None:
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _key(self, table_name: str, item: dict, operation: str) -> tuple:
+        if table_name not in self.key_names:
+            raise ClientError('ResourceNotFoundException', 'Requested resource not found', operation)
+        key_name = self.key_names[table_name]
+        return table_name, json.dumps(item[key_name], sort_keys=True)
+
+    @staticmethod
+    def _matches(item: Optional[dict], condition: str, values: dict) -> bool:
+        for clause in condition.split(' OR '):
+            clause = clause.strip()
+            match = re.fullmatch(r'attribute_(not_exists|exists)\((\w+)\)', clause)
+            if match:
+                exists = item is not None and match.group(2) in item
+                if exists == (match.group(1) == 'exists'):
+                    return True
+                continue
+            name, _, placeholder = (part.strip() for part in clause.partition('='))
+            if item is not None and item.get(name) == values[placeholder]:
+                return True
+        return False
+
+    def get_item(self, TableName: str, Key: dict, ConsistentRead: bool = False, **kwargs) -> dict:
+        self._call('GetItem')
+        with self._lock:
+            item = self._items.get(self._key(TableName, Key, 'GetItem'))
+        return _ok(Item=json.loads(json.dumps(item))) if item is not None else _ok()
+
+    def put_item(self, TableName: str, Item: dict, ConditionExpression: Optional[str] = None, ExpressionAttributeValues: Optional[dict] = None, **kwargs) -> dict:
+        self._call('PutItem')
+        key = self._key(TableName, Item, 'PutItem')
+        with self._lock:
+            if ConditionExpression and not self._matches(self._items.get(key), ConditionExpression, ExpressionAttributeValues or {}):
+                raise ClientError('ConditionalCheckFailedException', 'The conditional request failed', 'PutItem')
+            self._items[key] = json.loads(json.dumps(Item))
+        return _ok()
+
+
+class FakeContext:
+    """
+    Lambda context stand-in whose remaining time counts down from ``timeout`` seconds.
+    """
+
+    def __init__(self, timeout: float = 60.0, function_name: str = 'local', clock: Callable[[], float] = time.monotonic):
+        self.function_name = function_name
+        self.aws_request_id = str(uuid.uuid4())
+        self.clock = clock
+        self._deadline = clock() + timeout
+
+    def get_remaining_time_in_millis(self) -> int:
+        return max(0, int((self._deadline - self.clock()) * 1000))
+
+
+class FakeClock:
+    """
+    Manual clock for the ``clock``/``sleep`` parameters of the Lambda helpers.
+
+    ``sleep`` records the requested delay in ``sleeps`` and advances ``now`` instead of blocking.
+    """
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+        self.sleeps: List[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def wait_until(predicate: Callable[[], bool], timeout: float = 5.0) -> None:
+    """
+    Poll ``predicate`` until it is true, for tests that wait on a background thread.
+
+    :raises AssertionError: When ``timeout`` seconds pass first.
+    """
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.001)
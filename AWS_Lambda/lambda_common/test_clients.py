@@ -0,0 +1,43 @@
+import threading
+import unittest
+
+# run from AWS_Lambda: python -m pytest lambda_common/test_clients.py
+from lambda_common import clients
+
+class TestClients(unittest.TestCase):
+
+    def setUp(self):
+        self._saved = dict(clients._clients), clients._cold_start
+
+    def tearDown(self):
+        clients._clients.clear()
+        clients._clients.update(self._saved[0])
+        clients._cold_start = self._saved[1]
+
+    def test_client_is_created_once(self):
+        created = []
+
+        def create():
+            created.append(clients.get_client('s3', region_name='us-east-1'))
+
+        threads = [threading.Thread(target=create) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(client) for client in created}), 1)
+        self.assertIsNot(clients.get_client('s3', region_name='us-west-2'), created[0])
+        self.assertIn('s3', clients.client_init_seconds())
+
+    def test_set_client(self):
+        fake = object()
+        clients.set_client('athena', fake)
+        self.assertIs(clients.get_client('athena'), fake)
+
+    def test_cold_then_warm(self):
+        clients._cold_start = True
+        self.assertTrue(clients.mark_invocation())
+        self.assertFalse(clients.mark_invocation())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import tempfile
+import unittest
+
+# run from AWS_Lambda: python -m pytest lambda_common/test_fakes.py
+from lambda_common.fakes import ClientError, FakeAthenaClient, FakeClock, FakeDynamoDBClient, FakeS3Client
+
+
+class TestFakeS3Client(unittest.TestCase):
+
+    def setUp(self):
+        self._root = tempfile.TemporaryDirectory()
+        self.s3 = FakeS3Client(self._root.name)
+
+    def tearDown(self):
+        self._root.cleanup()
+
+    def test_ranged_get(self):
+        self.s3.put_object(Bucket='b', Key='k', Body=b'0123456789')
+        self.assertEqual(self.s3.get_object(Bucket='b', Key='k', Range='bytes=2-4')['Body'].read(), b'234')
+        self.assertEqual(self.s3.get_object(Bucket='b', Key='k', Range='bytes=8-20')['Body'].read(), b'89')
+        with self.assertRaises(ClientError):
+            self.s3.get_object(Bucket='b', Key='k', Range='bytes=10-')
+
+    def test_list_pages_and_common_prefixes(self):
+        for key in ('out/a.csv', 'out/b.csv', 'out/c.csv', 'out/sub/d.csv'):
+            self.s3.put_object(Bucket='b', Key=key, Body=b'x')
+        first = self.s3.list_objects_v2(Bucket='b', Prefix='out/', Delimiter='/', MaxKeys=2)
+        self.assertEqual([obj['Key'] for obj in first['Contents']], ['out/a.csv', 'out/b.csv'])
+        self.assertEqual(first['CommonPrefixes'], [{'Prefix': 'out/sub/'}])
+        second = self.s3.list_objects_v2(Bucket='b', Prefix='out/', Delimiter='/', MaxKeys=2, ContinuationToken=first['NextContinuationToken'])
+        self.assertEqual([obj['Key'] for obj in second['Contents']], ['out/c.csv'])
+        self.assertFalse(second['IsTruncated'])
+
+class TestFakeAthenaClient(unittest.TestCase):
+
+    def test_states_follow_the_latencies(self):
+        clock = FakeClock()
+        athena = FakeAthenaClient({'db.t': [{'id': 1}]}, queue_latency=1, execution_latency=2, clock=clock)
+        qid = athena.start_query_execution(QueryString='SELECT * FROM db.t')['QueryExecutionId']
+        states = []
+        for now in (0.5, 1.5, 3.0):
+            clock.now = now
+            states.append(athena.get_query_execution(QueryExecutionId=qid)['QueryExecution']['Status']['State'])
+        self.assertEqual(states, ['QUEUED', 'RUNNING', 'SUCCEEDED'])
+
+    def test_syntax_error_fails_the_query(self):
+        athena = FakeAthenaClient({'db.t': [{'id': 1}]})
+        qid = athena.start_query_execution(QueryString='SELECT FROM')['QueryExecutionId']
+        status = athena.get_query_execution(QueryExecutionId=qid)['QueryExecution']['Status']
+        self.assertEqual(status['State'], 'FAILED')
+        self.assertIn('SYNTAX_ERROR', status['StateChangeReason'])
+
+    def test_max_concurrent(self):
+        athena = FakeAthenaClient({'db.t': [{'id': 1}]}, execution_latency=60, max_concurrent=1)
+        athena.start_query_execution(QueryString='SELECT * FROM db.t')
+        with self.assertRaisesRegex(ClientError, 'TooManyRequestsException'):
+            athena.start_query_execution(QueryString='SELECT * FROM db.t')
+
+class TestFakeDynamoDBClient(unittest.TestCase):
+
+    def test_conditional_put(self):
+        dynamodb = FakeDynamoDBClient({'t': 'id'})
+        item = {'id': {'S': 'a'}, 'version': {'N': '1'}}
+        dynamodb.put_item(TableName='t', Item=item, ConditionExpression='attribute_not_exists(id)')
+        with self.assertRaisesRegex(ClientError, 'ConditionalCheckFailedException'):
+            dynamodb.put_item(TableName='t', Item=item, ConditionExpression='attribute_not_exists(id)')
+        dynamodb.put_item(TableName='t', Item=dict(item, version={'N': '2'}), ConditionExpression='attribute_not_exists(id) OR version = :v', ExpressionAttributeValues={':v': {'N': '1'}})
+        self.assertEqual(dynamodb.get_item(TableName='t', Key={'id': {'S': 'a'}})['Item']['version'], {'N': '2'})
+        self.assertNotIn('Item', dynamodb.get_item(TableName='t', Key={'id': {'S': 'b'}}))
+
+if __name__ == "__main__":
+    unittest.main()
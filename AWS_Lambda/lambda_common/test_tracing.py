@@ -0,0 +1,67 @@
+import contextlib
+import io
+import json
+import unittest
+
+# run from AWS_Lambda: python -m pytest lambda_common/test_tracing.py
+from lambda_common import tracing
+from lambda_common.fakes import FakeContext
+
+
+def handler(event, context):
+    with tracing.span('poll'):
+        pass
+    with tracing.span('poll'):
+        pass
+    tracing.record('queue', 0.25)
+    tracing.count('scanned_bytes', 100)
+    tracing.count('polls', 2)
+    tracing.annotate(query='lookup')
+    if event.get('fail'):
+        raise ValueError('bad event')
+    return 'ok'
+
+class TestTracing(unittest.TestCase):
+
+    def setUp(self):
+        self._enabled = tracing.ENABLED
+
+    def tearDown(self):
+        tracing.ENABLED = self._enabled
+
+    def invoke(self, event):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            try:
+                result = tracing.traced(handler)(event, FakeContext(function_name='lookup-fn'))
+            except ValueError:
+                result = None
+        return result, output.getvalue()
+
+    def test_disabled_prints_nothing(self):
+        tracing.ENABLED = False
+        self.assertEqual(self.invoke({}), ('ok', ''))
+        self.assertIs(tracing.span('poll'), tracing.span('submit'))
+
+    def test_embedded_metric_record(self):
+        tracing.ENABLED = True
+        result, output = self.invoke({})
+        self.assertEqual(result, 'ok')
+        record = json.loads(output)
+        self.assertEqual(record['function'], 'lookup-fn')
+        self.assertEqual(record['query'], 'lookup')
+        self.assertEqual(record['queue_ms'], 250.0)
+        self.assertEqual((record['polls'], record['scanned_bytes']), (2, 100))
+        units = {metric['Name']: metric['Unit'] for metric in record['_aws']['CloudWatchMetrics'][0]['Metrics']}
+        self.assertEqual((units['poll_ms'], units['total_ms'], units['polls'], units['scanned_bytes']), ('Milliseconds', 'Milliseconds', 'Count', 'Bytes'))
+        # the invocation's trace is gone once the handler returns
+        self.assertIs(tracing.current(), tracing.NOOP)
+
+    def test_error_is_recorded(self):
+        tracing.ENABLED = True
+        result, output = self.invoke({'fail': True})
+        self.assertIsNone(result)
+        self.assertEqual(json.loads(output)['error'], 'ValueError')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,211 @@
+import contextvars
+import functools
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict, Optional
+
+# tracing is off unless the function sets LAMBDA_TRACE=1
+ENABLED = os.environ.get('LAMBDA_TRACE', '').lower() in ('1', 'true', 'yes')
+
+# CloudWatch namespace of the embedded metrics
+NAMESPACE = os.environ.get('LAMBDA_TRACE_NAMESPACE', 'LambdaTrace')
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class _NoopTrace:
+    """
+    Stands in for a trace when tracing is disabled or outside an invocation. Every method does nothing.
+    """
+    __slots__ = ()
+
+    def span(self, name: str) -> _NoopSpan:
+        return _NOOP_SPAN
+
+    def record(self, name: str, seconds: float) -> None:
+        pass
+
+    def count(self, name: str, value: float = 1) -> None:
+        pass
+
+    def annotate(self, **fields) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+NOOP = _NoopTrace()
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'start')
+
+    def __init__(self, trace: 'Trace', name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Trace:
+    """
+    Per-phase durations, counters and fields of one invocation.
+
+    A phase that runs more than once (e.g. one ``poll`` per query) accumulates its duration.
+    """
+
+    def __init__(self, function: str):
+        self.function = function
+        self.start = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.counters: Dict[str, float] = {}
+        self.fields: Dict[str, object] = {}
+
+    def span(self, name: str) -> _Span:
+        return _Span(self, name)
+
+    def record(self, name: str, seconds: float) -> None:
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def count(self, name: str, value: float = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def annotate(self, **fields) -> None:
+        self.fields.update(fields)
+
+    def to_record(self, timestamp: Optional[float] = None) -> dict:
+        """
+        Return the trace as a CloudWatch Embedded Metric Format record: durations become ``<phase>_ms``
+        metrics, counters become metrics (``*_bytes`` in Bytes), fields are kept as searchable properties.
+        """
+        self.record('total', time.perf_counter() - self.start)
+        metrics = {'%s_ms' % name: round(seconds * 1000, 3) for name, seconds in self.durations.items()}
+        definitions = [{'Name': name, 'Unit': 'Milliseconds'} for name in metrics]
+        for name, value in self.counters.items():
+            metrics[name] = value
+            definitions.append({'Name': name, 'Unit': 'Bytes' if name.endswith('_bytes') else 'Count'})
+        record = {
+            '_aws': {
+                'Timestamp': int((timestamp if timestamp is not None else time.time()) * 1000),
+                'CloudWatchMetrics': [{'Namespace': NAMESPACE, 'Dimensions': [['function']], 'Metrics': definitions}],
+            },
+            'function': self.function,
+        }
+        record.update(self.fields)
+        record.update(metrics)
+        return record
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar('trace', default=NOOP)
+
+
+def current():
+    """
+    Return the trace of the running invocation, or a no-op trace.
+    """
+    return _current.get()
+
+
+def span(name: str):
+    """
+    Time a phase of the current invocation: ``with tracing.span('submit'): ...``.
+    """
+    if not ENABLED:
+        return _NOOP_SPAN
+    return _current.get().span(name)
+
+
+def record(name: str, seconds: float) -> None:
+    """
+    Add a duration measured elsewhere (e.g. Athena's own queue time) to the current invocation.
+    """
+    if ENABLED:
+        _current.get().record(name, seconds)
+
+
+def count(name: str, value: float = 1) -> None:
+    if ENABLED:
+        _current.get().count(name, value)
+
+
+def annotate(**fields) -> None:
+    if ENABLED:
+        _current.get().annotate(**fields)
+
+
+def traced(handler: Callable) -> Callable:
+    """
+    Decorate a Lambda handler to print one JSON line with the invocation's trace when it returns or raises.
+
+    When tracing is disabled the handler is called directly.
+    """
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        if not ENABLED:
+            return handler(event, context)
+        trace = Trace(getattr(context, 'function_name', None) or handler.__module__)
+        if context is not None:
+            trace.annotate(request_id=getattr(context, 'aws_request_id', None))
+        token = _current.set(trace)
+        try:
+            return handler(event, context)
+        except Exception as e:
+            trace.annotate(error=type(e).__name__)
+            raise
+        finally:
+            _current.reset(token)
+            print(json.dumps(trace.to_record(), default=str))
+    return wrapper
+
+
+def benchmark(iterations: int = 1000000) -> None:
+    """
+    Compare an empty loop with a loop that opens a span, traced and not.
+    """
+    global ENABLED
+    enabled_before = ENABLED
+
+    ENABLED = False
+    start = time.perf_counter()
+    for _ in range(iterations):
+        pass
+    baseline = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with span('phase'):
+            pass
+    disabled = time.perf_counter() - start
+
+    ENABLED = True
+    token = _current.set(Trace('benchmark'))
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with span('phase'):
+            pass
+    enabled = time.perf_counter() - start
+    _current.reset(token)
+    ENABLED = enabled_before
+
+    print("empty loop:       %.1f ns/iteration" % (baseline / iterations * 1e9))
+    print("span (disabled):  %.1f ns/iteration" % (disabled / iterations * 1e9))
+    print("span (enabled):   %.1f ns/iteration" % (enabled / iterations * 1e9))
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
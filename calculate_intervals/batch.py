@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Sequence, Tuple, Union
+import logging
+
+import numpy as np
+
+import instrumentation
+from timezones import get_offset_cache, localize_to_utc_micros
+
+# ログ設定
+logger = logging.getLogger(__name__)
+
+DatetimeArray = Union[np.ndarray, Sequence[datetime]]
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def _is_datetime64(values: DatetimeArray) -> bool:
+    return isinstance(values, np.ndarray) and np.issubdtype(values.dtype, np.datetime64)
+
+
+def _to_epoch_micros(values: DatetimeArray) -> np.ndarray:
+    """
+    Convert datetime64 arrays or sequences of datetime objects to UTC epoch microseconds.
+
+    datetime64 values are interpreted as UTC. Naive datetime objects are wall-clock times in
+    the local timezone like ``datetime.timestamp()`` in the scalar function; they are converted
+    in one ``numpy.array`` call and resolved through the cached local offset table
+    (``fold=0`` for ambiguous times). Aware datetime objects are converted one by one.
+    """
+    if _is_datetime64(values):
+        return values.astype("datetime64[us]").astype(np.int64)
+    if any(value.tzinfo is not None for value in values):
+        return np.fromiter(((value.astimezone(timezone.utc) - EPOCH) // ONE_MICROSECOND for value in values), dtype=np.int64, count=len(values))
+    wall_micros = np.array(values, dtype="datetime64[us]").astype(np.int64)
+    return get_offset_cache(None).to_utc_micros(wall_micros)
+
+
+def calculate_intervals_and_remainder_batch(entered: DatetimeArray, left: DatetimeArray, interval_minutes: int = 30, tz: Optional[str] = None, fold: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized version of ``calculate_intervals_and_remainder``.
+
+    :param entered: The start datetimes, as a datetime64 array or a sequence of datetime objects.
+    :param left: The end datetimes, in the same form as ``entered``.
+    :param interval_minutes: The length of the interval in minutes. Must be greater than 0.
+    :param tz: An IANA zone name. When given, naive datetimes and datetime64 values are wall-clock times
+        in that zone and are resolved through a cached offset table instead of the local timezone.
+    :param fold: 0 or 1, selects the offset for ambiguous or nonexistent wall times (PEP 495).
+    :return: A tuple of int64 arrays containing the number of intervals and the remainder in seconds.
+
+    Example:
+    >>> entered = np.array(["2023-10-30T17:00", "2023-10-30T17:00"], dtype="datetime64[s]")
+    >>> left = np.array(["2023-10-30T18:31", "2023-10-30T18:00"], dtype="datetime64[s]")
+    >>> intervals, remainder = calculate_intervals_and_remainder_batch(entered, left)
+    >>> intervals.tolist(), remainder.tolist()
+    ([3, 2], [60, 0])
+    """
+    if interval_minutes <= 0:
+        raise ValueError("interval_minutes must be greater than 0")
+    if len(entered) != len(left):
+        raise ValueError("entered and left must have the same length")
+
+    if __debug__:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Calculating intervals and remainder for %d sessions with interval of %d minutes.", len(entered), interval_minutes)
+
+    SECONDS_IN_INTERVAL = interval_minutes * 60
+
+    if tz is None:
+        if _is_datetime64(entered) != _is_datetime64(left):
+            raise TypeError("entered and left must both be datetime64 arrays or both be datetime sequences")
+        entered_micros = _to_epoch_micros(entered)
+        left_micros = _to_epoch_micros(left)
+    else:
+        entered_micros = localize_to_utc_micros(entered, tz, fold)
+        left_micros = localize_to_utc_micros(left, tz, fold)
+
+    # スカラー版の int(float) と同じく 0 方向に切り捨てる
+    delta_micros = left_micros - entered_micros
+    total_seconds = np.sign(delta_micros) * (np.abs(delta_micros) // 1_000_000)
+
+    intervals, remainder = np.divmod(total_seconds, SECONDS_IN_INTERVAL)
+
+    counters = instrumentation.active_counters
+    if counters is not None:
+        counters.record_batch(total_seconds, intervals, remainder)
+
+    return intervals, remainder
+
+
+if __name__ == "__main__":
+    from logger_config import configure_logger
+    configure_logger(logging.DEBUG)
+
+    entered = np.array(["2023-10-30T17:00", "2023-10-30T17:00", "2023-10-30T17:00"], dtype="datetime64[s]")
+    left = np.array(["2023-10-30T18:31", "2023-10-30T17:15", "2023-10-30T18:00"], dtype="datetime64[s]")
+
+    intervals, remainder = calculate_intervals_and_remainder_batch(entered, left)
+
+    print(f"Intervals: {intervals}")
+    print(f"Remainder: {remainder} seconds")
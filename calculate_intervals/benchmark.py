@@ -0,0 +1,185 @@
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from batch import calculate_intervals_and_remainder_batch
+from main import calculate_intervals_and_remainder
+import stream
+
+MODES = ("scalar", "batch", "stream")
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_CHUNK_SIZE = 1_000_000
+DEFAULT_TOLERANCE = 0.10
+
+Result = Dict[str, object]
+
+
+def synthetic_sessions(rows: int, chunk_size: int = DEFAULT_CHUNK_SIZE, seed: int = 0) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Generate ``rows`` random sessions as chunks of ``(entered, left)`` datetime64[s] arrays.
+    """
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2023-01-01T00:00:00", "s")
+    produced = 0
+    while produced < rows:
+        size = min(chunk_size, rows - produced)
+        entered = start + rng.integers(0, 365 * 86400, size=size).astype("timedelta64[s]")
+        left = entered + rng.integers(0, 8 * 3600, size=size).astype("timedelta64[s]")
+        yield entered, left
+        produced += size
+
+
+def bench_scalar(rows: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> float:
+    elapsed = 0.0
+    for entered, left in synthetic_sessions(rows, chunk_size):
+        entered_list, left_list = entered.tolist(), left.tolist()
+        start = time.perf_counter()
+        for e, l in zip(entered_list, left_list):
+            calculate_intervals_and_remainder(e, l)
+        elapsed += time.perf_counter() - start
+    return elapsed
+
+
+def bench_batch(rows: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> float:
+    elapsed = 0.0
+    for entered, left in synthetic_sessions(rows, chunk_size):
+        start = time.perf_counter()
+        calculate_intervals_and_remainder_batch(entered, left)
+        elapsed += time.perf_counter() - start
+    return elapsed
+
+
+class _NullWriter(io.TextIOBase):
+    def write(self, s: str) -> int:
+        return len(s)
+
+
+def bench_stream(rows: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> float:
+    # 入力ファイルの生成は計測に含めない
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fp:
+            fp.write("entered,left\n")
+            for entered, left in synthetic_sessions(rows, chunk_size):
+                fp.writelines(f"{e},{l}\n" for e, l in zip(entered.astype(str).tolist(), left.astype(str).tolist()))
+        with open(path, newline="", encoding="utf-8") as in_fp:
+            start = time.perf_counter()
+            stream.run(in_fp, _NullWriter(), "csv", "csv", chunk_size=min(chunk_size, stream.DEFAULT_CHUNK_SIZE))
+            return time.perf_counter() - start
+    finally:
+        os.remove(path)
+
+
+BENCHMARKS = {"scalar": bench_scalar, "batch": bench_batch, "stream": bench_stream}
+
+
+def run_benchmarks(modes: Sequence[str] = MODES, sizes: Sequence[int] = DEFAULT_SIZES, repeat: int = 1, chunk_size: int = DEFAULT_CHUNK_SIZE, max_rows: Optional[Dict[str, int]] = None) -> Dict[str, object]:
+    """
+    Run every mode over every input size and return a JSON-serializable report.
+
+    :param max_rows: Optional per-mode size limits, e.g. ``{"scalar": 10**6}``. Larger sizes are skipped.
+    :return: A dict with environment metadata and one result per ``(mode, rows)``.
+    """
+    results: List[Result] = []
+    for mode in modes:
+        for rows in sizes:
+            if max_rows and rows > max_rows.get(mode, rows):
+                continue
+            seconds = min(BENCHMARKS[mode](rows, chunk_size) for _ in range(repeat))
+            results.append({
+                "mode": mode,
+                "rows": rows,
+                "seconds": seconds,
+                "rows_per_second": rows / seconds if seconds > 0 else None,
+            })
+            print(f"{mode:>6} {rows:>12,} rows: {seconds:9.3f} seconds", file=sys.stderr)
+    return {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+
+
+def compare_results(current: Dict[str, object], baseline: Dict[str, object], tolerance: float = DEFAULT_TOLERANCE) -> List[Result]:
+    """
+    Compare throughput against a baseline report.
+
+    :param tolerance: The allowed relative throughput drop, e.g. 0.10 for 10%.
+    :return: One entry per ``(mode, rows)`` present in both reports, with ``regression`` set when
+        the throughput dropped by more than ``tolerance``.
+    """
+    baseline_results = {(r["mode"], r["rows"]): r for r in baseline["results"]}
+    comparisons = []
+    for result in current["results"]:
+        reference = baseline_results.get((result["mode"], result["rows"]))
+        if reference is None or not reference["rows_per_second"] or not result["rows_per_second"]:
+            continue
+        change = result["rows_per_second"] / reference["rows_per_second"] - 1
+        comparisons.append({
+            "mode": result["mode"],
+            "rows": result["rows"],
+            "baseline_rows_per_second": reference["rows_per_second"],
+            "rows_per_second": result["rows_per_second"],
+            "change": change,
+            "regression": change < -tolerance,
+        })
+    return comparisons
+
+
+def _parse_sizes(value: str) -> List[int]:
+    return [int(float(size)) for size in value.split(",")]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark scalar, batch and streaming interval calculation.")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"comma-separated modes (default: {','.join(MODES)})")
+    parser.add_argument("--sizes", type=_parse_sizes, default=list(DEFAULT_SIZES), help="comma-separated row counts, e.g. 1e3,1e6,1e8")
+    parser.add_argument("--max-scalar-rows", type=lambda v: int(float(v)), default=10_000_000, help="skip larger sizes for the scalar mode (default: 1e7)")
+    parser.add_argument("--repeat", type=int, default=1, help="keep the best of N runs (default: 1)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help=f"rows generated and processed per chunk (default: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("-o", "--output", default="-", help="JSON results file, or - for stdout (default: -)")
+    parser.add_argument("--baseline", help="baseline JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed relative throughput drop (default: 0.10)")
+    args = parser.parse_args(argv)
+
+    modes = args.modes.split(",")
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(sorted(unknown))}")
+
+    report = run_benchmarks(modes, args.sizes, args.repeat, args.chunk_size, {"scalar": args.max_scalar_rows})
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fp:
+            baseline = json.load(fp)
+        report["comparison"] = compare_results(report, baseline, args.tolerance)
+        for comparison in report["comparison"]:
+            flag = "REGRESSION" if comparison["regression"] else "ok"
+            print(f"{comparison['mode']:>6} {comparison['rows']:>12,} rows: {comparison['change']:+7.1%} {flag}", file=sys.stderr)
+        if any(comparison["regression"] for comparison in report["comparison"]):
+            exit_code = 1
+
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+            fp.write("\n")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import json
+import threading
+from collections import Counter
+from typing import IO, Dict, Optional
+
+import numpy as np
+
+# 計測が有効なときだけ設定される。None の間はホットパスで何もしない
+active_counters: Optional["IntervalCounters"] = None
+
+
+class IntervalCounters:
+    """
+    Aggregate counters for interval calculations.
+
+    Keeps the number of calls, the total number of seconds, an exact histogram of
+    interval counts and a histogram of remainders bucketed by ``remainder_bucket_seconds``.
+    """
+
+    def __init__(self, remainder_bucket_seconds: int = 60):
+        if remainder_bucket_seconds <= 0:
+            raise ValueError("remainder_bucket_seconds must be greater than 0")
+        self.remainder_bucket_seconds = remainder_bucket_seconds
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = 0
+            self.total_seconds = 0
+            self.intervals_histogram: Counter = Counter()
+            self.remainder_histogram: Counter = Counter()
+
+    def record(self, total_seconds: int, intervals: int, remainder: int) -> None:
+        with self._lock:
+            self.calls += 1
+            self.total_seconds += total_seconds
+            self.intervals_histogram[intervals] += 1
+            self.remainder_histogram[remainder // self.remainder_bucket_seconds * self.remainder_bucket_seconds] += 1
+
+    def record_batch(self, total_seconds: np.ndarray, intervals: np.ndarray, remainder: np.ndarray) -> None:
+        interval_values, interval_counts = np.unique(intervals, return_counts=True)
+        buckets = remainder // self.remainder_bucket_seconds * self.remainder_bucket_seconds
+        bucket_values, bucket_counts = np.unique(buckets, return_counts=True)
+        with self._lock:
+            self.calls += len(total_seconds)
+            self.total_seconds += int(total_seconds.sum())
+            self.intervals_histogram.update(dict(zip(interval_values.tolist(), interval_counts.tolist())))
+            self.remainder_histogram.update(dict(zip(bucket_values.tolist(), bucket_counts.tolist())))
+
+    def snapshot(self) -> Dict[str, object]:
+        """
+        Export the counters as a JSON-serializable dict. Histogram keys are strings, sorted numerically.
+        """
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "total_seconds": self.total_seconds,
+                "remainder_bucket_seconds": self.remainder_bucket_seconds,
+                "intervals_histogram": {str(k): self.intervals_histogram[k] for k in sorted(self.intervals_histogram)},
+                "remainder_histogram": {str(k): self.remainder_histogram[k] for k in sorted(self.remainder_histogram)},
+            }
+
+
+def enable_counters(remainder_bucket_seconds: int = 60) -> IntervalCounters:
+    """
+    Start collecting aggregate counters and return them.
+    """
+    global active_counters
+    active_counters = IntervalCounters(remainder_bucket_seconds)
+    return active_counters
+
+
+def disable_counters() -> Optional[IntervalCounters]:
+    """
+    Stop collecting counters and return the last collected ones.
+    """
+    global active_counters
+    counters, active_counters = active_counters, None
+    return counters
+
+
+def export_counters(fp: Optional[IO[str]] = None, reset: bool = False) -> Dict[str, object]:
+    """
+    Export the active counters, optionally writing them as JSON to ``fp``.
+
+    :param fp: A text stream to write the JSON snapshot to.
+    :param reset: Reset the counters after exporting.
+    :return: The snapshot, or an empty dict when counters are disabled.
+    """
+    counters = active_counters
+    if counters is None:
+        return {}
+    snapshot = counters.snapshot()
+    if reset:
+        counters.reset()
+    if fp is not None:
+        json.dump(snapshot, fp)
+        fp.write("\n")
+    return snapshot
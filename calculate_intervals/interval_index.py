@@ -0,0 +1,223 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+Interval = Tuple[Any, Any, Any]
+
+
+class _Node:
+    __slots__ = ("start", "end", "value", "max_end", "height", "left", "right")
+
+    def __init__(self, start, end, value):
+        self.start = start
+        self.end = end
+        self.value = value
+        self.max_end = end
+        self.height = 1
+        self.left: Optional["_Node"] = None
+        self.right: Optional["_Node"] = None
+
+
+def _height(node: Optional[_Node]) -> int:
+    return node.height if node is not None else 0
+
+
+def _update(node: _Node) -> None:
+    node.height = 1 + max(_height(node.left), _height(node.right))
+    max_end = node.end
+    if node.left is not None and node.left.max_end > max_end:
+        max_end = node.left.max_end
+    if node.right is not None and node.right.max_end > max_end:
+        max_end = node.right.max_end
+    node.max_end = max_end
+
+
+def _rotate_right(node: _Node) -> _Node:
+    pivot = node.left
+    node.left = pivot.right
+    pivot.right = node
+    _update(node)
+    _update(pivot)
+    return pivot
+
+
+def _rotate_left(node: _Node) -> _Node:
+    pivot = node.right
+    node.right = pivot.left
+    pivot.left = node
+    _update(node)
+    _update(pivot)
+    return pivot
+
+
+def _rebalance(node: _Node) -> _Node:
+    _update(node)
+    balance = _height(node.left) - _height(node.right)
+    if balance > 1:
+        if _height(node.left.left) < _height(node.left.right):
+            node.left = _rotate_left(node.left)
+        return _rotate_right(node)
+    if balance < -1:
+        if _height(node.right.right) < _height(node.right.left):
+            node.right = _rotate_right(node.right)
+        return _rotate_left(node)
+    return node
+
+
+def _insert(node: Optional[_Node], new: _Node) -> _Node:
+    if node is None:
+        return new
+    if (new.start, new.end) < (node.start, node.end):
+        node.left = _insert(node.left, new)
+    else:
+        node.right = _insert(node.right, new)
+    return _rebalance(node)
+
+
+def _build(intervals: Sequence[Interval], low: int, high: int) -> Optional[_Node]:
+    if low >= high:
+        return None
+    middle = (low + high) // 2
+    node = _Node(*intervals[middle])
+    node.left = _build(intervals, low, middle)
+    node.right = _build(intervals, middle + 1, high)
+    _update(node)
+    return node
+
+
+class IntervalIndex:
+    """
+    An interval tree over half-open sessions ``[entered, left)``.
+
+    A balanced (AVL) search tree ordered by start time where every node also stores the
+    largest end time of its subtree, so subtrees that end before a query are skipped.
+    Bulk builds sort once and build a balanced tree, and inserts are O(log n) tree steps.
+    ``stab`` and ``overlapping`` are O(min(n, k log n)) for k results in the worst case.
+    Sorted start and end times are kept alongside the tree, so ``count_at`` and
+    ``count_overlapping`` are O(log n) whatever the number of matches.
+
+    Example:
+    >>> index = IntervalIndex([(17.0, 18.5, "a"), (17.5, 17.75, "b"), (18.0, 19.0, "c")])
+    >>> index.stab(17.6)
+    ['a', 'b']
+    >>> index.overlapping(18.25, 20.0)
+    ['a', 'c']
+    """
+
+    def __init__(self, intervals: Iterable[Interval] = ()):
+        self._root: Optional[_Node] = None
+        self._size = 0
+        self._starts: list = []
+        self._ends: list = []
+        self.extend(intervals)
+
+    @classmethod
+    def from_sessions(cls, entered: Sequence[datetime], left: Sequence[datetime], values: Optional[Sequence[Any]] = None) -> "IntervalIndex":
+        """
+        Build an index from parallel ``entered``/``left`` sequences, as fed to ``calculate_intervals_and_remainder``.
+
+        :param values: Payloads returned by queries, e.g. session ids. Defaults to the row positions.
+        """
+        if len(entered) != len(left):
+            raise ValueError("entered and left must have the same length")
+        if values is None:
+            values = range(len(entered))
+        return cls(zip(entered, left, values))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Interval]:
+        """
+        Iterate over ``(start, end, value)`` in start order.
+        """
+        stack: List[_Node] = []
+        node = self._root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.start, node.end, node.value
+            node = node.right
+
+    def insert(self, start, end, value: Any = None) -> None:
+        """
+        Insert a single session.
+        """
+        if end < start:
+            raise ValueError("end must not be earlier than start")
+        self._root = _insert(self._root, _Node(start, end, value))
+        self._size += 1
+        insort(self._starts, start)
+        insort(self._ends, end)
+
+    def extend(self, intervals: Iterable[Interval]) -> None:
+        """
+        Bulk insert sessions. The tree is rebuilt from the merged sorted intervals.
+        """
+        new = list(intervals)
+        if not new:
+            return
+        for start, end, _ in new:
+            if end < start:
+                raise ValueError("end must not be earlier than start")
+        merged = list(self) + new
+        merged.sort(key=lambda interval: (interval[0], interval[1]))
+        self._root = _build(merged, 0, len(merged))
+        self._size = len(merged)
+        self._starts = [interval[0] for interval in merged]
+        self._ends = sorted(interval[1] for interval in merged)
+
+    def stab(self, point) -> List[Any]:
+        """
+        Return the values of sessions active at ``point`` (``start <= point < end``), in start order.
+        """
+        results: List[Any] = []
+        self._collect_stab(self._root, point, results)
+        return results
+
+    def count_at(self, point) -> int:
+        """
+        Return the number of sessions active at ``point`` in O(log n).
+        """
+        # start <= point のセッションから end <= point (start <= point を含意する) のものを除く
+        return bisect_right(self._starts, point) - bisect_right(self._ends, point)
+
+    def count_overlapping(self, start, end) -> int:
+        """
+        Return the number of sessions overlapping the window ``[start, end)`` in O(log n).
+        """
+        if end <= start:
+            return 0
+        # 開始が end より前のセッションから、start までに終わったもの (開始も start 以前) を除く
+        return bisect_left(self._starts, end) - bisect_right(self._ends, start)
+
+    def overlapping(self, start, end) -> List[Any]:
+        """
+        Return the values of sessions overlapping the window ``[start, end)``, in start order.
+        """
+        results: List[Any] = []
+        if end <= start:
+            return results
+        self._collect(self._root, start, end, results)
+        return results
+
+    def _collect_stab(self, node: Optional[_Node], point, results: List[Any]) -> None:
+        while node is not None and node.max_end > point:
+            self._collect_stab(node.left, point, results)
+            if node.start > point:
+                return
+            if node.end > point:
+                results.append(node.value)
+            node = node.right
+
+    def _collect(self, node: Optional[_Node], start, end, results: List[Any]) -> None:
+        # 左部分木 → 自ノード → 右部分木の順で辿り、開始時刻順に結果を集める
+        while node is not None and node.max_end > start:
+            self._collect(node.left, start, end, results)
+            if node.start >= end:
+                return
+            if node.end > start:
+                results.append(node.value)
+            node = node.right
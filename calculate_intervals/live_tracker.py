@@ -0,0 +1,145 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+from main import calculate_intervals_and_remainder
+
+# ログ設定
+logger = logging.getLogger(__name__)
+
+# 1 回の処理でこれ以上のイベントを出したらイベントループに制御を返す
+YIELD_EVERY = 10_000
+
+
+class BoundaryEvent(NamedTuple):
+    session_id: Hashable
+    intervals: int
+    entered: datetime
+
+
+class _OpenSession:
+    __slots__ = ("session_id", "entered", "entered_timestamp")
+
+    def __init__(self, session_id: Hashable, entered: datetime):
+        self.session_id = session_id
+        self.entered = entered
+        self.entered_timestamp = entered.timestamp()
+
+
+class LiveIntervalTracker:
+    """
+    Track still-open sessions and emit an event whenever one crosses another interval boundary.
+
+    All sessions share a single heap of next-boundary deadlines driven by one asyncio task,
+    so a million open sessions cost a million heap entries rather than a million timers.
+    Closed sessions are removed lazily when their heap entry comes due.
+
+    When the tracker falls behind (e.g. a session opened long ago), the boundaries a session
+    crossed in the meantime are coalesced into one event carrying the current interval count.
+
+    :param interval_minutes: The length of the interval in minutes. Must be greater than 0.
+    :param on_boundary: Called with every ``BoundaryEvent``. When omitted, events are put on ``self.events``.
+    :param clock: Returns the current time as epoch seconds, like ``time.time``.
+    """
+
+    def __init__(self, interval_minutes: int = 30, on_boundary: Optional[Callable[[BoundaryEvent], None]] = None, clock: Callable[[], float] = time.time):
+        if interval_minutes <= 0:
+            raise ValueError("interval_minutes must be greater than 0")
+        self.interval_minutes = interval_minutes
+        self.interval_seconds = interval_minutes * 60
+        self.on_boundary = on_boundary
+        self.clock = clock
+        self.events: "asyncio.Queue[BoundaryEvent]" = asyncio.Queue()
+        self._sessions: Dict[Hashable, _OpenSession] = {}
+        # (期限 [epoch 秒], 連番, セッション, 期限で完了する区間数)
+        self._heap: List[Tuple[float, int, _OpenSession, int]] = []
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._running = False
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _schedule(self, session: _OpenSession, boundary: int) -> None:
+        deadline = session.entered_timestamp + boundary * self.interval_seconds
+        heapq.heappush(self._heap, (deadline, next(self._sequence), session, boundary))
+
+    def _completed_intervals(self, session: _OpenSession, now: float) -> int:
+        return int(now - session.entered_timestamp) // self.interval_seconds
+
+    def open(self, session_id: Hashable, entered: datetime) -> None:
+        """
+        Start tracking a session.
+        """
+        if session_id in self._sessions:
+            raise ValueError(f"session {session_id!r} is already open")
+        session = self._sessions[session_id] = _OpenSession(session_id, entered)
+        # 既に境界を越えている場合は直ちに追いつきのイベントを出す
+        self._schedule(session, max(self._completed_intervals(session, self.clock()), 1))
+        if self._wakeup is not None and self._heap[0][2] is session:
+            self._wakeup.set()
+
+    def close(self, session_id: Hashable, left: datetime) -> Tuple[int, int]:
+        """
+        Stop tracking a session and return its final ``(intervals, remainder)``.
+
+        The result is identical to ``calculate_intervals_and_remainder(entered, left, interval_minutes)``.
+        """
+        session = self._sessions.pop(session_id)
+        return calculate_intervals_and_remainder(session.entered, left, self.interval_minutes)
+
+    def process_due(self, now: Optional[float] = None, limit: Optional[int] = None) -> List[BoundaryEvent]:
+        """
+        Emit events for every session whose next boundary is due and reschedule them.
+
+        :param now: The current epoch seconds. Defaults to ``clock()``.
+        :param limit: The maximum number of events to emit.
+        :return: The emitted events.
+        """
+        now = self.clock() if now is None else now
+        emitted = []
+        while self._heap and self._heap[0][0] <= now and (limit is None or len(emitted) < limit):
+            _, _, session, boundary = heapq.heappop(self._heap)
+            if self._sessions.get(session.session_id) is not session:
+                continue
+            intervals = max(self._completed_intervals(session, now), boundary)
+            event = BoundaryEvent(session.session_id, intervals, session.entered)
+            if self.on_boundary is not None:
+                self.on_boundary(event)
+            else:
+                self.events.put_nowait(event)
+            emitted.append(event)
+            self._schedule(session, intervals + 1)
+        return emitted
+
+    async def run(self) -> None:
+        """
+        Emit boundary events until ``stop()`` is called or the task is cancelled.
+        """
+        self._wakeup = asyncio.Event()
+        self._running = True
+        try:
+            while self._running:
+                self.process_due(limit=YIELD_EVERY)
+                now = self.clock()
+                if self._heap and self._heap[0][0] <= now:
+                    await asyncio.sleep(0)
+                    continue
+                timeout = self._heap[0][0] - now if self._heap else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._wakeup = None
+            self._running = False
+
+    def stop(self) -> None:
+        self._running = False
+        if self._wakeup is not None:
+            self._wakeup.set()
@@ -1,8 +1,12 @@
 import logging
 
-def configure_logger():
-    logging.basicConfig(level=logging.DEBUG)
-    logger = logging.getLogger(__name__)
-    logger.setLevel(logging.DEBUG)
+def configure_logger(level: int = logging.INFO):
+    """
+    Configure the root logger.
 
+    :param level: The log level. Pass ``logging.DEBUG`` to see the per-call debug lines.
+    """
+    logging.basicConfig(level=level)
+    logger = logging.getLogger(__name__)
+    logger.setLevel(level)
 
@@ -2,6 +2,8 @@ from datetime import datetime
 from typing import Tuple
 import logging
 
+import instrumentation
+
 # ログ設定
 logger = logging.getLogger(__name__)
 
@@ -23,20 +25,29 @@ def calculate_intervals_and_remainder(entered: datetime, left: datetime, interva
     if interval_minutes <= 0:
         raise ValueError("interval_minutes must be greater than 0")
 
-    logger.debug(f"Calculating intervals and remainder from {entered} to {left} with interval of {interval_minutes} minutes.")
+    # python -O では __debug__ ブロックごと取り除かれる
+    if __debug__:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Calculating intervals and remainder from %s to %s with interval of %d minutes.", entered, left, interval_minutes)
 
     SECONDS_IN_INTERVAL = interval_minutes * 60
 
     total_seconds = int(left.timestamp() - entered.timestamp())
     intervals, remainder = divmod(total_seconds, SECONDS_IN_INTERVAL)
 
-    logger.debug(f"Total seconds: {total_seconds}, Intervals: {intervals}, Remainder: {remainder}")
+    if __debug__:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Total seconds: %d, Intervals: %d, Remainder: %d", total_seconds, intervals, remainder)
+
+    counters = instrumentation.active_counters
+    if counters is not None:
+        counters.record(total_seconds, intervals, remainder)
 
     return intervals, remainder
 
 if __name__ == "__main__":
     from logger_config import configure_logger
-    configure_logger()
+    configure_logger(logging.DEBUG)
     
     entered = datetime(2023, 10, 30, 17)
     left = datetime(2023, 10, 30, 18, 31)
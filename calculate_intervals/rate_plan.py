@@ -0,0 +1,131 @@
+import logging
+import time
+from typing import NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+
+# ログ設定
+logger = logging.getLogger(__name__)
+
+IntArray = Union[np.ndarray, Sequence[int]]
+
+
+class Tier(NamedTuple):
+    """
+    A pricing tier.
+
+    :param intervals: The number of intervals billed at this rate, or None for all remaining intervals.
+    :param rate: The price of one interval in minor currency units (e.g. yen or cents).
+    """
+    intervals: Optional[int]
+    rate: int
+
+
+class RatePlan:
+    """
+    A tiered rate plan: the first N intervals at one rate, the next M at another, and so on.
+
+    A remainder longer than ``grace_seconds`` is billed as one more interval.
+
+    Example:
+    >>> plan = RatePlan([Tier(2, 300), Tier(None, 200)], grace_seconds=300)
+    >>> plan.price(3, 60), plan.price(3, 600)
+    (800, 1000)
+    """
+
+    def __init__(self, tiers: Sequence[Tier], grace_seconds: int = 0):
+        if not tiers:
+            raise ValueError("a rate plan needs at least one tier")
+        for tier in tiers[:-1]:
+            if tier.intervals is None or tier.intervals <= 0:
+                raise ValueError("only the last tier may be unbounded and tier sizes must be greater than 0")
+        if tiers[-1].intervals is not None:
+            raise ValueError("the last tier must be unbounded (intervals=None)")
+        if any(tier.rate < 0 for tier in tiers):
+            raise ValueError("rates must not be negative")
+        if grace_seconds < 0:
+            raise ValueError("grace_seconds must not be negative")
+        self.tiers = [Tier(*tier) for tier in tiers]
+        self.grace_seconds = grace_seconds
+
+    def billed_intervals(self, intervals: int, remainder: int) -> int:
+        return max(0, intervals + (1 if remainder > self.grace_seconds else 0))
+
+    def price(self, intervals: int, remainder: int) -> int:
+        """
+        Price a single ``(intervals, remainder)`` pair by walking the tiers.
+        """
+        left_to_bill = self.billed_intervals(intervals, remainder)
+        total = 0
+        for tier in self.tiers:
+            billed = left_to_bill if tier.intervals is None else min(left_to_bill, tier.intervals)
+            total += billed * tier.rate
+            left_to_bill -= billed
+            if left_to_bill == 0:
+                break
+        return total
+
+    def compile(self) -> "CompiledRatePlan":
+        return CompiledRatePlan(self)
+
+
+class CompiledRatePlan:
+    """
+    A rate plan compiled into cumulative breakpoints for vectorized pricing.
+
+    ``breakpoints[k]`` is the first billed interval of tier ``k`` and ``base_costs[k]``
+    the cost of all intervals before it, so the price of ``n`` intervals is
+    ``base_costs[k] + (n - breakpoints[k]) * rates[k]`` with ``k`` found by binary search.
+    """
+
+    def __init__(self, plan: RatePlan):
+        self.grace_seconds = plan.grace_seconds
+        sizes = [tier.intervals for tier in plan.tiers[:-1]]
+        rates = [tier.rate for tier in plan.tiers]
+        self.breakpoints = np.concatenate(([0], np.cumsum(sizes, dtype=np.int64))).astype(np.int64)
+        self.rates = np.array(rates, dtype=np.int64)
+        self.base_costs = np.concatenate(([0], np.cumsum(np.array(sizes, dtype=np.int64) * self.rates[:-1]))).astype(np.int64)
+
+    def price(self, intervals: IntArray, remainder: IntArray) -> np.ndarray:
+        """
+        Price whole arrays of ``(intervals, remainder)`` at once.
+
+        :param intervals: Interval counts, e.g. from ``calculate_intervals_and_remainder_batch``.
+        :param remainder: Remainders in seconds.
+        :return: An int64 array of prices in minor currency units.
+        """
+        intervals = np.asarray(intervals, dtype=np.int64)
+        remainder = np.asarray(remainder, dtype=np.int64)
+        billed = np.maximum(intervals + (remainder > self.grace_seconds), 0)
+        tier = np.searchsorted(self.breakpoints, billed, side="right") - 1
+        return self.base_costs[tier] + (billed - self.breakpoints[tier]) * self.rates[tier]
+
+
+def benchmark(rows: int = 1_000_000, repeat: int = 3) -> None:
+    """
+    Compare naive per-row pricing with the compiled plan and print the throughput of both.
+    """
+    plan = RatePlan([Tier(2, 300), Tier(4, 250), Tier(None, 200)], grace_seconds=300)
+    compiled = plan.compile()
+    rng = np.random.default_rng(0)
+    intervals = rng.integers(0, 20, size=rows)
+    remainder = rng.integers(0, 1800, size=rows)
+    intervals_list, remainder_list = intervals.tolist(), remainder.tolist()
+
+    def best_of(func) -> float:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    naive = best_of(lambda: [plan.price(i, r) for i, r in zip(intervals_list, remainder_list)])
+    vectorized = best_of(lambda: compiled.price(intervals, remainder))
+    print(f"naive per-row: {naive:.3f} seconds ({rows / naive:,.0f} rows/s)")
+    print(f"compiled:      {vectorized:.3f} seconds ({rows / vectorized:,.0f} rows/s)")
+    print(f"speedup:       {naive / vectorized:.1f}x")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,237 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from batch import calculate_intervals_and_remainder_batch
+from sketch import SessionSketches
+from stream import DEFAULT_CHUNK_SIZE, FORMATS, detect_format, parse_datetime
+
+# ログ設定
+logger = logging.getLogger(__name__)
+
+SHARDS_PER_WORKER = 4
+
+# スケッチを集めるときのシャード数 (ワーカー数に依存させない)
+SKETCH_SHARDS = 64
+
+
+class CustomerTotals(NamedTuple):
+    sessions: int
+    intervals: int
+    remainder: int
+
+
+PartialTotals = Dict[str, List[int]]
+
+
+def compute_shards(path: str, shards: int, data_start: int = 0) -> List[Tuple[int, int]]:
+    """
+    Split a file into byte ranges that start and end on line boundaries.
+
+    Records must not contain embedded newlines (e.g. quoted multi-line CSV fields).
+
+    :param path: The input file.
+    :param shards: The desired number of shards. Fewer are returned for small files.
+    :param data_start: The offset of the first record (e.g. just after a CSV header).
+    :return: A list of ``(start, end)`` byte offsets covering ``[data_start, file size)``.
+    """
+    if shards <= 0:
+        raise ValueError("shards must be greater than 0")
+    size = os.path.getsize(path)
+    step = max(1, (size - data_start) // shards)
+    boundaries = [data_start]
+    with open(path, "rb") as fp:
+        for i in range(1, shards):
+            offset = data_start + i * step
+            if offset >= size:
+                break
+            # 直前の改行の次まで進めて行の途中で分割しないようにする
+            fp.seek(offset - 1)
+            fp.readline()
+            offset = fp.tell()
+            if offset > boundaries[-1] and offset < size:
+                boundaries.append(offset)
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
+def read_csv_header(path: str) -> Tuple[List[str], int]:
+    """
+    Read the CSV header line.
+
+    :return: The field names and the byte offset just after the header.
+    """
+    with open(path, "rb") as fp:
+        header = fp.readline()
+        return next(csv.reader([header.decode("utf-8")])), fp.tell()
+
+
+def _accumulate(totals: PartialTotals, customers: List[str], entered: list, left: list, interval_minutes: int, sketches: Optional[SessionSketches] = None) -> None:
+    intervals, remainder = calculate_intervals_and_remainder_batch(entered, left, interval_minutes)
+    if sketches is not None:
+        sketches.update_batch(intervals, remainder)
+    for customer, record_intervals, record_remainder in zip(customers, intervals.tolist(), remainder.tolist()):
+        customer_totals = totals.get(customer)
+        if customer_totals is None:
+            customer_totals = totals[customer] = [0, 0, 0]
+        customer_totals[0] += 1
+        customer_totals[1] += record_intervals
+        customer_totals[2] += record_remainder
+
+
+def bill_shard(path: str, fmt: str, start: int, end: int, fieldnames: Optional[Sequence[str]] = None, interval_minutes: int = 30, chunk_size: int = DEFAULT_CHUNK_SIZE, customer_field: str = "customer", entered_field: str = "entered", left_field: str = "left", sketch_seed: Optional[int] = None) -> Tuple[PartialTotals, Optional[SessionSketches]]:
+    """
+    Compute per-customer totals for the records in ``[start, end)`` of a file.
+
+    :param sketch_seed: When given, also collect ``SessionSketches`` seeded with this value.
+    :return: A dict mapping customer to ``[sessions, intervals, remainder]``, and the sketches or None.
+    """
+    if fmt == "csv":
+        customer_index = fieldnames.index(customer_field)
+        entered_index = fieldnames.index(entered_field)
+        left_index = fieldnames.index(left_field)
+
+    totals: PartialTotals = {}
+    sketches = SessionSketches(interval_minutes, seed=sketch_seed) if sketch_seed is not None else None
+    customers: List[str] = []
+    entered: list = []
+    left: list = []
+    position = start
+    with open(path, "rb") as fp:
+        fp.seek(start)
+        for raw_line in fp:
+            if position >= end:
+                break
+            position += len(raw_line)
+            line = raw_line.decode("utf-8")
+            if not line.strip():
+                continue
+            if fmt == "csv":
+                row = next(csv.reader([line]))
+                customers.append(row[customer_index])
+                entered.append(parse_datetime(row[entered_index]))
+                left.append(parse_datetime(row[left_index]))
+            else:
+                record = json.loads(line)
+                customers.append(str(record[customer_field]))
+                entered.append(parse_datetime(record[entered_field]))
+                left.append(parse_datetime(record[left_field]))
+            if len(customers) >= chunk_size:
+                _accumulate(totals, customers, entered, left, interval_minutes, sketches)
+                customers, entered, left = [], [], []
+    if customers:
+        _accumulate(totals, customers, entered, left, interval_minutes, sketches)
+    return totals, sketches
+
+
+def merge_totals(partials: Sequence[PartialTotals]) -> Dict[str, CustomerTotals]:
+    """
+    Merge per-shard totals. The result is sorted by customer so it does not depend on shard completion order.
+    """
+    merged: PartialTotals = {}
+    for partial in partials:
+        for customer, (sessions, intervals, remainder) in partial.items():
+            customer_totals = merged.setdefault(customer, [0, 0, 0])
+            customer_totals[0] += sessions
+            customer_totals[1] += intervals
+            customer_totals[2] += remainder
+    return {customer: CustomerTotals(*merged[customer]) for customer in sorted(merged)}
+
+
+def bill_sharded(path: str, fmt: Optional[str] = None, workers: Optional[int] = None, interval_minutes: int = 30, chunk_size: int = DEFAULT_CHUNK_SIZE, customer_field: str = "customer", entered_field: str = "entered", left_field: str = "left") -> Dict[str, CustomerTotals]:
+    """
+    Compute per-customer totals for a CSV/JSONL file with a pool of worker processes.
+
+    The file is split into byte-range shards on line boundaries (several per worker to balance load),
+    each shard is billed in a worker and the partial totals are merged in shard order.
+
+    :param path: The input file.
+    :param fmt: ``"csv"`` or ``"jsonl"``. Guessed from the file name when omitted.
+    :param workers: The number of worker processes. Defaults to the CPU count.
+    :return: A dict mapping customer to ``CustomerTotals``, sorted by customer.
+    """
+    totals, _ = _run_shards(path, fmt, workers, interval_minutes, chunk_size, customer_field, entered_field, left_field, collect_sketches=False)
+    return totals
+
+
+def bill_sharded_with_sketches(path: str, fmt: Optional[str] = None, workers: Optional[int] = None, interval_minutes: int = 30, chunk_size: int = DEFAULT_CHUNK_SIZE, customer_field: str = "customer", entered_field: str = "entered", left_field: str = "left") -> Tuple[Dict[str, CustomerTotals], SessionSketches]:
+    """
+    Like ``bill_sharded``, and also return session length and remainder sketches merged from every shard.
+    """
+    return _run_shards(path, fmt, workers, interval_minutes, chunk_size, customer_field, entered_field, left_field, collect_sketches=True)
+
+
+def _run_shards(path: str, fmt: Optional[str], workers: Optional[int], interval_minutes: int, chunk_size: int, customer_field: str, entered_field: str, left_field: str, collect_sketches: bool) -> Tuple[Dict[str, CustomerTotals], Optional[SessionSketches]]:
+    if interval_minutes <= 0:
+        raise ValueError("interval_minutes must be greater than 0")
+    fmt = fmt or detect_format(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"unsupported format: {fmt}")
+    workers = workers or os.cpu_count() or 1
+
+    fieldnames, data_start = read_csv_header(path) if fmt == "csv" else (None, 0)
+    # スケッチはシャードの分け方と seed で結果が変わるため、集めるときはワーカー数によらない固定のシャード数にする
+    shards = compute_shards(path, SKETCH_SHARDS if collect_sketches else workers * SHARDS_PER_WORKER, data_start)
+    logger.debug("Billing %s with %d workers over %d shards", path, workers, len(shards))
+
+    # シャード番号を seed にし、シャード順にマージする
+    args = [(path, fmt, start, end, fieldnames, interval_minutes, chunk_size, customer_field, entered_field, left_field, shard if collect_sketches else None) for shard, (start, end) in enumerate(shards)]
+    if workers == 1:
+        partials = [bill_shard(*shard_args) for shard_args in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(bill_shard, *shard_args) for shard_args in args]
+            partials = [future.result() for future in futures]
+
+    sketches = None
+    if collect_sketches:
+        sketches = SessionSketches(interval_minutes, seed=len(shards))
+        for _, shard_sketches in partials:
+            sketches.merge(shard_sketches)
+    return merge_totals([totals for totals, _ in partials]), sketches
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compute per-customer interval billing totals with multiple processes.")
+    parser.add_argument("input", help="input CSV/JSONL file")
+    parser.add_argument("-o", "--output", default="-", help="output CSV file, or - for stdout (default: -)")
+    parser.add_argument("--format", choices=FORMATS, help="input format (default: guessed from the file name)")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: CPU count)")
+    parser.add_argument("--interval-minutes", type=int, default=30, help="interval length in minutes (default: 30)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help=f"records per chunk (default: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("--customer-field", default="customer", help="name of the customer field (default: customer)")
+    parser.add_argument("--entered-field", default="entered", help="name of the start time field (default: entered)")
+    parser.add_argument("--left-field", default="left", help="name of the end time field (default: left)")
+    parser.add_argument("--quantiles", action="store_true", help="also report p50/p95/p99 session length and remainder on stderr")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    totals, sketches = _run_shards(args.input, args.format, args.workers, args.interval_minutes, args.chunk_size, args.customer_field, args.entered_field, args.left_field, collect_sketches=args.quantiles)
+    elapsed = time.perf_counter() - start
+
+    out_fp = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        writer = csv.writer(out_fp)
+        writer.writerow(["customer", "sessions", "intervals", "remainder"])
+        for customer, customer_totals in totals.items():
+            writer.writerow([customer, *customer_totals])
+    finally:
+        if out_fp is not sys.stdout:
+            out_fp.close()
+
+    rows = sum(customer_totals.sessions for customer_totals in totals.values())
+    rate = rows / elapsed if elapsed > 0 else float("inf")
+    print(f"Processed {rows} rows in {elapsed:.3f} seconds ({rate:,.0f} rows/s)", file=sys.stderr)
+    if sketches is not None:
+        print(json.dumps(sketches.summary()), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+import math
+import random
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+Number = Union[int, float]
+
+DEFAULT_K = 200
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+
+class KLLSketch:
+    """
+    A mergeable streaming quantile sketch (Karnin, Lang and Liberty, 2016).
+
+    Items are kept in a hierarchy of compactors; an item at level ``h`` stands for ``2 ** h``
+    inputs. When the sketch is full, a compactor sorts its items and promotes every other one
+    to the next level, so memory stays O(k) however many items are added. The rank error is
+    roughly ``1.7 / k`` (about 1% for the default ``k=200``).
+
+    Example:
+    >>> sketch = KLLSketch(seed=0)
+    >>> sketch.update_many(range(1, 100001))
+    >>> abs(sketch.quantile(0.5) - 50000) < 2000
+    True
+    """
+
+    def __init__(self, k: int = DEFAULT_K, seed: Optional[int] = None):
+        if k < 8:
+            raise ValueError("k must be at least 8")
+        self.k = k
+        self.n = 0
+        self.min: Optional[Number] = None
+        self.max: Optional[Number] = None
+        self.compactors: List[List[Number]] = [[]]
+        self._rng = random.Random(seed)
+        self._size = 0
+        self._max_size = self._capacity(0)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _refresh_max_size(self) -> None:
+        self._max_size = sum(self._capacity(level) for level in range(len(self.compactors)))
+
+    def _compress(self) -> None:
+        while self._size >= self._max_size:
+            for level in range(len(self.compactors)):
+                if len(self.compactors[level]) >= self._capacity(level):
+                    if level + 1 == len(self.compactors):
+                        self.compactors.append([])
+                        self._refresh_max_size()
+                    items = sorted(self.compactors[level])
+                    # 奇数個のときは 1 個だけ同じレベルに残す
+                    keep = items.pop() if len(items) % 2 else None
+                    promoted = items[self._rng.randrange(2)::2]
+                    self.compactors[level + 1].extend(promoted)
+                    self.compactors[level] = [keep] if keep is not None else []
+                    self._size -= len(items) - len(promoted)
+                    break
+
+    def update(self, value: Number) -> None:
+        self.update_many((value,))
+
+    def update_many(self, values: Union[Iterable[Number], np.ndarray]) -> None:
+        """
+        Add many values at once. NumPy arrays are accepted without per-item conversion overhead.
+        """
+        if isinstance(values, np.ndarray):
+            if values.size == 0:
+                return
+            low, high = values.min().item(), values.max().item()
+            values = values.tolist()
+        else:
+            values = list(values)
+            if not values:
+                return
+            low, high = min(values), max(values)
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        self.n += len(values)
+        # 一度に大量に追加しても level 0 に置いてから圧縮するのでメモリは k に比例したまま
+        step = self.k
+        for start in range(0, len(values), step):
+            chunk = values[start:start + step]
+            self.compactors[0].extend(chunk)
+            self._size += len(chunk)
+            self._compress()
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """
+        Merge another sketch into this one (e.g. per-shard sketches after a parallel run).
+        """
+        if other.k != self.k:
+            raise ValueError("only sketches with the same k can be merged")
+        if other.n == 0:
+            return self
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        self._size += other._size
+        self.n += other.n
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._refresh_max_size()
+        self._compress()
+        return self
+
+    def _weighted_items(self) -> Tuple[List[Number], List[int]]:
+        weighted = sorted((item, 1 << level) for level, items in enumerate(self.compactors) for item in items)
+        values = [item for item, _ in weighted]
+        cumulative = list(np.cumsum([weight for _, weight in weighted]).tolist())
+        return values, cumulative
+
+    def quantiles(self, fractions: Sequence[float]) -> List[Optional[Number]]:
+        """
+        Return approximate quantiles, e.g. ``quantiles([0.5, 0.99])``. None for an empty sketch.
+        """
+        if any(not 0 <= fraction <= 1 for fraction in fractions):
+            raise ValueError("quantile fractions must be between 0 and 1")
+        if self.n == 0:
+            return [None for _ in fractions]
+        values, cumulative = self._weighted_items()
+        results = []
+        for fraction in fractions:
+            if fraction == 0:
+                results.append(self.min)
+            elif fraction == 1:
+                results.append(self.max)
+            else:
+                index = int(np.searchsorted(cumulative, fraction * self.n, side="left"))
+                results.append(values[min(index, len(values) - 1)])
+        return results
+
+    def quantile(self, fraction: float) -> Optional[Number]:
+        return self.quantiles([fraction])[0]
+
+    def rank(self, value: Number) -> float:
+        """
+        Return the approximate fraction of inputs less than or equal to ``value``.
+        """
+        if self.n == 0:
+            return 0.0
+        weight = sum(1 << level for level, items in enumerate(self.compactors) for item in items if item <= value)
+        return weight / self.n
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"k": self.k, "n": self.n, "min": self.min, "max": self.max, "compactors": [list(items) for items in self.compactors]}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, object], seed: Optional[int] = None) -> "KLLSketch":
+        sketch = cls(data["k"], seed)
+        sketch.n, sketch.min, sketch.max = data["n"], data["min"], data["max"]
+        sketch.compactors = [list(items) for items in data["compactors"]]
+        sketch._size = sum(len(items) for items in sketch.compactors)
+        sketch._refresh_max_size()
+        return sketch
+
+
+class SessionSketches:
+    """
+    Quantile sketches of billed session lengths and remainders, both in seconds.
+
+    Feed it the output of ``calculate_intervals_and_remainder`` (or the batch version) and merge
+    per-shard instances after a parallel run.
+    """
+
+    def __init__(self, interval_minutes: int = 30, k: int = DEFAULT_K, seed: Optional[int] = None):
+        if interval_minutes <= 0:
+            raise ValueError("interval_minutes must be greater than 0")
+        self.interval_minutes = interval_minutes
+        self.durations = KLLSketch(k, seed)
+        self.remainders = KLLSketch(k, None if seed is None else seed + 1)
+
+    def update(self, intervals: int, remainder: int) -> None:
+        self.durations.update(intervals * self.interval_minutes * 60 + remainder)
+        self.remainders.update(remainder)
+
+    def update_batch(self, intervals: np.ndarray, remainder: np.ndarray) -> None:
+        self.durations.update_many(np.asarray(intervals) * (self.interval_minutes * 60) + np.asarray(remainder))
+        self.remainders.update_many(np.asarray(remainder))
+
+    def merge(self, other: "SessionSketches") -> "SessionSketches":
+        if other.interval_minutes != self.interval_minutes:
+            raise ValueError("only sketches with the same interval_minutes can be merged")
+        self.durations.merge(other.durations)
+        self.remainders.merge(other.remainders)
+        return self
+
+    def summary(self, fractions: Sequence[float] = DEFAULT_QUANTILES) -> Dict[str, object]:
+        """
+        Return the session count and the requested quantiles, e.g. ``{"duration": {"p50": ..., ...}}``.
+        """
+        names = ["p%g" % (fraction * 100) for fraction in fractions]
+        return {
+            "sessions": self.durations.n,
+            "duration": dict(zip(names, self.durations.quantiles(fractions))),
+            "remainder": dict(zip(names, self.remainders.quantiles(fractions))),
+        }
@@ -0,0 +1,218 @@
+import argparse
+import csv
+import itertools
+import json
+import logging
+import sys
+import time
+from datetime import datetime
+from typing import IO, Dict, Iterable, Iterator, List, Optional
+
+import instrumentation
+from batch import calculate_intervals_and_remainder_batch
+
+# ログ設定
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "jsonl")
+DEFAULT_CHUNK_SIZE = 10_000
+
+Record = Dict[str, object]
+
+
+def detect_format(path: str) -> Optional[str]:
+    """
+    Guess the record format from a file name.
+
+    :param path: The input or output path.
+    :return: ``"csv"``, ``"jsonl"`` or None when the extension is unknown.
+    """
+    if path.endswith(".csv"):
+        return "csv"
+    if path.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return None
+
+
+def read_records(fp: IO[str], fmt: str) -> Iterator[Record]:
+    """
+    Lazily read session records from a CSV (with header) or JSONL stream.
+
+    :param fp: A text stream.
+    :param fmt: ``"csv"`` or ``"jsonl"``.
+    :return: An iterator of dicts, one per record.
+    """
+    if fmt == "csv":
+        yield from csv.DictReader(fp)
+    elif fmt == "jsonl":
+        for line in fp:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ValueError(f"unsupported format: {fmt}")
+
+
+def iter_chunks(records: Iterable[Record], chunk_size: int) -> Iterator[List[Record]]:
+    """
+    Group records into lists of at most ``chunk_size`` items.
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be greater than 0")
+    iterator = iter(records)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_datetime(value: object) -> datetime:
+    """
+    Parse an ISO-8601 string into a datetime object. datetime objects are returned as-is.
+    """
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def _parse_field(record: Record, field: str, number: int) -> datetime:
+    try:
+        return parse_datetime(record[field])
+    except KeyError:
+        raise ValueError(f"record {number}: missing field {field!r}") from None
+    except ValueError:
+        raise ValueError(f"record {number}: invalid {field} timestamp {record[field]!r}") from None
+
+
+def process_chunk(chunk: List[Record], interval_minutes: int = 30, entered_field: str = "entered", left_field: str = "left", tz: Optional[str] = None, first_record: int = 1) -> List[Record]:
+    """
+    Add ``intervals`` and ``remainder`` to every record of a chunk.
+
+    The values are identical to calling ``calculate_intervals_and_remainder`` per record.
+    When ``tz`` is given, naive times are wall-clock times in that zone.
+
+    :param first_record: The 1-based number of ``chunk[0]`` in the input, used in error messages.
+    :raises ValueError: When a record has a missing, empty or malformed timestamp. The message
+        names the record number (header excluded) and the field.
+    """
+    entered = [_parse_field(record, entered_field, number) for number, record in enumerate(chunk, first_record)]
+    left = [_parse_field(record, left_field, number) for number, record in enumerate(chunk, first_record)]
+    intervals, remainder = calculate_intervals_and_remainder_batch(entered, left, interval_minutes, tz=tz)
+    for record, record_intervals, record_remainder in zip(chunk, intervals.tolist(), remainder.tolist()):
+        record["intervals"] = record_intervals
+        record["remainder"] = record_remainder
+    return chunk
+
+
+class RecordWriter:
+    """
+    Write result records incrementally as CSV or JSONL.
+
+    The CSV header is the union of the keys of the first chunk, in order of appearance. Keys that
+    first appear in a later chunk are not written (a warning is logged once), since the header
+    has already been emitted.
+    """
+
+    def __init__(self, fp: IO[str], fmt: str):
+        if fmt not in FORMATS:
+            raise ValueError(f"unsupported format: {fmt}")
+        self.fp = fp
+        self.fmt = fmt
+        self._csv_writer = None
+        self._dropped = set()
+
+    def write_chunk(self, chunk: List[Record]) -> None:
+        if self.fmt == "jsonl":
+            self.fp.writelines(json.dumps(record, default=str) + "\n" for record in chunk)
+            return
+        if self._csv_writer is None:
+            # DictReader puts surplus columns under the None key
+            fieldnames = [key for key in dict.fromkeys(key for record in chunk for key in record) if key is not None]
+            self._csv_writer = csv.DictWriter(self.fp, fieldnames=fieldnames, extrasaction="ignore")
+            self._csv_writer.writeheader()
+        else:
+            fieldnames = set(self._csv_writer.fieldnames)
+            dropped = {key for record in chunk for key in record if key is not None and key not in fieldnames} - self._dropped
+            if dropped:
+                logger.warning("Fields not in the CSV header are not written: %s", ", ".join(sorted(map(str, dropped))))
+                self._dropped |= dropped
+        self._csv_writer.writerows(chunk)
+
+
+def run(in_fp: IO[str], out_fp: IO[str], input_format: str, output_format: str, interval_minutes: int = 30, chunk_size: int = DEFAULT_CHUNK_SIZE, entered_field: str = "entered", left_field: str = "left", tz: Optional[str] = None) -> int:
+    """
+    Stream records from ``in_fp`` to ``out_fp`` chunk by chunk.
+
+    Only one chunk is held in memory at a time, so memory use does not depend on the input size.
+
+    :return: The number of processed records.
+    :raises ValueError: On the first record with a missing or malformed timestamp; the records of
+        earlier chunks have already been written.
+    """
+    if interval_minutes <= 0:
+        raise ValueError("interval_minutes must be greater than 0")
+
+    writer = RecordWriter(out_fp, output_format)
+    rows = 0
+    for chunk in iter_chunks(read_records(in_fp, input_format), chunk_size):
+        writer.write_chunk(process_chunk(chunk, interval_minutes, entered_field, left_field, tz, first_record=rows + 1))
+        rows += len(chunk)
+        logger.debug("Processed %d rows", rows)
+    out_fp.flush()
+    return rows
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Stream session records and compute billing intervals and remainders.")
+    parser.add_argument("input", help="input CSV/JSONL file, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output file, or - for stdout (default: -)")
+    parser.add_argument("--format", choices=FORMATS, help="input format (default: guessed from the file name)")
+    parser.add_argument("--output-format", choices=FORMATS, help="output format (default: same as the input)")
+    parser.add_argument("--interval-minutes", type=int, default=30, help="interval length in minutes (default: 30)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help=f"records per chunk (default: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("--entered-field", default="entered", help="name of the start time field (default: entered)")
+    parser.add_argument("--left-field", default="left", help="name of the end time field (default: left)")
+    parser.add_argument("--tz", help="IANA zone of naive timestamps, e.g. Asia/Tokyo (default: local timezone)")
+    parser.add_argument("--counters", metavar="FILE", help="collect aggregate counters and write them as JSON to FILE, or - for stderr")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    input_format = args.format or detect_format(args.input)
+    if input_format is None:
+        parser.error("cannot guess the input format, please pass --format")
+    output_format = args.output_format or (detect_format(args.output) if args.output != "-" else None) or input_format
+
+    in_fp = sys.stdin if args.input == "-" else open(args.input, newline="", encoding="utf-8")
+    out_fp = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    if args.counters:
+        instrumentation.enable_counters()
+    try:
+        start = time.perf_counter()
+        rows = run(in_fp, out_fp, input_format, output_format, args.interval_minutes, args.chunk_size, args.entered_field, args.left_field, args.tz)
+        elapsed = time.perf_counter() - start
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if in_fp is not sys.stdin:
+            in_fp.close()
+        if out_fp is not sys.stdout:
+            out_fp.close()
+
+    rate = rows / elapsed if elapsed > 0 else float("inf")
+    print(f"Processed {rows} rows in {elapsed:.3f} seconds ({rate:,.0f} rows/s)", file=sys.stderr)
+
+    if args.counters == "-":
+        instrumentation.export_counters(sys.stderr)
+    elif args.counters:
+        with open(args.counters, "w", encoding="utf-8") as counters_fp:
+            instrumentation.export_counters(counters_fp)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+import os
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from batch import calculate_intervals_and_remainder_batch
+from main import calculate_intervals_and_remainder
+from timezones import get_offset_cache
+
+class TestCalculateIntervalsAndRemainderBatch(unittest.TestCase):
+
+    def setUp(self):
+        base = datetime(2023, 10, 30, 17)
+        self.entered = [base, base, base, base + timedelta(minutes=5)]
+        self.left = [
+            datetime(2023, 10, 30, 18, 31),
+            datetime(2023, 10, 30, 17, 15),
+            datetime(2023, 10, 30, 18),
+            base,
+        ]
+
+    def test_datetime_sequences_match_scalar(self):
+        intervals, remainder = calculate_intervals_and_remainder_batch(self.entered, self.left)
+        expected = [calculate_intervals_and_remainder(e, l) for e, l in zip(self.entered, self.left)]
+        self.assertEqual(list(zip(intervals.tolist(), remainder.tolist())), expected)
+
+    def test_naive_local_times_across_dst(self):
+        previous = os.environ.get("TZ")
+        os.environ["TZ"] = "America/New_York"
+        time.tzset()
+        get_offset_cache.cache_clear()
+        try:
+            # 2023-03-12 02:00 and 2023-11-05 01:00 are DST transitions in New York
+            entered = [datetime(2023, 3, 12, 1, 30), datetime(2023, 11, 5, 0, 30), datetime(2023, 1, 1)]
+            left = [datetime(2023, 3, 12, 3, 30), datetime(2023, 11, 5, 2, 0), datetime(2023, 12, 31)]
+            intervals, remainder = calculate_intervals_and_remainder_batch(entered, left)
+            expected = [calculate_intervals_and_remainder(e, l) for e, l in zip(entered, left)]
+            self.assertEqual(list(zip(intervals.tolist(), remainder.tolist())), expected)
+        finally:
+            if previous is None:
+                del os.environ["TZ"]
+            else:
+                os.environ["TZ"] = previous
+            time.tzset()
+            get_offset_cache.cache_clear()
+
+    def test_aware_datetimes_match_scalar(self):
+        jst = timezone(timedelta(hours=9))
+        entered = [datetime(2023, 10, 30, 17, tzinfo=jst), datetime(2023, 10, 30, 8, tzinfo=timezone.utc)]
+        left = [datetime(2023, 10, 30, 9, 31, 0, 500, tzinfo=timezone.utc), datetime(2023, 10, 30, 17, 15, tzinfo=jst)]
+        intervals, remainder = calculate_intervals_and_remainder_batch(entered, left)
+        expected = [calculate_intervals_and_remainder(e, l) for e, l in zip(entered, left)]
+        self.assertEqual(list(zip(intervals.tolist(), remainder.tolist())), expected)
+
+    def test_mixed_kinds_are_rejected(self):
+        with self.assertRaises(TypeError):
+            calculate_intervals_and_remainder_batch(np.array(self.entered, dtype="datetime64[us]"), self.left)
+
+    def test_datetime64_arrays(self):
+        entered = np.array(self.entered, dtype="datetime64[us]")
+        left = np.array(self.left, dtype="datetime64[us]")
+        intervals, remainder = calculate_intervals_and_remainder_batch(entered, left)
+        self.assertEqual(intervals.tolist(), [3, 0, 2, -1])
+        self.assertEqual(remainder.tolist(), [60, 900, 0, 1500])
+
+    def test_sub_second_truncation(self):
+        entered = np.array(["2023-10-30T17:00:00.000"], dtype="datetime64[ms]")
+        left = np.array(["2023-10-30T17:00:59.900"], dtype="datetime64[ms]")
+        intervals, remainder = calculate_intervals_and_remainder_batch(entered, left, interval_minutes=1)
+        self.assertEqual((intervals.tolist(), remainder.tolist()), ([0], [59]))
+
+    def test_invalid_interval(self):
+        with self.assertRaises(ValueError):
+            calculate_intervals_and_remainder_batch(self.entered, self.left, interval_minutes=0)
+
+    def test_length_mismatch(self):
+        with self.assertRaises(ValueError):
+            calculate_intervals_and_remainder_batch(self.entered, self.left[:2])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+import unittest
+
+from benchmark import compare_results, run_benchmarks
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_run_benchmarks_report(self):
+        report = run_benchmarks(sizes=[200], chunk_size=64, max_rows={"scalar": 100})
+        self.assertEqual([(r["mode"], r["rows"]) for r in report["results"]], [("batch", 200), ("stream", 200)])
+        self.assertTrue(all(r["seconds"] > 0 for r in report["results"]))
+
+    def test_compare_results(self):
+        baseline = {"results": [
+            {"mode": "batch", "rows": 1000, "rows_per_second": 100.0},
+            {"mode": "scalar", "rows": 1000, "rows_per_second": 100.0},
+        ]}
+        current = {"results": [
+            {"mode": "batch", "rows": 1000, "rows_per_second": 80.0},
+            {"mode": "scalar", "rows": 1000, "rows_per_second": 95.0},
+            {"mode": "stream", "rows": 1000, "rows_per_second": 10.0},
+        ]}
+        comparisons = compare_results(current, baseline, tolerance=0.10)
+        self.assertEqual([(c["mode"], c["regression"]) for c in comparisons], [("batch", True), ("scalar", False)])
+        self.assertAlmostEqual(comparisons[0]["change"], -0.2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 from datetime import datetime
-from calculate_intervals_and_remainder import calculate_intervals_and_remainder
+from main import calculate_intervals_and_remainder
 
 class TestCalculateIntervalsAndRemainder(unittest.TestCase):
 
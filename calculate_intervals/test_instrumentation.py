@@ -0,0 +1,39 @@
+import io
+import json
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+import instrumentation
+from batch import calculate_intervals_and_remainder_batch
+from main import calculate_intervals_and_remainder
+
+class TestInstrumentation(unittest.TestCase):
+
+    def tearDown(self):
+        instrumentation.disable_counters()
+
+    def test_disabled_by_default(self):
+        calculate_intervals_and_remainder(datetime(2023, 10, 30, 17), datetime(2023, 10, 30, 18, 31))
+        self.assertIsNone(instrumentation.active_counters)
+        self.assertEqual(instrumentation.export_counters(), {})
+
+    def test_scalar_and_batch_counters(self):
+        instrumentation.enable_counters(remainder_bucket_seconds=600)
+        calculate_intervals_and_remainder(datetime(2023, 10, 30, 17), datetime(2023, 10, 30, 18, 31))
+        entered = np.array(["2023-10-30T17:00", "2023-10-30T17:00"], dtype="datetime64[s]")
+        left = np.array(["2023-10-30T17:15", "2023-10-30T18:31"], dtype="datetime64[s]")
+        calculate_intervals_and_remainder_batch(entered, left)
+
+        fp = io.StringIO()
+        snapshot = instrumentation.export_counters(fp, reset=True)
+        self.assertEqual(json.loads(fp.getvalue()), snapshot)
+        self.assertEqual(snapshot["calls"], 3)
+        self.assertEqual(snapshot["total_seconds"], 5460 + 900 + 5460)
+        self.assertEqual(snapshot["intervals_histogram"], {"0": 1, "3": 2})
+        self.assertEqual(snapshot["remainder_histogram"], {"0": 2, "600": 1})
+        self.assertEqual(instrumentation.export_counters()["calls"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
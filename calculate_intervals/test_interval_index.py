@@ -0,0 +1,75 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+
+from interval_index import IntervalIndex
+
+class TestIntervalIndex(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(0)
+        self.sessions = []
+        for i in range(300):
+            start = rng.randint(0, 1000)
+            self.sessions.append((start, start + rng.randint(0, 120), i))
+
+    def assert_matches_scan(self, index, sessions):
+        for point in range(-5, 1130, 7):
+            expected = [v for s, e, v in sorted(sessions, key=lambda x: (x[0], x[1])) if s <= point < e]
+            self.assertEqual(sorted(index.stab(point)), sorted(expected))
+            self.assertEqual(index.count_at(point), len(expected))
+        for start in range(-5, 1130, 37):
+            end = start + 50
+            expected = [v for s, e, v in sessions if s < end and e > start]
+            self.assertEqual(sorted(index.overlapping(start, end)), sorted(expected))
+            self.assertEqual(index.count_overlapping(start, end), len(expected))
+        self.assertEqual(index.overlapping(500, 500), [])
+        self.assertEqual(index.count_overlapping(500, 400), 0)
+
+    def test_bulk_build(self):
+        index = IntervalIndex(self.sessions)
+        self.assertEqual(len(index), 300)
+        self.assert_matches_scan(index, self.sessions)
+
+    def test_incremental_inserts(self):
+        index = IntervalIndex(self.sessions[:50])
+        for start, end, value in self.sessions[50:]:
+            index.insert(start, end, value)
+        self.assertEqual(len(index), 300)
+        self.assertEqual([s for s, _, _ in index], sorted(s for s, _, _ in self.sessions))
+        self.assert_matches_scan(index, self.sessions)
+        self.assertLessEqual(index._root.height, 12)
+
+    def test_results_in_start_order(self):
+        index = IntervalIndex()
+        for start, end, value in self.sessions:
+            index.insert(start, end, value)
+        starts = {v: s for s, _, v in self.sessions}
+        found = [starts[v] for v in index.overlapping(400, 600)]
+        self.assertEqual(found, sorted(found))
+
+    def test_from_sessions(self):
+        base = datetime(2023, 10, 30, 17)
+        entered = [base, base + timedelta(minutes=30), base + timedelta(hours=1)]
+        left = [base + timedelta(hours=1), base + timedelta(minutes=50), base + timedelta(hours=2)]
+        index = IntervalIndex.from_sessions(entered, left, ["a", "b", "c"])
+        self.assertEqual(index.stab(datetime(2023, 10, 30, 17, 45)), ["a", "b"])
+        self.assertEqual(index.count_at(datetime(2023, 10, 30, 18)), 1)
+
+    def test_counts_with_zero_length_sessions(self):
+        sessions = [(10, 10, "empty"), (5, 15, "a"), (10, 20, "b"), (0, 10, "c")]
+        index = IntervalIndex(sessions[:2])
+        for start, end, value in sessions[2:]:
+            index.insert(start, end, value)
+        for point in range(-1, 22):
+            self.assertEqual(index.count_at(point), len(index.stab(point)))
+        for start in range(-1, 22):
+            for end in range(start + 1, 23):
+                self.assertEqual(index.count_overlapping(start, end), len(index.overlapping(start, end)))
+
+    def test_invalid_interval(self):
+        with self.assertRaises(ValueError):
+            IntervalIndex().insert(10, 5)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+
+from live_tracker import LiveIntervalTracker
+from main import calculate_intervals_and_remainder
+
+class FakeClock:
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class TestLiveIntervalTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.entered = datetime(2023, 10, 30, 17)
+        self.clock = FakeClock(self.entered.timestamp())
+        self.tracker = LiveIntervalTracker(30, clock=self.clock)
+
+    def test_emits_one_event_per_boundary(self):
+        self.tracker.open("a", self.entered)
+        self.tracker.open("b", self.entered + timedelta(minutes=10))
+        self.clock.now += 29 * 60
+        self.assertEqual(self.tracker.process_due(), [])
+        self.clock.now += 60
+        self.assertEqual([(e.session_id, e.intervals) for e in self.tracker.process_due()], [("a", 1)])
+        self.clock.now += 10 * 60
+        self.assertEqual([(e.session_id, e.intervals) for e in self.tracker.process_due()], [("b", 1)])
+        self.clock.now += 30 * 60
+        self.assertEqual([(e.session_id, e.intervals) for e in self.tracker.process_due()], [("a", 2), ("b", 2)])
+        self.assertEqual(self.tracker.events.qsize(), 4)
+
+    def test_catch_up_is_coalesced(self):
+        self.clock.now += 95 * 60
+        self.tracker.open("a", self.entered)
+        self.assertEqual([(e.session_id, e.intervals) for e in self.tracker.process_due()], [("a", 3)])
+        self.assertEqual(self.tracker.process_due(), [])
+
+    def test_close_matches_batch_function(self):
+        self.tracker.open("a", self.entered)
+        left = self.entered + timedelta(hours=1, minutes=31)
+        self.assertEqual(self.tracker.close("a", left), calculate_intervals_and_remainder(self.entered, left))
+        self.clock.now += 3600
+        self.assertEqual(self.tracker.process_due(), [])
+        self.assertEqual(len(self.tracker), 0)
+
+    def test_duplicate_open(self):
+        self.tracker.open("a", self.entered)
+        with self.assertRaises(ValueError):
+            self.tracker.open("a", self.entered)
+
+    def test_run_emits_due_events(self):
+        events = []
+
+        async def scenario():
+            tracker = LiveIntervalTracker(30, on_boundary=events.append)
+            task = asyncio.create_task(tracker.run())
+            await asyncio.sleep(0)
+            now = datetime.now()
+            for i in range(1000):
+                tracker.open(i, now - timedelta(minutes=31 + i % 60))
+            tracker.open("open", now)
+            await asyncio.sleep(0.05)
+            tracker.stop()
+            await asyncio.wait_for(task, 1)
+
+        asyncio.run(scenario())
+        self.assertEqual(len(events), 1000)
+        self.assertEqual({e.intervals for e in events}, {1, 2, 3})
+
+if __name__ == "__main__":
+    unittest.main()
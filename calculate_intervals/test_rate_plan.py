@@ -0,0 +1,40 @@
+import unittest
+
+import numpy as np
+
+from rate_plan import RatePlan, Tier
+
+class TestRatePlan(unittest.TestCase):
+
+    def setUp(self):
+        self.plan = RatePlan([Tier(2, 300), Tier(4, 250), Tier(None, 200)], grace_seconds=300)
+
+    def test_scalar_price(self):
+        self.assertEqual(self.plan.price(0, 0), 0)
+        self.assertEqual(self.plan.price(0, 301), 300)
+        self.assertEqual(self.plan.price(3, 60), 850)
+        self.assertEqual(self.plan.price(7, 0), 600 + 1000 + 200)
+
+    def test_compiled_matches_naive(self):
+        rng = np.random.default_rng(1)
+        intervals = rng.integers(-2, 15, size=2000)
+        remainder = rng.integers(0, 1800, size=2000)
+        expected = [self.plan.price(i, r) for i, r in zip(intervals.tolist(), remainder.tolist())]
+        self.assertEqual(self.plan.compile().price(intervals, remainder).tolist(), expected)
+
+    def test_single_tier(self):
+        plan = RatePlan([Tier(None, 100)])
+        self.assertEqual(plan.compile().price([0, 3], [0, 1]).tolist(), [0, 400])
+
+    def test_invalid_plans(self):
+        with self.assertRaises(ValueError):
+            RatePlan([])
+        with self.assertRaises(ValueError):
+            RatePlan([Tier(2, 300)])
+        with self.assertRaises(ValueError):
+            RatePlan([Tier(None, 300), Tier(None, 200)])
+        with self.assertRaises(ValueError):
+            RatePlan([Tier(None, 300)], grace_seconds=-1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from main import calculate_intervals_and_remainder
+from sharded import bill_sharded, bill_sharded_with_sketches, compute_shards
+
+class TestSharded(unittest.TestCase):
+
+    def setUp(self):
+        base = datetime(2023, 10, 30, 17)
+        self.sessions = [
+            ("customer%d" % (i % 7), base + timedelta(minutes=i), base + timedelta(minutes=i * 3, seconds=i))
+            for i in range(500)
+        ]
+        self.expected = {}
+        for customer, entered, left in self.sessions:
+            intervals, remainder = calculate_intervals_and_remainder(entered, left)
+            totals = self.expected.setdefault(customer, [0, 0, 0])
+            totals[0] += 1
+            totals[1] += intervals
+            totals[2] += remainder
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, name, lines):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "w", encoding="utf-8") as fp:
+            fp.writelines(line + "\n" for line in lines)
+        return path
+
+    def test_shards_cover_file_on_line_boundaries(self):
+        path = self._write("sessions.jsonl", ["x" * (i % 13) for i in range(200)])
+        shards = compute_shards(path, 8)
+        self.assertEqual(shards[0][0], 0)
+        self.assertEqual(shards[-1][1], os.path.getsize(path))
+        with open(path, "rb") as fp:
+            data = fp.read()
+        for (_, end), (start, _) in zip(shards, shards[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(data[start - 1:start], b"\n")
+
+    def test_csv_totals_match_scalar(self):
+        lines = ["customer,entered,left"] + ["%s,%s,%s" % (c, e.isoformat(), l.isoformat()) for c, e, l in self.sessions]
+        path = self._write("sessions.csv", lines)
+        totals = bill_sharded(path, workers=2, chunk_size=16)
+        self.assertEqual({c: list(t) for c, t in totals.items()}, self.expected)
+        self.assertEqual(list(totals), sorted(self.expected))
+
+    def test_jsonl_totals_match_scalar(self):
+        lines = [json.dumps({"customer": c, "entered": e.isoformat(), "left": l.isoformat()}) for c, e, l in self.sessions]
+        path = self._write("sessions.jsonl", lines)
+        totals = bill_sharded(path, workers=1)
+        self.assertEqual({c: list(t) for c, t in totals.items()}, self.expected)
+
+    def test_sketches_merged_across_shards(self):
+        lines = [json.dumps({"customer": c, "entered": e.isoformat(), "left": l.isoformat()}) for c, e, l in self.sessions]
+        path = self._write("sessions.jsonl", lines)
+        totals, sketches = bill_sharded_with_sketches(path, workers=2, chunk_size=32)
+        self.assertEqual(sketches.durations.n, len(self.sessions))
+        self.assertEqual(sketches.durations.quantile(1.0), max(
+            (l - e).total_seconds() for _, e, l in self.sessions))
+
+    def test_sketches_independent_of_workers(self):
+        # enough sessions that the sketches compact, so the shard layout and seeds matter
+        base = datetime(2023, 10, 30, 17)
+        lines = [json.dumps({"customer": "c", "entered": (base + timedelta(minutes=i)).isoformat(),
+                             "left": (base + timedelta(minutes=i, seconds=i * 7919 % 90000)).isoformat()})
+                 for i in range(20000)]
+        path = self._write("many.jsonl", lines)
+        _, sequential = bill_sharded_with_sketches(path, workers=1)
+        _, parallel = bill_sharded_with_sketches(path, workers=2)
+        _, three_workers = bill_sharded_with_sketches(path, workers=3)
+        self.assertEqual(sequential.summary(), parallel.summary())
+        self.assertEqual(sequential.summary(), three_workers.summary())
+
+if __name__ == "__main__":
+    unittest.main()
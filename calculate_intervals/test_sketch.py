@@ -0,0 +1,60 @@
+import random
+import unittest
+
+import numpy as np
+
+from sketch import KLLSketch, SessionSketches
+
+class TestKLLSketch(unittest.TestCase):
+
+    def assert_rank_close(self, sketch, values, fraction, tolerance=0.02):
+        estimate = sketch.quantile(fraction)
+        true_rank = np.searchsorted(np.sort(values), estimate, side="right") / len(values)
+        self.assertLess(abs(true_rank - fraction), tolerance)
+
+    def test_quantiles_within_error(self):
+        values = np.random.default_rng(0).exponential(1800, size=200_000)
+        sketch = KLLSketch(seed=1)
+        sketch.update_many(values)
+        self.assertEqual(sketch.n, len(values))
+        self.assertLess(sum(len(c) for c in sketch.compactors), 1000)
+        for fraction in (0.5, 0.95, 0.99):
+            self.assert_rank_close(sketch, values, fraction)
+        self.assertEqual(sketch.quantile(0), values.min())
+        self.assertEqual(sketch.quantile(1), values.max())
+
+    def test_merge(self):
+        rng = random.Random(2)
+        values = [rng.randint(0, 10_000) for _ in range(100_000)]
+        merged = KLLSketch(seed=0)
+        for shard in range(8):
+            part = KLLSketch(seed=shard + 1)
+            for value in values[shard::8]:
+                part.update(value)
+            merged.merge(part)
+        self.assertEqual(merged.n, len(values))
+        self.assert_rank_close(merged, np.array(values), 0.5)
+        self.assert_rank_close(merged, np.array(values), 0.99)
+
+    def test_round_trip(self):
+        sketch = KLLSketch(seed=0)
+        sketch.update_many(range(10_000))
+        restored = KLLSketch.from_dict(sketch.to_dict())
+        self.assertEqual(restored.quantiles([0.1, 0.5, 0.9]), sketch.quantiles([0.1, 0.5, 0.9]))
+
+    def test_empty(self):
+        self.assertEqual(KLLSketch().quantiles([0.5]), [None])
+
+class TestSessionSketches(unittest.TestCase):
+
+    def test_summary(self):
+        sketches = SessionSketches(30, seed=0)
+        sketches.update_batch(np.array([0, 1, 2, 3]), np.array([60, 120, 0, 600]))
+        sketches.update(1, 30)
+        summary = sketches.summary([0.5, 1.0])
+        self.assertEqual(summary["sessions"], 5)
+        self.assertEqual(summary["duration"], {"p50": 1920, "p100": 6000})
+        self.assertEqual(summary["remainder"]["p100"], 600)
+
+if __name__ == "__main__":
+    unittest.main()
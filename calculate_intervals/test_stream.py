@@ -0,0 +1,79 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from stream import iter_chunks, main, run
+
+CSV_INPUT = """customer,entered,left
+a,2023-10-30T17:00:00,2023-10-30T18:31:00
+b,2023-10-30T17:00:00,2023-10-30T17:15:00
+c,2023-10-30T17:00:00,2023-10-30T18:00:00
+"""
+
+class TestStream(unittest.TestCase):
+
+    def test_csv_to_csv(self):
+        out = io.StringIO()
+        rows = run(io.StringIO(CSV_INPUT), out, "csv", "csv", chunk_size=2)
+        self.assertEqual(rows, 3)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "customer,entered,left,intervals,remainder")
+        self.assertEqual([line.split(",")[-2:] for line in lines[1:]], [["3", "60"], ["0", "900"], ["2", "0"]])
+
+    def test_jsonl_to_jsonl(self):
+        records = [
+            {"entered": "2023-10-30T17:00:00", "left": "2023-10-30T18:31:00"},
+            {"entered": "2023-10-30T17:00:00", "left": "2023-10-30T17:15:00"},
+        ]
+        in_fp = io.StringIO("".join(json.dumps(r) + "\n" for r in records))
+        out = io.StringIO()
+        run(in_fp, out, "jsonl", "jsonl", interval_minutes=15)
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([(r["intervals"], r["remainder"]) for r in results], [(6, 60), (1, 0)])
+
+    def test_invalid_interval(self):
+        with self.assertRaises(ValueError):
+            run(io.StringIO(CSV_INPUT), io.StringIO(), "csv", "csv", interval_minutes=0)
+
+    def test_bad_timestamp_names_the_record(self):
+        csv_input = CSV_INPUT + "d,2023-10-30T17:00:00,\n"
+        with self.assertRaisesRegex(ValueError, r"record 4: invalid left timestamp ''"):
+            run(io.StringIO(csv_input), io.StringIO(), "csv", "csv", chunk_size=2)
+        in_fp = io.StringIO(json.dumps({"entered": "2023-10-30T17:00:00"}) + "\n")
+        with self.assertRaisesRegex(ValueError, r"record 1: missing field 'left'"):
+            run(in_fp, io.StringIO(), "jsonl", "jsonl")
+
+    def test_cli_reports_bad_records(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "sessions.csv")
+            with open(path, "w", encoding="utf-8") as fp:
+                fp.write(CSV_INPUT + "d,yesterday,2023-10-30T18:00:00\n")
+            stderr = io.StringIO()
+            with contextlib.redirect_stderr(stderr):
+                status = main([path, "-o", os.path.join(root, "billed.csv")])
+        self.assertEqual(status, 1)
+        self.assertIn("record 4: invalid entered timestamp 'yesterday'", stderr.getvalue())
+
+    def test_csv_header_from_the_first_chunk(self):
+        records = [
+            {"entered": "2023-10-30T17:00:00", "left": "2023-10-30T18:31:00"},
+            {"entered": "2023-10-30T17:00:00", "left": "2023-10-30T17:15:00", "note": "x"},
+            {"entered": "2023-10-30T17:00:00", "left": "2023-10-30T17:15:00", "late": "y"},
+        ]
+        in_fp = io.StringIO("".join(json.dumps(r) + "\n" for r in records))
+        out = io.StringIO()
+        with self.assertLogs("stream", "WARNING") as logs:
+            run(in_fp, out, "jsonl", "csv", chunk_size=2)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "entered,left,intervals,remainder,note")
+        self.assertEqual(lines[2].split(",")[-1], "x")
+        self.assertIn("late", logs.output[0])
+
+    def test_iter_chunks(self):
+        self.assertEqual(list(iter_chunks(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+if __name__ == "__main__":
+    unittest.main()
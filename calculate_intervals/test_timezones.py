@@ -0,0 +1,47 @@
+import unittest
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from batch import calculate_intervals_and_remainder_batch
+from timezones import ZoneOffsetCache, localize_to_utc_micros
+
+class TestZoneOffsetCache(unittest.TestCase):
+
+    def assert_matches_zoneinfo(self, zone, values):
+        for fold in (0, 1):
+            expected = [int(v.replace(tzinfo=ZoneInfo(zone), fold=fold).timestamp()) * 1_000_000 for v in values]
+            self.assertEqual(localize_to_utc_micros(values, zone, fold).tolist(), expected)
+
+    def test_hourly_across_dst_transitions(self):
+        start = datetime(2022, 12, 31)
+        values = [start + timedelta(minutes=30 * i) for i in range(2 * 24 * 400)]
+        self.assert_matches_zoneinfo("America/New_York", values)
+
+    def test_ambiguous_and_nonexistent_times(self):
+        values = [datetime(2023, 3, 12, 2, 30), datetime(2023, 11, 5, 1, 30), datetime(2023, 11, 5, 2, 0)]
+        self.assert_matches_zoneinfo("America/New_York", values)
+        self.assert_matches_zoneinfo("Australia/Lord_Howe", [datetime(2023, 4, 2, 1, 45), datetime(2023, 10, 1, 2, 15)])
+
+    def test_transitions_are_cached_per_year(self):
+        cache = ZoneOffsetCache("Europe/London")
+        self.assertEqual(cache.transitions(2023), [(1679792400, 0, 3600), (1698541200, 3600, 0)])
+        self.assertEqual(cache.transitions(2023), cache._transitions[2023])
+
+    def test_zone_without_dst(self):
+        self.assert_matches_zoneinfo("Asia/Tokyo", [datetime(2023, 10, 30, 17)])
+
+    def test_batch_with_timezone(self):
+        entered = np.array(["2023-11-05T00:30", "2023-10-30T17:00"], dtype="datetime64[s]")
+        left = np.array(["2023-11-05T02:30", "2023-10-30T18:31"], dtype="datetime64[s]")
+        intervals, remainder = calculate_intervals_and_remainder_batch(entered, left, tz="America/New_York")
+        self.assertEqual(intervals.tolist(), [6, 3])
+        self.assertEqual(remainder.tolist(), [0, 60])
+
+    def test_aware_datetimes_rejected(self):
+        with self.assertRaises(ValueError):
+            localize_to_utc_micros([datetime(2023, 1, 1, tzinfo=ZoneInfo("UTC"))], "Asia/Tokyo")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import calendar
+import functools
+import logging
+import threading
+from datetime import datetime, timezone, tzinfo
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+# ログ設定
+logger = logging.getLogger(__name__)
+
+# 遷移を探すときのサンプリング間隔。実在するタイムゾーンで 6 時間以内に 2 回遷移する例はない
+SAMPLE_SECONDS = 6 * 3600
+# 壁時計時刻と UTC のずれは最大でも ±26 時間程度なので、前後に余裕をもって年をカバーする
+MARGIN_SECONDS = 2 * 86400
+
+MICROSECONDS = 1_000_000
+
+# (UTC の遷移時刻 [秒], 遷移前オフセット [秒], 遷移後オフセット [秒])
+Transition = Tuple[int, int, int]
+
+
+def _year_start(year: int) -> int:
+    return calendar.timegm((year, 1, 1, 0, 0, 0))
+
+
+class ZoneOffsetCache:
+    """
+    Cached UTC offsets for one timezone, keyed by transition window.
+
+    Transitions are discovered once per calendar year and compiled into sorted
+    wall-clock thresholds, so converting a batch of wall-clock times costs one
+    ``numpy.searchsorted`` instead of one tz lookup per value.
+
+    Ambiguous and nonexistent wall times follow PEP 495: ``fold=0`` selects the
+    offset before the transition, ``fold=1`` the offset after it, exactly like
+    ``dt.replace(tzinfo=ZoneInfo(zone), fold=fold).timestamp()``.
+
+    ``zone=None`` uses the system local timezone, like ``datetime.timestamp()`` on naive values.
+    """
+
+    def __init__(self, zone: Union[str, tzinfo, None]):
+        self.zone = ZoneInfo(zone) if isinstance(zone, str) else zone
+        self._lock = threading.Lock()
+        self._transitions: Dict[int, List[Transition]] = {}
+        self._first_year = None
+        self._last_year = None
+        # (offsets, fold=0 の閾値, fold=1 の閾値) をまとめて差し替える
+        self._table = (np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+    def _offset_at(self, utc_seconds: int) -> int:
+        offset = datetime.fromtimestamp(utc_seconds, tz=timezone.utc).astimezone(self.zone).utcoffset()
+        return int(offset.total_seconds())
+
+    def _find_transitions(self, year: int) -> List[Transition]:
+        transitions = []
+        end = _year_start(year + 1)
+        previous_time = _year_start(year)
+        previous_offset = self._offset_at(previous_time)
+        while previous_time < end:
+            current_time = min(previous_time + SAMPLE_SECONDS, end)
+            current_offset = self._offset_at(current_time)
+            if current_offset != previous_offset:
+                # 秒単位で二分探索して遷移時刻を求める
+                low, high = previous_time, current_time
+                while high - low > 1:
+                    middle = (low + high) // 2
+                    if self._offset_at(middle) == previous_offset:
+                        low = middle
+                    else:
+                        high = middle
+                transitions.append((high, previous_offset, current_offset))
+            previous_time, previous_offset = current_time, current_offset
+        return transitions
+
+    def _ensure_years(self, first_year: int, last_year: int) -> None:
+        if self._first_year is not None and self._first_year <= first_year and last_year <= self._last_year:
+            return
+        with self._lock:
+            if self._first_year is not None:
+                first_year = min(first_year, self._first_year)
+                last_year = max(last_year, self._last_year)
+            for year in range(first_year, last_year + 1):
+                if year not in self._transitions:
+                    self._transitions[year] = self._find_transitions(year)
+            logger.debug("Compiled offsets for %s from %d to %d", self.zone, first_year, last_year)
+
+            transitions = [t for year in range(first_year, last_year + 1) for t in self._transitions[year]]
+            offsets = [self._offset_at(_year_start(first_year))] + [after for _, _, after in transitions]
+            # fold=0 は遷移前を優先、fold=1 は遷移後を優先する
+            fold0 = [utc + max(before, after) for utc, before, after in transitions]
+            fold1 = [utc + min(before, after) for utc, before, after in transitions]
+            self._table = (
+                np.array(offsets, dtype=np.int64) * MICROSECONDS,
+                np.array(fold0, dtype=np.int64) * MICROSECONDS,
+                np.array(fold1, dtype=np.int64) * MICROSECONDS,
+            )
+            self._first_year, self._last_year = first_year, last_year
+
+    def transitions(self, year: int) -> List[Transition]:
+        """
+        Return the ``(utc_seconds, offset_before, offset_after)`` transitions of a calendar year.
+        """
+        self._ensure_years(year, year)
+        return list(self._transitions[year])
+
+    def offsets(self, wall_micros: np.ndarray, fold: int = 0) -> np.ndarray:
+        """
+        Resolve UTC offsets in microseconds for wall-clock times given as epoch microseconds.
+
+        :param wall_micros: Wall-clock times as int64 microseconds since 1970-01-01T00:00 (naive).
+        :param fold: 0 or 1, see PEP 495.
+        :return: An int64 array of UTC offsets in microseconds.
+        """
+        if fold not in (0, 1):
+            raise ValueError("fold must be 0 or 1")
+        wall_micros = np.asarray(wall_micros, dtype=np.int64)
+        if wall_micros.size == 0:
+            return np.zeros(0, dtype=np.int64)
+        first = datetime.fromtimestamp(int(wall_micros.min()) // MICROSECONDS - MARGIN_SECONDS, tz=timezone.utc).year
+        last = datetime.fromtimestamp(int(wall_micros.max()) // MICROSECONDS + MARGIN_SECONDS, tz=timezone.utc).year
+        self._ensure_years(first, last)
+        table = self._table
+        offsets, thresholds = table[0], table[1 + fold]
+        return offsets[np.searchsorted(thresholds, wall_micros, side="right")]
+
+    def to_utc_micros(self, wall_micros: np.ndarray, fold: int = 0) -> np.ndarray:
+        """
+        Convert wall-clock epoch microseconds in this zone to UTC epoch microseconds.
+        """
+        wall_micros = np.asarray(wall_micros, dtype=np.int64)
+        return wall_micros - self.offsets(wall_micros, fold)
+
+
+@functools.lru_cache(maxsize=None)
+def get_offset_cache(zone: Optional[str]) -> ZoneOffsetCache:
+    """
+    Return the shared ``ZoneOffsetCache`` for a zone name such as ``"Asia/Tokyo"``, or ``None`` for the local timezone.
+    """
+    return ZoneOffsetCache(zone)
+
+
+def wall_clock_micros(values: Union[np.ndarray, Sequence[datetime]]) -> np.ndarray:
+    """
+    Convert naive datetimes or datetime64 values to wall-clock epoch microseconds without any tz lookup.
+    """
+    if isinstance(values, np.ndarray) and np.issubdtype(values.dtype, np.datetime64):
+        return values.astype("datetime64[us]").astype(np.int64)
+    if any(value.tzinfo is not None for value in values):
+        raise ValueError("wall-clock times must be naive datetimes")
+    return np.array(values, dtype="datetime64[us]").astype(np.int64)
+
+
+def localize_to_utc_micros(values: Union[np.ndarray, Sequence[datetime]], zone: str, fold: int = 0) -> np.ndarray:
+    """
+    Interpret naive datetimes or datetime64 values as wall-clock times in ``zone`` and return UTC epoch microseconds.
+
+    Example:
+    >>> localize_to_utc_micros([datetime(2023, 10, 30, 17)], "Asia/Tokyo").tolist()
+    [1698652800000000]
+    """
+    return get_offset_cache(zone).to_utc_micros(wall_clock_micros(values), fold)